@@ -0,0 +1,353 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+import threading
+import subprocess
+import contextvars
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from windows_cmd import (
+    IS_POSIX, STATUS_OK, STATUS_FAILED, STATUS_TIMED_OUT, STATUS_RESOURCE_EXCEEDED, STATUS_ERROR,
+    STATUS_CANCELLED, get_limits, rlimit_argv, apply_rlimits, kill_process_tree, resource_exceeded_reason
+)
+from deadline import CANCEL_POLL, current_deadline
+
+logger = logging.getLogger("root")
+logger.info("Imported Async Command module")
+
+READ_CHUNK = 64 * 1024
+
+# Lines kept from the end of stdout when only its head is kept in memory
+TAIL_LINES = 20
+
+# Process-wide limit on concurrently running commands, shared by all event loops and threads
+MAX_CONCURRENT_COMMANDS = os.cpu_count() or 1
+_command_slots = threading.BoundedSemaphore(MAX_CONCURRENT_COMMANDS)
+
+async def _acquire_slot() -> None:
+    # A threading semaphore (polled) instead of asyncio.Semaphore, so that reviewers
+    # running their own loops in different threads still share one limit
+    delay = 0.005
+    while not _command_slots.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+async def _pump(stream, chunks: List[bytes], state: Dict, output_limit: Optional[int], on_overflow) -> None:
+    """
+    Reads 'stream' chunk by chunk into 'chunks'. Once more than 'output_limit'
+    bytes arrived, 'on_overflow()' is called and reading stops.
+    """
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        state["bytes"] += len(chunk)
+        if output_limit is not None:
+            room = output_limit - state["kept"]
+            if room < len(chunk):
+                chunks.append(chunk[:room])
+                state["kept"] += room
+                state["overflow"] = True
+                on_overflow()
+                break
+        state["kept"] += len(chunk)
+        chunks.append(chunk)
+
+async def _pump_stdout_lines(stream, state: Dict, output_limit: Optional[int], on_overflow,
+                             log_file, on_line, on_abort, head_bytes: Optional[int]) -> None:
+    """
+    Reads stdout chunk by chunk, writing it to 'log_file' and handing every complete
+    line to 'on_line'. Only the first 'head_bytes' and the last TAIL_LINES lines are
+    kept in memory. Reading stops when 'on_line' returns True ('on_abort()' is called)
+    or when more than 'output_limit' bytes arrived ('on_overflow()' is called).
+    """
+    pending = b""
+    head = state["head"]
+    tail = state["tail"]
+
+    def handle(line: bytes) -> bool:
+        # Once a line went to the tail, every later one does too, so the output stays in order
+        if head_bytes is None or (not state["dropped"] and state["kept"] + len(line) <= head_bytes):
+            head.append(line)
+            state["kept"] += len(line)
+        else:
+            state["dropped"] += len(line)
+            tail.append(line)
+        if on_line is not None and on_line(line.decode(errors="replace").rstrip("\r\n")):
+            return True
+        return False
+
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            if pending:
+                handle(pending)
+            break
+        state["bytes"] += len(chunk)
+        if log_file is not None:
+            log_file.write(chunk)
+        if output_limit is not None and state["bytes"] > output_limit:
+            state["overflow"] = True
+            on_overflow()
+            break
+
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            if handle(line + b"\n"):
+                state["aborted"] = True
+                on_abort()
+                return
+
+async def _kill_on_cancel(deadline, kill, state: Dict) -> None:
+    # Runs next to the output pumps until they finish; kills the program if the run is cancelled
+    while not deadline.cancelled:
+        await asyncio.sleep(CANCEL_POLL)
+    state["cancelled"] = True
+    kill()
+
+async def run_exec(argv: List[str], cwd=None, timeout=None, limits=None,
+                   stdout_path: Optional[str] = None,
+                   on_stdout_line: Optional[Callable[[str], bool]] = None,
+                   stdout_head_bytes: Optional[int] = None) -> Dict:
+    """
+    Runs a program without a shell and captures its output, without blocking the event loop.
+
+    At most MAX_CONCURRENT_COMMANDS programs run at once in this process. The program
+    gets its own process group, which is killed on timeout or when the output limit
+    is exceeded. On POSIX, the CPU/memory/file size rlimits of run_cmd_command apply.
+    Under a run deadline (deadline.current_deadline()), the timeout is shortened to the
+    time left and the program is killed as soon as the run is cancelled.
+
+    Args:
+        argv (List[str]): Program and its arguments.
+        cwd (str, optional): Working directory of the program.
+        timeout (float, optional): Wall clock limit in seconds. Defaults to limits['timeout'].
+        limits (dict, optional): Overrides for the keys of windows_cmd.DEFAULT_LIMITS.
+        stdout_path (str, optional): File that receives the complete stdout as it is produced.
+        on_stdout_line (callable, optional): Called with every stdout line; returning True
+            kills the program early (result['aborted'] is then True).
+        stdout_head_bytes (int, optional): Keep only this many bytes from the start of
+            stdout (plus its last lines) in result['stdout'].
+
+    Returns:
+        dict: Same keys as windows_cmd.run_cmd_command, plus 'aborted' (bool),
+              'cancelled' (bool), 'stdout_bytes' (int) and 'stdout_path' (str or None).
+    """
+    result = {
+        'success': False,
+        'stdout': '',
+        'stderr': '',
+        'returncode': None,
+        'error_message': None,
+        'status': STATUS_ERROR,
+        'timed_out': False,
+        'resource_exceeded': None,
+        'aborted': False,
+        'cancelled': False,
+        'stdout_bytes': 0,
+        'stdout_path': stdout_path
+    }
+
+    limits = {**get_limits(), **(limits or {})}
+    if timeout is None:
+        timeout = limits["timeout"]
+
+    deadline = current_deadline()
+    deadline_limited = False
+    if deadline is not None:
+        if deadline.expired():
+            result['cancelled'] = True
+            result['status'] = STATUS_CANCELLED
+            result['error_message'] = "Not started: the run was cancelled or reached its deadline."
+            logger.error(result['error_message'])
+            return result
+        deadline_timeout = deadline.cap(timeout)
+        deadline_limited = deadline_timeout < timeout
+        timeout = deadline_timeout
+    output_limit = int(limits["max_output_mb"] * 1024 * 1024) if limits.get("max_output_mb") else None
+
+    # No preexec_fn: commands are started from many threads, where it can deadlock the child
+    prefix = rlimit_argv(limits) if IS_POSIX else []
+    if IS_POSIX:
+        platform_kwargs = {"start_new_session": True}
+    else:
+        platform_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+    streaming = stdout_path is not None or on_stdout_line is not None or stdout_head_bytes is not None
+    log_file = None
+
+    await _acquire_slot()
+    try:
+        if stdout_path is not None:
+            log_file = open(stdout_path, "wb")
+
+        logger.info(f"\n--- Executing: {subprocess.list2cmdline(argv)} ---")
+        start = time.perf_counter()
+
+        if prefix and os.sep not in argv[0] and shutil.which(argv[0]) is None:
+            # Reported like a direct exec would, not as a failing prlimit
+            raise FileNotFoundError(argv[0])
+        process = await asyncio.create_subprocess_exec(
+            *prefix,
+            *argv,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            **platform_kwargs
+        )
+        if IS_POSIX and not prefix:
+            apply_rlimits(process.pid, limits)
+
+        stdout_chunks, stderr_chunks = [], []
+        stdout_state = {"bytes": 0, "kept": 0, "overflow": False, "aborted": False,
+                        "head": stdout_chunks, "tail": deque(maxlen=TAIL_LINES), "dropped": 0}
+        stderr_state = {"bytes": 0, "kept": 0, "overflow": False}
+
+        kill = lambda: kill_process_tree(process)
+        cancel_state = {"cancelled": False}
+        cancel_watch = asyncio.ensure_future(_kill_on_cancel(deadline, kill, cancel_state)) if deadline is not None else None
+        if streaming:
+            stdout_pump = _pump_stdout_lines(process.stdout, stdout_state, output_limit, kill,
+                                             log_file, on_stdout_line, kill, stdout_head_bytes)
+        else:
+            stdout_pump = _pump(process.stdout, stdout_chunks, stdout_state, output_limit, kill)
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    stdout_pump,
+                    _pump(process.stderr, stderr_chunks, stderr_state, output_limit, lambda: kill_process_tree(process)),
+                    process.wait(),
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            result['timed_out'] = True
+            logger.error(f"\nCommand timed out after {timeout} seconds, killing its process group")
+        finally:
+            if cancel_watch is not None:
+                cancel_watch.cancel()
+            # Also covers cancellation of the awaiting task
+            kill_process_tree(process)
+            await process.wait()
+
+        result['stdout'] = b"".join(stdout_chunks).decode(errors="replace")
+        if stdout_state["tail"]:
+            omitted = stdout_state["dropped"] - sum(len(line) for line in stdout_state["tail"])
+            if omitted > 0:
+                result['stdout'] += f"... [{omitted} bytes omitted{f', full output in {stdout_path}' if stdout_path else ''}] ...\n"
+            result['stdout'] += b"".join(stdout_state["tail"]).decode(errors="replace")
+        result['stderr'] = b"".join(stderr_chunks).decode(errors="replace")
+        result['stdout_bytes'] = stdout_state["bytes"]
+        result['aborted'] = stdout_state["aborted"]
+        # Hitting the run deadline is not the program's fault, unlike its own timeout
+        result['cancelled'] = cancel_state["cancelled"] or (result['timed_out'] and deadline_limited)
+        result['returncode'] = process.returncode
+        result['success'] = (process.returncode == 0) and not result['timed_out'] and not result['aborted'] and not result['cancelled']
+
+        if result['cancelled']:
+            result['status'] = STATUS_CANCELLED
+            logger.error("\nCommand was killed because the run was cancelled or reached its deadline")
+        elif result['timed_out']:
+            result['status'] = STATUS_TIMED_OUT
+        elif result['aborted']:
+            result['status'] = STATUS_FAILED
+            logger.info("\nCommand was stopped early by its output handler")
+        else:
+            output_size = max(stdout_state["bytes"], stderr_state["bytes"])
+            result['resource_exceeded'] = resource_exceeded_reason(process.returncode, result['stderr'], output_size, limits)
+            if result['resource_exceeded']:
+                result['success'] = False
+                result['status'] = STATUS_RESOURCE_EXCEEDED
+                logger.error(f"\nCommand exceeded its {result['resource_exceeded']} limit")
+            else:
+                result['status'] = STATUS_OK if result['success'] else STATUS_FAILED
+
+        logger.debug(f"\n--- STDOUT ({stdout_state['bytes']} bytes) ---")
+        logger.debug(result['stdout'].strip())
+        logger.debug(f"\n--- STDERR ({stderr_state['bytes']} bytes) ---")
+        logger.debug(result['stderr'].strip())
+
+        if not result['success']:
+            logger.error(f"\nCommand failed with exit code: {result['returncode']}")
+        else:
+            logger.info(f"\nCommand executed successfully in {time.perf_counter() - start:.2f}s.")
+
+    except FileNotFoundError:
+        result['error_message'] = f"Error: Command '{argv[0]}' not found. Make sure it's a valid executable or command."
+        logger.error(result['error_message'])
+    except Exception as e:
+        result['error_message'] = f"An unexpected error occurred: {e}"
+        logger.exception(result['error_message'])
+    finally:
+        if log_file is not None:
+            log_file.close()
+        _command_slots.release()
+
+    return result
+
+def merge_results(first: Dict, second: Dict) -> Dict:
+    """
+    Combines the results of two commands run one after the other, like 'first && second' in a shell.
+    """
+    merged = dict(second)
+    merged['stdout'] = first['stdout'] + second['stdout']
+    merged['stderr'] = first['stderr'] + second['stderr']
+    merged['error_message'] = first['error_message'] or second['error_message']
+    return merged
+
+# Most severe first; the status of parallel commands is the most severe one among them
+_STATUS_SEVERITY = [STATUS_CANCELLED, STATUS_TIMED_OUT, STATUS_RESOURCE_EXCEEDED, STATUS_ERROR, STATUS_FAILED, STATUS_OK]
+
+def merge_parallel_results(labelled: List[tuple]) -> Dict:
+    """
+    Combines the results of commands that ran side by side on the same input.
+    stdout is concatenated under a '--- <label> ---' header per command, stderr as is.
+
+    Args:
+        labelled (List[tuple]): (label, result) pairs as returned by run_exec.
+
+    Returns:
+        dict: The result of the most severe command (see _STATUS_SEVERITY) with merged
+              output; 'success' only if every command succeeded.
+    """
+    results = [result for _, result in labelled]
+    merged = dict(min(results, key=lambda result: _STATUS_SEVERITY.index(result['status'])))
+    merged['stdout'] = "".join(f"--- {label} ---\n{result['stdout']}" for label, result in labelled)
+    merged['stderr'] = "".join(result['stderr'] for result in results)
+    merged['error_message'] = next((result['error_message'] for result in results if result['error_message']), None)
+    merged['success'] = all(result['success'] for result in results)
+    for flag in ('timed_out', 'aborted', 'cancelled'):
+        merged[flag] = any(result.get(flag) for result in results)
+    merged['stdout_bytes'] = sum(result.get('stdout_bytes', 0) for result in results)
+    merged['stdout_path'] = None
+    merged['stdout_paths'] = {label: result.get('stdout_path') for label, result in labelled}
+    return merged
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from synchronous code, also when the calling
+    thread already runs an event loop (the coroutine then gets its own thread).
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    result = {}
+    def target():
+        try:
+            result["value"] = asyncio.run(coro)
+        except BaseException as e:
+            result["error"] = e
+    # The thread keeps the caller's context (e.g. the run deadline)
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(target,))
+    thread.start()
+    thread.join()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
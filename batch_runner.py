@@ -0,0 +1,234 @@
+import os
+import re
+import sys
+import json
+import time
+import logging
+import argparse
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import logger_config
+logger = logging.getLogger("root")
+logger.info("Imported Batch Runner module")
+
+SPEC_SUFFIXES = (".toml", ".txt", ".md")
+
+def _safe_name(name: str) -> str:
+    """
+    Turns a spec name into something usable as a directory name.
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", name.strip()) or "spec"
+
+def load_specs(source: str) -> List[Dict[str, str]]:
+    """
+    Loads the specifications to run from a directory or a JSONL file.
+
+    A directory may contain '.toml' files laid out like 'config.toml' (a [SPEC]
+    table with 'input_spec' and optionally 'name') and plain '.txt'/'.md' files
+    whose whole content is the spec. A JSONL file holds one object per line with
+    'input_spec' (or 'spec') and optionally 'name'.
+
+    Args:
+        source (str): Path to a directory or a '.jsonl' file.
+
+    Returns:
+        List[Dict[str, str]]: Entries with 'name' and 'input_spec' keys.
+    """
+    specs = []
+
+    if os.path.isdir(source):
+        for file_name in sorted(os.listdir(source)):
+            file_path = os.path.join(source, file_name)
+            stem, suffix = os.path.splitext(file_name)
+            if not os.path.isfile(file_path) or suffix not in SPEC_SUFFIXES:
+                continue
+            if suffix == ".toml":
+                with open(file_path, "rb") as f:
+                    spec_table = tomllib.load(f).get("SPEC", {})
+                if "input_spec" not in spec_table:
+                    logger.warning(f"Skipping '{file_path}': no [SPEC] input_spec")
+                    continue
+                specs.append({"name": spec_table.get("name", stem), "input_spec": spec_table["input_spec"]})
+            else:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    specs.append({"name": stem, "input_spec": f.read()})
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            for lineno, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                input_spec = entry.get("input_spec", entry.get("spec"))
+                if input_spec is None:
+                    logger.warning(f"Skipping line {lineno} of '{source}': no input_spec")
+                    continue
+                specs.append({"name": entry.get("name", f"spec_{lineno}"), "input_spec": input_spec})
+
+    # Names become output directories, so they have to be unique
+    seen = {}
+    for spec in specs:
+        name = _safe_name(str(spec["name"]))
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 0
+        spec["name"] = name
+
+    return specs
+
+def _init_worker_logging() -> None:
+    """
+    Process pool initializer. Workers log to the console only; each spec gets its own
+    log file (see run_one_spec) instead of all workers sharing 'logs/rag.log'.
+    """
+    # Workers started with 'spawn' (macOS, Windows) do not inherit the logging setup
+    logger_config.init_logging(None)
+    # Forked workers (Linux) do, including the parent's file handler
+    root_logger = logging.getLogger("root")
+    for handler in list(root_logger.handlers):
+        if isinstance(handler, logging.FileHandler):
+            root_logger.removeHandler(handler)
+
+def run_one_spec(output_path: str, name: str, input_spec: str, deadline_seconds=None) -> Dict:
+    """
+    Runs a single spec through TopAgent. Executed inside a worker process; the
+    spec's log goes to 'logs/rag.log' inside its output folder.
+
+    Args:
+        output_path (str): Root output folder shared by the batch.
+        name (str): Name of the spec, used for the per-spec output folder.
+        input_spec (str): The natural language specification.
+        deadline_seconds (float, optional): Wall clock limit for the spec, see TopAgent.run.
+
+    Returns:
+        Dict: Summary entry with 'name', 'passed', 'finished', 'wall_time',
+              'output_dir' and 'message'.
+    """
+    from top import TopAgent
+
+    start = time.perf_counter()
+
+    agent = TopAgent()
+    agent.set_output_path(output_path)
+    # The folder TopAgent.run writes to, '<name>_<task_id>'
+    with logger_config.log_to_file(os.path.join(output_path, f"{name}_0", "logs")):
+        finished, message = agent.run(
+            benchmark_type_name=name,
+            task_id="0",
+            spec=input_spec,
+            deadline_seconds=deadline_seconds
+        )
+
+    tag_path = os.path.join(agent.output_dir_per_run, "properly_finished.tag")
+    passed = False
+    if finished and os.path.isfile(tag_path):
+        with open(tag_path, "r") as f:
+            passed = f.read(1) == "1"
+
+    return {
+        "name": name,
+        "passed": passed,
+        "finished": finished,
+        "wall_time": time.perf_counter() - start,
+        "output_dir": agent.output_dir_per_run,
+        "message": "" if finished else message,
+    }
+
+def run_batch(specs: List[Dict[str, str]], output_path: str, max_workers: int, deadline_seconds=None) -> List[Dict]:
+    """
+    Fans the specs out over a process pool and collects a summary per spec.
+
+    Args:
+        specs (List[Dict[str, str]]): Entries from load_specs.
+        output_path (str): Root output folder; each spec gets '<name>_0' below it.
+        max_workers (int): Maximum number of specs running at the same time.
+        deadline_seconds (float, optional): Wall clock limit per spec.
+
+    Returns:
+        List[Dict]: One summary entry per spec, in input order.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker_logging) as pool:
+        futures = {
+            pool.submit(run_one_spec, output_path, spec["name"], spec["input_spec"], deadline_seconds): spec["name"]
+            for spec in specs
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.exception(f"Spec '{name}' crashed its worker")
+                result = {
+                    "name": name,
+                    "passed": False,
+                    "finished": False,
+                    "wall_time": None,
+                    "output_dir": None,
+                    "message": f"Exception: {e}",
+                }
+            logger.info(f"[{len(results) + 1}/{len(specs)}] {name}: {'PASS' if result['passed'] else 'FAIL'}")
+            results[name] = result
+
+    return [results[spec["name"]] for spec in specs]
+
+def write_summary(results: List[Dict], output_path: str, total_wall_time: float) -> str:
+    """
+    Writes 'batch_summary.json' to the output folder and logs a pass/fail table.
+
+    Returns:
+        str: Path of the written summary file.
+    """
+    n_passed = sum(1 for result in results if result["passed"])
+    summary = {
+        "total": len(results),
+        "passed": n_passed,
+        "failed": len(results) - n_passed,
+        "wall_time": total_wall_time,
+        "specs": results,
+    }
+
+    summary_path = os.path.join(output_path, "batch_summary.json")
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    width = max([len(result["name"]) for result in results] + [4])
+    lines = [f"{'spec':<{width}}  result  wall_time"]
+    for result in results:
+        wall_time = "-" if result["wall_time"] is None else f"{result['wall_time']:.1f}s"
+        lines.append(f"{result['name']:<{width}}  {'PASS' if result['passed'] else 'FAIL':<6}  {wall_time}")
+    lines.append(f"{n_passed}/{len(results)} passed in {total_wall_time:.1f}s")
+    logger.info("Batch summary:\n" + "\n".join(lines))
+
+    return summary_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run TopAgent on many specs in parallel.")
+    parser.add_argument("source", help="Directory of spec files or a JSONL file of specs")
+    parser.add_argument("-o", "--output", default=os.path.join(os.getcwd(), "output"),
+                        help="Root output folder (default: ./output)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Maximum number of specs running concurrently (default: CPU count)")
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+                        help="Wall clock limit per spec in seconds (default: [PIPELINE] deadline_seconds)")
+    args = parser.parse_args()
+
+    logger_config.init_logging()
+
+    specs = load_specs(args.source)
+    if not specs:
+        logger.error(f"No specs found in '{args.source}'")
+        sys.exit(1)
+
+    logger.info(f"Running {len(specs)} specs with {args.jobs} workers")
+    start = time.perf_counter()
+    results = run_batch(specs, args.output, max(1, args.jobs), args.timeout)
+    summary_path = write_summary(results, args.output, time.perf_counter() - start)
+    logger.info(f"Summary written to {summary_path}")
+
+    sys.exit(0 if all(result["passed"] for result in results) else 1)
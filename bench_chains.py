@@ -0,0 +1,41 @@
+import sys
+import time
+import argparse
+
+from llm import get_llm
+from rtl_generator import get_rtl_writer
+from tb_generator import get_tb_writer
+from sim_judge import get_judge
+from reviewer import SimReviewer, build_review_graph
+
+def time_per_call(fn, iterations: int) -> float:
+    """
+    Returns the average wall time of fn() in microseconds.
+    """
+    fn()  # warm up, also fills the memoized builders
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-call construction overhead of chains and the review graph.")
+    parser.add_argument("-n", "--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    llm = get_llm()
+    reviewer = SimReviewer(input_spec="", output_dir_per_run=".", max_iterations=5)
+
+    cases = [
+        ("get_rtl_writer", lambda: get_rtl_writer.__wrapped__(llm), lambda: get_rtl_writer(llm)),
+        ("get_tb_writer", lambda: get_tb_writer.__wrapped__(llm), lambda: get_tb_writer(llm)),
+        ("get_judge", lambda: get_judge.__wrapped__(llm), lambda: get_judge(llm)),
+        ("review graph", build_review_graph, lambda: reviewer.graph),
+    ]
+
+    print(f"{'builder':<16} {'rebuilt (us)':>14} {'memoized (us)':>14} {'speedup':>10}")
+    for name, rebuilt, memoized in cases:
+        before = time_per_call(rebuilt, args.iterations)
+        after = time_per_call(memoized, args.iterations)
+        print(f"{name:<16} {before:>14.1f} {after:>14.2f} {before / after:>9.0f}x")
+    sys.stdout.flush()
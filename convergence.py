@@ -0,0 +1,136 @@
+import time
+import hashlib
+import logging
+from typing import Dict, Optional, Set
+
+from llm import get_token_usage
+from utils import load_config, normalize_verilog
+
+logger = logging.getLogger("root")
+logger.info("Imported Convergence module")
+
+# Reason codes for why the review graph stopped
+STOP_PASSED = "passed"
+STOP_MAX_ITERATIONS = "max_iterations"
+STOP_NO_CHANGE = "no_change"
+STOP_CYCLE = "cycle"
+STOP_PLATEAU = "plateau"
+STOP_ITERATION_BUDGET = "iteration_budget"
+STOP_TOKEN_BUDGET = "token_budget"
+STOP_TIME_BUDGET = "time_budget"
+STOP_DEADLINE = "deadline"
+
+class RunBudget:
+    """
+    Run-wide limits on review iterations, LLM tokens and wall clock time, shared by
+    all stages of the review graph (unlike 'iterations', which restarts per stage).
+    A limit of 0 means unlimited. The clock and token count start at construction.
+    """
+    def __init__(self, max_iterations: int = 0, max_tokens: int = 0, max_seconds: float = 0):
+        self.max_iterations = max_iterations
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.iterations = 0
+        self.start_time = time.monotonic()
+        self.start_tokens = get_token_usage()["total_tokens"]
+
+    @classmethod
+    def from_config(cls) -> "RunBudget":
+        """
+        Builds the budget from the [BUDGET] table of config.toml.
+        """
+        budget_config = load_config().get("BUDGET", {})
+        return cls(
+            max_iterations=budget_config.get("max_iterations", 0),
+            max_tokens=budget_config.get("max_tokens", 0),
+            max_seconds=budget_config.get("max_seconds", 0)
+        )
+
+    def charge_iteration(self) -> None:
+        self.iterations += 1
+
+    def tokens_used(self) -> int:
+        return get_token_usage()["total_tokens"] - self.start_tokens
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def remaining_seconds(self) -> Optional[float]:
+        """
+        Seconds left on the wall clock budget, or None if it is unlimited.
+        """
+        if not self.max_seconds:
+            return None
+        return max(0.0, self.max_seconds - self.elapsed())
+
+    def exhausted(self) -> Optional[str]:
+        """
+        Returns the reason code of the first spent limit, or None.
+        """
+        if self.max_iterations and self.iterations >= self.max_iterations:
+            return STOP_ITERATION_BUDGET
+        if self.max_tokens and self.tokens_used() >= self.max_tokens:
+            return STOP_TOKEN_BUDGET
+        if self.max_seconds and self.elapsed() >= self.max_seconds:
+            return STOP_TIME_BUDGET
+        return None
+
+    def summary(self) -> Dict:
+        return {
+            "iterations": self.iterations,
+            "tokens": self.tokens_used(),
+            "seconds": round(self.elapsed(), 1),
+        }
+
+def design_hash(rtl_code: str, tb_code: str) -> str:
+    """
+    Hashes rtl/tb after normalization, so comment or whitespace-only edits count as no change.
+    """
+    digest = hashlib.sha256()
+    for code in (rtl_code, tb_code):
+        digest.update(normalize_verilog(code or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class ConvergenceMonitor:
+    """
+    Detects fix loops that stopped making progress: a fix that returned the same
+    design as before (no_change), a design that was already checked earlier in the
+    same stage (cycle, e.g. A -> B -> A), and a mismatch count that did not improve
+    on its best value for 'plateau_patience' consecutive mismatch checks (plateau).
+    """
+    def __init__(self, plateau_patience: int = 3):
+        self.plateau_patience = plateau_patience
+        self.seen: Dict[str, Set[str]] = {}
+        self.last: Dict[str, str] = {}
+        self.best_mismatch_cnt: Optional[int] = None
+        self.stale_checks = 0
+
+    def observe(self, stage: str, rtl_code: str, tb_code: str, mismatch_cnt: Optional[int] = None) -> Optional[str]:
+        """
+        Records one checked design of 'stage'. 'mismatch_cnt' is only given for
+        functional checks whose simulation ran.
+
+        Returns:
+            Optional[str]: The reason code if the loop has stopped converging, else None.
+        """
+        key = design_hash(rtl_code, tb_code)
+        seen = self.seen.setdefault(stage, set())
+        reason = None
+        if self.last.get(stage) == key:
+            reason = STOP_NO_CHANGE
+        elif key in seen:
+            reason = STOP_CYCLE
+        seen.add(key)
+        self.last[stage] = key
+
+        if mismatch_cnt is not None:
+            if self.best_mismatch_cnt is None or mismatch_cnt < self.best_mismatch_cnt:
+                self.best_mismatch_cnt = mismatch_cnt
+                self.stale_checks = 0
+            else:
+                self.stale_checks += 1
+                if reason is None and self.plateau_patience and self.stale_checks >= self.plateau_patience:
+                    reason = STOP_PLATEAU
+
+        return reason
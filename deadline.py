@@ -0,0 +1,123 @@
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+logger = logging.getLogger("root")
+logger.info("Imported Deadline module")
+
+# How often blocking waits look at the cancellation flag
+CANCEL_POLL = 0.1
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when work is started or waited for after the run deadline passed or the run was cancelled.
+    """
+
+class Deadline:
+    """
+    Absolute wall clock deadline of one run, plus a cancellation flag that any
+    thread can set to abort the run early. 'seconds=None' means no time limit
+    (the deadline can still be cancelled).
+    """
+    def __init__(self, seconds: Optional[float] = None):
+        self.seconds = seconds
+        self.expires_at = None if not seconds else time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    def remaining(self) -> Optional[float]:
+        """
+        Seconds left, 0 once expired or cancelled, None if there is no time limit.
+        """
+        if self._cancelled.is_set():
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def extend(self, other: "Deadline") -> None:
+        """
+        Moves the expiry out to that of 'other' if it is later or unlimited.
+        """
+        if other.expires_at is None:
+            self.expires_at = None
+        elif self.expires_at is not None and other.expires_at > self.expires_at:
+            self.expires_at = other.expires_at
+
+    def cap(self, timeout: Optional[float]) -> Optional[float]:
+        """
+        Returns 'timeout' shortened to the time left before the deadline.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+    def check(self, what: str = "work") -> None:
+        """
+        Raises DeadlineExceeded if the deadline passed or the run was cancelled.
+        """
+        if self.cancelled:
+            raise DeadlineExceeded(f"Run cancelled before {what}")
+        if self.expired():
+            raise DeadlineExceeded(f"Run deadline of {self.seconds}s reached before {what}")
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar("deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    """
+    Returns the deadline of the run this code executes in, if any.
+    """
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """
+    Makes 'deadline' the current deadline for the enclosed code. Worker threads
+    inherit it when they are started through 'copy_context().run'.
+    """
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+# Blocking calls (LLM requests) are waited for from here so the caller can give up on them
+_call_pool = ThreadPoolExecutor(thread_name_prefix="deadline-call")
+
+def call_with_deadline(fn: Callable, what: str = "call"):
+    """
+    Calls 'fn()' and returns its result, giving up with DeadlineExceeded when the
+    current deadline passes or the run is cancelled. 'fn' runs in a worker thread
+    with the same deadline current and should bound its own blocking by
+    deadline.remaining() (LLM calls pass it as the request timeout), so the thread
+    ends by the deadline. An abandoned call's result is discarded.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return fn()
+
+    deadline.check(what)
+    future = _call_pool.submit(contextvars.copy_context().run, fn)
+    while True:
+        remaining = deadline.remaining()
+        done, _ = wait([future], timeout=CANCEL_POLL if remaining is None else min(CANCEL_POLL, remaining))
+        if done:
+            return future.result()
+        if deadline.expired():
+            future.cancel()
+            logger.error(f"Abandoned {what}: {'run cancelled' if deadline.cancelled else 'deadline reached'}")
+            deadline.check(what)
@@ -0,0 +1,238 @@
+import re
+import ntpath
+import logging
+import functools
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Pattern
+
+from utils import load_config
+
+logger = logging.getLogger("root")
+logger.info("Imported Diagnostics module")
+
+SEVERITY_ERROR = "error"
+SEVERITY_WARNING = "warning"
+SEVERITY_UNSUPPORTED = "unsupported"
+SEVERITY_INFO = "info"
+
+# A source path, optionally with a Windows drive prefix ('C:\proj\rtl.sv')
+_FILE = r"(?:[A-Za-z]:)?[^\s:][^:]*?"
+# 'file:line: severity: message' from iverilog, optionally prefixed by a vvp runtime tag ($error/$fatal/$warning)
+_LOCATED_PATTERN = re.compile(
+    rf"^(?:(?P<runtime>ERROR|FATAL|WARNING|INFO):\s+)?(?P<file>{_FILE}):(?P<line>\d+):\s*(?P<rest>.*)$"
+)
+_SEVERITY_PATTERN = re.compile(r"^(?P<severity>syntax error|error|warning|sorry)\b:?\s*(?P<message>.*)$")
+# '        : detail' lines continue the previous diagnostic
+_CONTINUATION_PATTERN = re.compile(rf"^(?:{_FILE}:\d+:)?\s+:\s*(?P<message>.*)$")
+# '%Error: file:line:col: message' / '%Warning-CODE: file:line:col: message' from Verilator
+_VERILATOR_PATTERN = re.compile(
+    rf"^%(?P<tag>Error|Warning)(?:-(?P<code>[A-Z0-9_]+))?:\s*(?:(?P<file>{_FILE}):(?P<line>\d+):(?:\d+:)?)?\s*(?P<message>.*)$"
+)
+# Trailers and source excerpts that carry no information of their own
+_SUMMARY_PATTERN = re.compile(
+    r"^(?:I give up\.|\d+ error\(s\) during elaboration\.|Elaboration failed|\*\*\*.*|\s+Time: .*Scope: .*"
+    r"|%Error: Exiting due to .*|\s*\d*\s*\|.*|\s+\.\.\. .*)$"
+)
+
+# First matching rule wins; matched against the message
+CATEGORY_RULES = [
+    ("syntax", re.compile(r"syntax error|Malformed|Invalid module item|Incomprehensible", re.IGNORECASE)),
+    ("undeclared", re.compile(r"Unable to bind|not declared|Unknown identifier|is not a valid l-value", re.IGNORECASE)),
+    ("unknown_module", re.compile(r"Unknown module type|referenced \d+ times", re.IGNORECASE)),
+    ("redeclared", re.compile(r"already been declared|duplicate", re.IGNORECASE)),
+    ("port", re.compile(r"\bport\b", re.IGNORECASE)),
+    ("width", re.compile(r"truncat|padding|\bbits?\b.*\bexpects?\b|width", re.IGNORECASE)),
+    ("timescale", re.compile(r"time ?unit|timescale|time precision", re.IGNORECASE)),
+    ("infinite_loop", re.compile(r"infinite loop|zero delay", re.IGNORECASE)),
+]
+
+# iverilog messages that do not affect simulation results
+DEFAULT_BENIGN_RULES = [
+    r"^\S+:\d+: sorry: constant selects in always_\* processes are not currently supported \(all bits will be included\)\.$",
+]
+
+@dataclass
+class Diagnostic:
+    """
+    One message from iverilog or vvp.
+
+    Attributes:
+        file: Base name of the source file, or None for messages without a location.
+        line: Line number in 'file', or None.
+        severity: One of the SEVERITY_* constants.
+        category: Coarse class of the problem (see CATEGORY_RULES), "assertion" for
+                  runtime $error/$fatal, "unsupported" for 'sorry' messages, else "other".
+        message: The message text, with continuation lines joined.
+        count: How many times the same message was reported.
+        benign: True if it matches a benign rule.
+    """
+    file: Optional[str]
+    line: Optional[int]
+    severity: str
+    category: str
+    message: str
+    count: int = 1
+    benign: bool = False
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    def location(self) -> str:
+        return f"{self.file}:{self.line}" if self.file else "-"
+
+@functools.lru_cache(maxsize=None)
+def benign_patterns() -> List[Pattern]:
+    """
+    Compiles the benign rules once: DEFAULT_BENIGN_RULES plus [DIAGNOSTICS] benign from config.toml.
+    """
+    extra = load_config().get("DIAGNOSTICS", {}).get("benign", [])
+    return [re.compile(rule) for rule in DEFAULT_BENIGN_RULES + list(extra)]
+
+def is_benign_line(line: str) -> bool:
+    return any(pattern.match(line) for pattern in benign_patterns())
+
+def all_lines_benign(text: str) -> bool:
+    """
+    True if every line of 'text' matches a benign rule (also for empty text).
+    """
+    return all(is_benign_line(line) for line in text.splitlines())
+
+def _categorize(severity: str, message: str, runtime: Optional[str]) -> str:
+    if runtime in ("ERROR", "FATAL"):
+        return "assertion"
+    if severity == SEVERITY_UNSUPPORTED:
+        return "unsupported"
+    for category, pattern in CATEGORY_RULES:
+        if pattern.search(message):
+            return category
+    return "other"
+
+def _parse_icarus(line: str) -> tuple:
+    located = _LOCATED_PATTERN.match(line)
+    if located:
+        runtime = located.group("runtime")
+        # ntpath splits on both '/' and '\', so POSIX and Windows paths give the base name
+        file_name = ntpath.basename(located.group("file"))
+        line_no = int(located.group("line"))
+        rest = located.group("rest")
+    else:
+        runtime, file_name, line_no, rest = None, None, None, line.strip()
+        tagged = re.match(r"^(ERROR|FATAL|WARNING|INFO):\s*(.*)$", rest)
+        if tagged:
+            runtime, rest = tagged.groups()
+
+    severity_match = _SEVERITY_PATTERN.match(rest)
+    if severity_match:
+        keyword = severity_match.group("severity")
+        message = severity_match.group("message") or keyword
+        severity = {"syntax error": SEVERITY_ERROR, "error": SEVERITY_ERROR,
+                    "warning": SEVERITY_WARNING, "sorry": SEVERITY_UNSUPPORTED}[keyword]
+        if keyword == "syntax error":
+            message = "syntax error" + (f": {severity_match.group('message')}" if severity_match.group("message") else "")
+    else:
+        message = rest
+        severity = {"ERROR": SEVERITY_ERROR, "FATAL": SEVERITY_ERROR, "WARNING": SEVERITY_WARNING}.get(runtime, SEVERITY_INFO)
+    return runtime, file_name, line_no, severity, message
+
+def _parse_verilator(match) -> tuple:
+    code = match.group("code") or ""
+    if code == "UNSUPPORTED":
+        severity = SEVERITY_UNSUPPORTED
+    else:
+        severity = SEVERITY_ERROR if match.group("tag") == "Error" else SEVERITY_WARNING
+    file_name = ntpath.basename(match.group("file")) if match.group("file") else None
+    line_no = int(match.group("line")) if match.group("line") else None
+    message = match.group("message") + (f" [{code}]" if code else "")
+    return file_name, line_no, severity, message
+
+def parse_diagnostics(text: str) -> List[Diagnostic]:
+    """
+    Parses iverilog/vvp (or Verilator) stderr into diagnostics, in order of first
+    appearance. Identical messages at the same location are merged and counted.
+    """
+    diagnostics: List[Diagnostic] = []
+    index: Dict[tuple, Diagnostic] = {}
+    last: Optional[Diagnostic] = None
+
+    for raw_line in text.splitlines():
+        line = raw_line.rstrip()
+        if not line.strip() or _SUMMARY_PATTERN.match(line):
+            continue
+
+        continuation = _CONTINUATION_PATTERN.match(line)
+        if continuation and last is not None:
+            if continuation.group("message") not in last.message:
+                last.message += " " + continuation.group("message")
+            continue
+
+        verilator = _VERILATOR_PATTERN.match(line)
+        if verilator:
+            runtime = None
+            file_name, line_no, severity, message = _parse_verilator(verilator)
+        else:
+            runtime, file_name, line_no, severity, message = _parse_icarus(line)
+
+        key = (file_name, line_no, severity, message)
+        if key in index:
+            index[key].count += 1
+            last = index[key]
+            continue
+
+        last = Diagnostic(
+            file=file_name,
+            line=line_no,
+            severity=severity,
+            category=_categorize(severity, message, runtime),
+            message=message,
+            benign=is_benign_line(line)
+        )
+        index[key] = last
+        diagnostics.append(last)
+
+    return diagnostics
+
+def blocking(diagnostics: List[Diagnostic]) -> List[Diagnostic]:
+    """
+    The diagnostics that make a check fail: everything that is neither benign nor informational.
+    """
+    return [diagnostic for diagnostic in diagnostics
+            if not diagnostic.benign and diagnostic.severity in (SEVERITY_ERROR, SEVERITY_WARNING, SEVERITY_UNSUPPORTED)]
+
+def category_counts(diagnostics: List[Diagnostic]) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for diagnostic in diagnostics:
+        counts[diagnostic.category] = counts.get(diagnostic.category, 0) + diagnostic.count
+    return counts
+
+def format_diagnostics(diagnostics: List[Diagnostic], limit: int = 20) -> str:
+    """
+    Compact one-line-per-diagnostic rendering for prompts and logs.
+    """
+    lines = []
+    for diagnostic in diagnostics[:limit]:
+        repeat = f" (x{diagnostic.count})" if diagnostic.count > 1 else ""
+        lines.append(f"- {diagnostic.location()} [{diagnostic.category}] {diagnostic.severity}: {diagnostic.message}{repeat}")
+    if len(diagnostics) > limit:
+        lines.append(f"- ... {len(diagnostics) - limit} more diagnostics")
+    return "\n".join(lines)
+
+def route_fix(diagnostics: List[Diagnostic], rtl_file: str = "rtl.sv", tb_file: str = "tb.sv") -> Optional[tuple]:
+    """
+    Decides which file needs a fix from the diagnostics alone, when they all point
+    into one of the two files. Pass the diagnostics that failed the check under the
+    simulator that produced them (SimulatorBackend.failing); a run that printed
+    mismatches is not decided by its diagnostics.
+
+    Returns:
+        Optional[tuple]: (rtl_needs_fix, tb_needs_fix, reasoning), or None if the
+                         diagnostics do not decide it and the judge has to.
+    """
+    relevant = blocking(diagnostics)
+    files = {diagnostic.file for diagnostic in relevant}
+    if not relevant or None in files:
+        return None
+    if files == {tb_file}:
+        return False, True, f"All diagnostics point into the testbench ({tb_file}):\n{format_diagnostics(relevant)}"
+    if files == {rtl_file}:
+        return True, False, f"All diagnostics point into the RTL ({rtl_file}):\n{format_diagnostics(relevant)}"
+    return None
@@ -0,0 +1,90 @@
+import os
+import json
+import logging
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from repair_search import candidate_score
+
+logger = logging.getLogger("root")
+logger.info("Imported Iteration History module")
+
+ARTIFACT_NAMES = ("rtl.sv", "tb.sv", "if.sv")
+
+@dataclass
+class IterationRecord:
+    """
+    The design files checked in one review iteration and how they scored.
+    """
+    index: int
+    stage: str
+    rtl_code: str
+    tb_code: str
+    if_code: str
+    compiles: bool
+    sim_ran: bool
+    is_pass: bool
+    mismatch_cnt: int
+    sim_output: Dict = field(default_factory=dict, repr=False)
+    path: Optional[str] = None
+
+class IterationHistory:
+    """
+    Keeps every checked version of rtl.sv/tb.sv/if.sv under 'history_dir/iter_<n>_<stage>'
+    together with its compile status and mismatch count, and remembers the best one.
+    """
+    def __init__(self, history_dir: str):
+        self.history_dir = history_dir
+        self.records: List[IterationRecord] = []
+        self.best: Optional[IterationRecord] = None
+
+    def record(self, stage: str, files: Dict[str, str], compiles: bool, sim_ran: bool,
+               is_pass: bool, mismatch_cnt: int, sim_output: Dict) -> IterationRecord:
+        """
+        Stores a checked version. 'files' maps 'rtl.sv'/'tb.sv'/'if.sv' to their content.
+        """
+        record = IterationRecord(
+            index=len(self.records),
+            stage=stage,
+            rtl_code=files.get("rtl.sv") or "",
+            tb_code=files.get("tb.sv") or "",
+            if_code=files.get("if.sv") or "",
+            compiles=compiles,
+            sim_ran=sim_ran,
+            is_pass=is_pass,
+            mismatch_cnt=mismatch_cnt,
+            sim_output=sim_output
+        )
+        record.path = os.path.join(self.history_dir, f"iter_{record.index:02d}_{stage}")
+        os.makedirs(record.path, exist_ok=True)
+        for file_name, content in zip(ARTIFACT_NAMES, (record.rtl_code, record.tb_code, record.if_code)):
+            with open(os.path.join(record.path, file_name), "w") as f:
+                f.write(content)
+        with open(os.path.join(record.path, "score.json"), "w") as f:
+            meta = {key: value for key, value in asdict(record).items() if key in
+                    ("index", "stage", "compiles", "sim_ran", "is_pass", "mismatch_cnt")}
+            json.dump(meta, f, indent=2)
+
+        self.records.append(record)
+        if self.best is None or candidate_score(record) > candidate_score(self.best):
+            self.best = record
+        logger.info(f"Iteration {record.index} ({stage}): compiles={compiles}, sim_ran={sim_ran}, "
+                    f"is_pass={is_pass}, mismatch_cnt={mismatch_cnt}; best so far is iteration {self.best.index}")
+        return record
+
+    def is_regression(self, record: IterationRecord) -> bool:
+        """
+        True if 'record' scores strictly worse than the best version seen so far.
+        """
+        return self.best is not None and candidate_score(record) < candidate_score(self.best)
+
+    def restore_best(self, output_dir: str) -> Optional[IterationRecord]:
+        """
+        Writes the best version's files back into 'output_dir' and returns it.
+        """
+        if self.best is None:
+            return None
+        for file_name, content in zip(ARTIFACT_NAMES, (self.best.rtl_code, self.best.tb_code, self.best.if_code)):
+            with open(os.path.join(output_dir, file_name), "w") as f:
+                f.write(content)
+        return self.best
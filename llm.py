@@ -1,22 +1,118 @@
 import logging
-import tomllib
-from langchain_openai import AzureChatOpenAI
+import threading
+import contextlib
+import contextvars
+from typing import Dict, Iterator, Tuple
+
+from utils import load_config
 
 logger = logging.getLogger("root")
-logger.info("Imported TB Generator module")
-
-def parse_toml_file(file_path):
-    with open(file_path, "rb") as f:
-        config = tomllib.load(f)
-    return config
-config = parse_toml_file("config.toml")
-
-llm = AzureChatOpenAI(
-    azure_deployment   = config["LLM"]["azure_deployment"],
-    azure_endpoint     = config["LLM"]["azure_endpoint"],
-    openai_api_key     = "dummy",  # required but not used
-    openai_api_type    = config["LLM"]["openai_api_type"],
-    openai_api_version = config["LLM"]["openai_api_version"],
-    model              = config["LLM"]["model"],
-    default_headers    = {"genaiplatform-farm-subscription-key": config["LLM"]["key"],}
-)
\ No newline at end of file
+logger.info("Imported LLM module")
+
+_llm = None
+_llm_lock = threading.Lock()
+
+# Tokens spent by every LLM call of this process; cached responses cost nothing
+_token_usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0}
+_usage_lock = threading.Lock()
+# Counters of the enclosing usage_scope blocks
+_scope_usage: contextvars.ContextVar[Tuple[Dict[str, int], ...]] = contextvars.ContextVar("llm_scope_usage", default=())
+
+def record_token_usage(response) -> None:
+    """
+    Adds the token usage reported in an LLMResult to the process-wide counters
+    and to those of the enclosing usage_scope blocks.
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    if not usage:
+        # Providers that only report usage on the message
+        for generations in response.generations:
+            for generation in generations:
+                metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += metadata.get("input_tokens", 0)
+                completion_tokens += metadata.get("output_tokens", 0)
+
+    with _usage_lock:
+        for counters in (_token_usage, *_scope_usage.get()):
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["total_tokens"] += prompt_tokens + completion_tokens
+            counters["calls"] += 1
+
+def get_token_usage() -> Dict[str, int]:
+    """
+    Returns a copy of the token counters of this process.
+    """
+    with _usage_lock:
+        return dict(_token_usage)
+
+@contextlib.contextmanager
+def usage_scope() -> Iterator[Dict[str, int]]:
+    """
+    Counts the LLM calls and tokens of the block, unlike get_token_usage not those
+    made concurrently by other threads or tasks. Yields the (live) counters.
+    """
+    counters = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "calls": 0}
+    token = _scope_usage.set(_scope_usage.get() + (counters,))
+    try:
+        yield counters
+    finally:
+        _scope_usage.reset(token)
+
+def _token_usage_handler():
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class TokenUsageHandler(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            record_token_usage(response)
+
+    return TokenUsageHandler()
+
+def init_llm(config=None):
+    """
+    Constructs the AzureChatOpenAI client from the [LLM] table of the config.
+    langchain_openai is only imported here, so importing this module is cheap
+    and works without credentials.
+
+    Args:
+        config (dict, optional): Parsed config. Defaults to load_config().
+
+    Returns:
+        AzureChatOpenAI: The process-wide LLM client.
+    """
+    global _llm
+    from langchain_openai import AzureChatOpenAI
+
+    if config is None:
+        config = load_config()
+
+    with _llm_lock:
+        _llm = AzureChatOpenAI(
+            azure_deployment   = config["LLM"]["azure_deployment"],
+            azure_endpoint     = config["LLM"]["azure_endpoint"],
+            openai_api_key     = "dummy",  # required but not used
+            openai_api_type    = config["LLM"]["openai_api_type"],
+            openai_api_version = config["LLM"]["openai_api_version"],
+            model              = config["LLM"]["model"],
+            default_headers    = {"genaiplatform-farm-subscription-key": config["LLM"]["key"],},
+            callbacks          = [_token_usage_handler()]
+        )
+    return _llm
+
+def get_llm():
+    """
+    Returns the process-wide LLM client, constructing it on first use.
+    """
+    if _llm is None:
+        return init_llm()
+    return _llm
+
+def __getattr__(name):
+    # Backwards compatible 'from llm import llm' / 'from llm import config'
+    if name == "llm":
+        return get_llm()
+    if name == "config":
+        return load_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
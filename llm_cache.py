@@ -0,0 +1,300 @@
+import os
+import time
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+from utils import load_config
+from deadline import call_with_deadline, current_deadline
+
+logger = logging.getLogger("root")
+logger.info("Imported LLM Cache module")
+
+# Seconds after which an in-flight claim by another process is considered dead.
+# About as long as a slow LLM call: a process that died mid-call blocks the
+# identical request in every other worker until then
+INFLIGHT_LEASE = 120
+INFLIGHT_POLL = 0.5
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM responses stored in SQLite (WAL mode), so that
+    several worker processes can share one file.
+
+    Entries are evicted least-recently-used first once the stored payloads exceed
+    'max_bytes'. Identical requests that are in flight at the same time, in this
+    process or in another one, are coalesced so the LLM is only called once. A claim
+    older than 'lease' seconds is taken over, so a crashed process does not block others.
+    """
+    def __init__(self, path: str, max_bytes: int, lease: float = INFLIGHT_LEASE):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes
+        self.lease = lease
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access);
+            CREATE TABLE IF NOT EXISTS inflight (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                started REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+        conn.commit()
+
+        logger.info(f"LLM cache opened at {self.path} (max {self.max_bytes} bytes)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must not be shared between threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA busy_timeout=30000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO counters(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+        conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses(key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, value, len(value.encode("utf-8")), now, now)
+        )
+        conn.commit()
+        self._evict()
+
+    def _evict(self) -> None:
+        conn = self._conn()
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        conn.commit()
+        logger.info(f"LLM cache evicted {len(victims)} entries")
+
+    def _claim(self, key: str) -> bool:
+        """
+        Tries to become the process that computes 'key'. Stale claims are taken over.
+        """
+        conn = self._conn()
+        now = time.time()
+        conn.execute("DELETE FROM inflight WHERE key = ? AND started < ?", (key, now - self.lease))
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO inflight(key, owner, started) VALUES (?, ?, ?)",
+            (key, str(os.getpid()), now)
+        )
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def _release(self, key: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, str(os.getpid())))
+        conn.commit()
+
+    def get_or_compute(self, key: str, compute) -> str:
+        """
+        Returns the cached value for 'key', calling 'compute()' only if no other
+        caller (thread or process) already has the same request in flight.
+
+        Args:
+            key (str): The content hash of the request.
+            compute (callable): Returns the value to store as a string.
+
+        Returns:
+            str: The cached or freshly computed value.
+        """
+        value = self.get(key)
+        if value is not None:
+            self._count("hits")
+            return value
+
+        # Coalesce with identical requests running in other threads of this process
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not owner:
+            event.wait()
+            value = self.get(key)
+            if value is not None:
+                self._count("coalesced")
+                return value
+            return self.get_or_compute(key, compute)
+
+        try:
+            # Coalesce with identical requests running in other processes
+            while not self._claim(key):
+                time.sleep(INFLIGHT_POLL)
+                value = self.get(key)
+                if value is not None:
+                    self._count("coalesced")
+                    return value
+
+            try:
+                value = self.get(key)
+                if value is not None:
+                    self._count("coalesced")
+                    return value
+                self._count("misses")
+                value = compute()
+                self.put(key, value)
+                return value
+            finally:
+                self._release(key)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the counters of this process and the totals stored in the cache file.
+        """
+        conn = self._conn()
+        stored = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "total_hits": stored.get("hits", 0),
+            "total_misses": stored.get("misses", 0),
+            "total_coalesced": stored.get("coalesced", 0),
+            "entries": entries,
+            "bytes": size,
+        }
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Optional[LLMCache]:
+    """
+    Returns the process-wide cache configured in the [CACHE] table of config.toml,
+    or None when caching is disabled.
+    """
+    global _cache
+    cache_config = load_config().get("CACHE", {})
+    if not cache_config.get("enabled", False):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(
+                path=cache_config.get("path", ".cache/llm_cache.sqlite"),
+                max_bytes=int(cache_config.get("max_mb", 512) * 1024 * 1024),
+                lease=cache_config.get("inflight_lease", INFLIGHT_LEASE)
+            )
+    return _cache
+
+def request_key(llm, schema, messages, variant=None) -> str:
+    """
+    Hashes everything that determines the LLM response: model, deployment,
+    structured-output schema and the rendered messages.
+    """
+    payload = {
+        "model": getattr(llm, "model_name", None),
+        "deployment": getattr(llm, "deployment_name", None),
+        "schema": schema.schema(),
+        "messages": [[message.type, message.content] for message in messages],
+        "variant": variant,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+class CachedStructuredChain:
+    """
+    Equivalent of 'prompt | llm.with_structured_output(schema)' that looks the
+    rendered prompt up in the LLM cache before calling the model. Under a run
+    deadline the time left is the request timeout, and the caller stops waiting
+    for the model when the deadline passes or the run is cancelled.
+    """
+    def __init__(self, prompt, llm, schema):
+        self.prompt = prompt
+        self.llm = llm
+        self.schema = schema
+        self.structured_llm = llm.with_structured_output(schema)
+
+    def invoke(self, inputs: Dict, variant=None):
+        """
+        Args:
+            inputs (Dict): Prompt variables.
+            variant: Optional extra key component, used to draw several
+                     independent samples for the same prompt.
+        """
+        prompt_value = self.prompt.invoke(inputs)
+        cache = get_cache()
+        if cache is None:
+            return call_with_deadline(lambda: self._call_model(prompt_value), "LLM call")
+
+        messages = prompt_value.to_messages()
+        key = request_key(self.llm, self.schema, messages, variant)
+
+        def compute():
+            return self._call_model(prompt_value).json()
+
+        # A call abandoned on cancellation still completes in the background and fills the cache
+        response = self.schema.parse_raw(
+            call_with_deadline(lambda: cache.get_or_compute(key, compute), "LLM call")
+        )
+        logger.debug(f"LLM cache stats: {cache.stats()}")
+        return response
+
+    def _call_model(self, prompt_value):
+        # The request ends by the run deadline, so the thread waiting on it does not outlive the run
+        deadline = current_deadline()
+        timeout = deadline.remaining() if deadline is not None else None
+        if timeout is None:
+            return self.structured_llm.invoke(prompt_value)
+        return self.structured_llm.invoke(prompt_value, timeout=timeout)
@@ -6,8 +6,13 @@ Created on Mon May 31 12:02:54 2021
 """
 import json
 import os
+import contextlib
 import logging.config
 
+LOGGER_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logger.json")
+
+_initialized = False
+
 class StdOutLevelFilter(object):
     def __init__(self, level):
         self.level = getattr(logging, level)
@@ -15,21 +20,65 @@ class StdOutLevelFilter(object):
     def filter(self, record):
         return record.levelno <= self.level
 
-# Check if the directory already exists
-if not os.path.exists("logs"):
-    # Create the directory
-    os.makedirs("logs")
-    print("Directory created successfully!")
+def init_logging(log_dir="logs"):
+    """
+    Configures logging from logger.json, writing the log file into 'log_dir'.
+    Importing this module has no side effects; entry points call this once.
+    Later calls in the same process are ignored.
+
+    Args:
+        log_dir (str): Folder for rag.log, created if missing. None logs to the
+            console only (see log_to_file for files added later).
+    """
+    global _initialized
+    if _initialized:
+        return
+    _initialized = True
 
-with open("logger.json", "r") as f:
-    json_config = json.load(f)
+    with open(LOGGER_CONFIG_PATH, "r") as f:
+        json_config = json.load(f)
+    if log_dir is None:
+        del json_config["handlers"]["file"]
+        json_config["loggers"]["root"]["handlers"].remove("file")
+    else:
+        # Check if the directory already exists
+        if not os.path.exists(log_dir):
+            # Create the directory
+            os.makedirs(log_dir)
+        json_config["handlers"]["file"]["filename"] = os.path.join(log_dir, "rag.log")
     logging.config.dictConfig(json_config)
 
-logger = logging.getLogger("root")
+    logging.getLogger("root").info("Imported the logging module")
+
+@contextlib.contextmanager
+def log_to_file(log_dir):
+    """
+    Also writes the 'root' logger to 'log_dir/rag.log' (set up like the file handler
+    of logger.json) while the block runs, e.g. one log per spec in a batch worker.
+
+    Args:
+        log_dir (str): Folder for rag.log, created if missing.
+    """
+    with open(LOGGER_CONFIG_PATH, "r") as f:
+        json_config = json.load(f)
+    file_config = json_config["handlers"]["file"]
+
+    os.makedirs(log_dir, exist_ok=True)
+    handler = logging.FileHandler(os.path.join(log_dir, "rag.log"), mode=file_config["mode"])
+    handler.setLevel(file_config["level"])
+    handler.setFormatter(logging.Formatter(json_config["formatters"][file_config["formatter"]]["format"]))
 
-logger.info("Imported the logging module")
+    logger = logging.getLogger("root")
+    logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
 
 if __name__ == "__main__":
+    init_logging()
+    logger = logging.getLogger("root")
     # Redirect print statements to the logger
     print("This is a print statement")
     logger.debug("Testing the errorLogging Module")
@@ -0,0 +1,91 @@
+import re
+import logging
+from typing import List, Sequence
+
+from utils import normalize_verilog
+
+logger = logging.getLogger("root")
+logger.info("Imported Patching module")
+
+_MODULE_PATTERN = re.compile(r"\bmodule\b")
+_ENDMODULE_PATTERN = re.compile(r"\bendmodule\b")
+
+class PatchError(ValueError):
+    """
+    Raised when line edits do not apply cleanly to the source they were made for.
+    """
+
+def apply_line_edits(source: str, edits: Sequence) -> str:
+    """
+    Applies line-range edits made against the line-numbered 'source'.
+
+    Each edit has 'start_line', 'end_line' (1-based, inclusive), 'original' and
+    'replacement'. Lines start_line..end_line are replaced by 'replacement';
+    end_line = start_line - 1 inserts before start_line. 'original' must match the
+    replaced lines up to comments and whitespace, which catches edits against
+    hallucinated or shifted line numbers. Edits must not overlap.
+
+    Args:
+        source (str): The code the edits refer to.
+        edits (Sequence): Objects or dicts with the fields above.
+
+    Returns:
+        str: The patched code.
+
+    Raises:
+        PatchError: If an edit is out of range, overlaps another one, does not match
+                    the original lines, or the result is not a complete set of modules.
+    """
+    get = lambda edit, key: edit[key] if isinstance(edit, dict) else getattr(edit, key)
+    lines = source.split("\n")
+
+    if not edits:
+        raise PatchError("The patch contains no edits")
+
+    normalized = sorted(
+        ((int(get(edit, "start_line")), int(get(edit, "end_line")), get(edit, "original") or "", get(edit, "replacement") or "")
+         for edit in edits),
+        key=lambda edit: (edit[0], edit[1])
+    )
+
+    previous_end = 0
+    for start, end, original, _ in normalized:
+        if not (1 <= start <= len(lines) + 1 and start - 1 <= end <= len(lines)):
+            raise PatchError(f"Edit of lines {start}-{end} is outside the {len(lines)}-line source")
+        if start <= previous_end:
+            raise PatchError(f"Edit of lines {start}-{end} overlaps the previous edit ending at line {previous_end}")
+        if end >= start and normalize_verilog("\n".join(lines[start - 1:end])) != normalize_verilog(original):
+            raise PatchError(f"Edit of lines {start}-{end} does not match the original lines")
+        previous_end = end
+
+    # Bottom-up, so earlier line numbers stay valid
+    for start, end, _, replacement in reversed(normalized):
+        new_lines = replacement.split("\n") if replacement else []
+        if new_lines and new_lines[-1] == "":
+            new_lines.pop()
+        lines[start - 1:end] = new_lines
+
+    patched = "\n".join(lines)
+    validate_modules(patched)
+    return patched
+
+def validate_modules(code: str) -> None:
+    """
+    Cheap structural check of patched code: at least one module, and every
+    'module' closed by an 'endmodule'.
+    """
+    stripped = normalize_verilog(code)
+    opened = len(_MODULE_PATTERN.findall(stripped))
+    closed = len(_ENDMODULE_PATTERN.findall(stripped))
+    if opened == 0 or opened != closed:
+        raise PatchError(f"Patched code has {opened} 'module' and {closed} 'endmodule' keywords")
+
+def describe_edits(edits: Sequence) -> List[str]:
+    """
+    One line per edit for the log.
+    """
+    get = lambda edit, key: edit[key] if isinstance(edit, dict) else getattr(edit, key)
+    return [
+        f"lines {get(edit, 'start_line')}-{get(edit, 'end_line')} -> {len((get(edit, 'replacement') or '').splitlines())} lines"
+        for edit in edits
+    ]
@@ -0,0 +1,210 @@
+import re
+import logging
+import functools
+from dataclasses import dataclass
+from typing import List, Optional
+
+from utils import load_config
+from source_view import SourceView
+
+logger = logging.getLogger("root")
+logger.info("Imported Prompt Budget module")
+
+# Lines a truncated log is centred on
+FAILURE_LINE_PATTERN = re.compile(r"Mismatch|[Ee]rror|FAILED|syntax|sorry:|WARNING")
+
+# A section is never shrunk below this many tokens
+MIN_SECTION_TOKENS = 64
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    """
+    Returns a local tiktoken encoding for the configured model, or None when
+    tiktoken (or its encoding files) is not available.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.info("tiktoken is not installed, estimating tokens as characters / 4")
+        return None
+    model = load_config().get("LLM", {}).get("model", "")
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            logger.info("No tiktoken encoding available offline, estimating tokens as characters / 4")
+            return None
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the tokens of 'text' with the local tokenizer, or estimates them.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+def _keep_lines(lines: List[str], order: List[int], max_tokens: int) -> str:
+    """
+    Keeps lines in the given order of preference until 'max_tokens' is reached and
+    renders them in their original order, marking the gaps.
+    """
+    kept = set()
+    used = 0
+    for index in order:
+        cost = count_tokens(lines[index]) + 1
+        if used + cost > max_tokens:
+            break
+        kept.add(index)
+        used += cost
+
+    out = []
+    omitted = 0
+    for index, line in enumerate(lines):
+        if index in kept:
+            if omitted:
+                out.append(f"... [{omitted} lines omitted] ...")
+                omitted = 0
+            out.append(line)
+        else:
+            omitted += 1
+    if omitted:
+        out.append(f"... [{omitted} lines omitted] ...")
+    return "\n".join(out)
+
+def truncate_log(text: str, max_tokens: int) -> str:
+    """
+    Shortens a simulation log to about 'max_tokens', keeping the first failure
+    lines and the lines around the first one (more after it than before it).
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.split("\n")
+    failures = [i for i, line in enumerate(lines) if FAILURE_LINE_PATTERN.search(line)]
+    first = failures[0] if failures else 0
+
+    def distance(i):
+        return i - first if i >= first else 2 * (first - i)
+
+    order = failures[:5] + sorted((i for i in range(len(lines)) if i not in failures[:5]), key=distance)
+    return _keep_lines(lines, order, max_tokens)
+
+def truncate_middle(text: str, max_tokens: int) -> str:
+    """
+    Shortens text to about 'max_tokens' by dropping lines from its middle.
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.split("\n")
+    head = list(range(0, (len(lines) + 1) // 2))
+    tail = list(range(len(lines) - 1, (len(lines) + 1) // 2 - 1, -1))
+    # Alternate two head lines per tail line
+    order = []
+    while head or tail:
+        order.extend(head[:2])
+        order.extend(tail[:1])
+        head, tail = head[2:], tail[1:]
+    return _keep_lines(lines, order, max_tokens)
+
+@dataclass
+class PromptSection:
+    """
+    One tagged block of a fix prompt.
+
+    Attributes:
+        name: Used in the token breakdown log.
+        tag: Opening tag, e.g. 'previous_code - rtl.sv'; closed without the ' - <file>' part.
+        text: Raw content. Code is line-numbered (and minified) by the assembler.
+        priority: Lower numbers are shrunk last.
+        kind: "code", "log" or "text"; decides how the section is shortened.
+        focus_lines: For code, the lines the failure points at. Long files are then
+                     shown only in windows around them (see SourceView.render_focused).
+    """
+    name: str
+    tag: str
+    text: str
+    priority: int
+    kind: str = "text"
+    focus_lines: Optional[List[int]] = None
+
+def _prepare(section: PromptSection, prompt_config: dict) -> str:
+    text = section.text or ""
+    if section.kind == "code":
+        return SourceView(text).render_focused(
+            section.focus_lines or [],
+            context=prompt_config.get("context_lines", 5),
+            max_block_lines=prompt_config.get("max_block_lines", 60),
+            full_file_lines=prompt_config.get("full_file_lines", 200),
+            minify=prompt_config.get("minify_code", True)
+        )
+    return text
+
+def _shrink(section: PromptSection, text: str, max_tokens: int) -> str:
+    if section.kind == "log":
+        return truncate_log(text, max_tokens)
+    return truncate_middle(text, max_tokens)
+
+def _wrap(section: PromptSection, text: str) -> str:
+    return f"<{section.tag}>\n{text}\n</{section.tag.split(' - ')[0]}>\n"
+
+def fit_sections(label: str, header: str, sections: List[PromptSection], max_tokens: Optional[int] = None) -> List[str]:
+    """
+    Renders the texts of the sections so that 'header' followed by the tagged
+    sections fits in 'max_tokens' ([PROMPT] max_fix_tokens by default). When over
+    budget, sections are shortened starting with the highest priority number. The
+    token count of every section is logged.
+
+    Args:
+        label (str): Name of the prompt for the log, e.g. 'mismatch_fix'.
+        header (str): Fixed text before the sections.
+        sections (List[PromptSection]): The blocks to render, in output order.
+        max_tokens (int, optional): Budget for the whole rendered text.
+
+    Returns:
+        List[str]: The rendered section texts, untagged, in section order.
+    """
+    prompt_config = load_config().get("PROMPT", {})
+    if max_tokens is None:
+        max_tokens = prompt_config.get("max_fix_tokens", 16000)
+
+    texts = [_prepare(section, prompt_config) for section in sections]
+    original = [count_tokens(text) for text in texts]
+    tokens = list(original)
+
+    overhead = count_tokens(header) + sum(count_tokens(_wrap(section, "")) for section in sections)
+    excess = overhead + sum(tokens) - max_tokens
+    for index in sorted(range(len(sections)), key=lambda i: sections[i].priority, reverse=True):
+        if excess <= 0:
+            break
+        target = max(MIN_SECTION_TOKENS, tokens[index] - excess)
+        if target >= tokens[index]:
+            continue
+        texts[index] = _shrink(sections[index], texts[index], target)
+        new_tokens = count_tokens(texts[index])
+        excess -= tokens[index] - new_tokens
+        tokens[index] = new_tokens
+
+    breakdown = ", ".join(
+        f"{section.name} {tokens[i]}" + (f" (from {original[i]})" if tokens[i] != original[i] else "")
+        for i, section in enumerate(sections)
+    )
+    logger.info(f"Prompt '{label}': {overhead + sum(tokens)}/{max_tokens} tokens; {breakdown}")
+    return texts
+
+def assemble_prompt(label: str, header: str, sections: List[PromptSection], max_tokens: Optional[int] = None) -> str:
+    """
+    Renders 'header' followed by the tagged sections within 'max_tokens', see fit_sections.
+
+    Returns:
+        str: The assembled prompt text.
+    """
+    texts = fit_sections(label, header, sections, max_tokens)
+    return header + "".join(_wrap(section, text) for section, text in zip(sections, texts))
+
+def few_shot_on_fix() -> bool:
+    """
+    Whether fix prompts keep the few-shot examples ([PROMPT] few_shot_on_fix).
+    """
+    return load_config().get("PROMPT", {}).get("few_shot_on_fix", False)
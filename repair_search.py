@@ -0,0 +1,187 @@
+import time
+import logging
+import hashlib
+import threading
+import contextvars
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llm import usage_scope
+
+logger = logging.getLogger("root")
+logger.info("Imported Repair Search module")
+
+@dataclass
+class RepairNode:
+    """
+    One version of the design in the repair tree, with its evaluation.
+    """
+    rtl_code: str
+    tb_code: str
+    if_code: str
+    depth: int = 0
+    compiles: bool = False
+    sim_ran: bool = False
+    is_pass: bool = False
+    mismatch_cnt: int = 0
+    sim_output: Dict = field(default_factory=dict)
+    parent: Optional["RepairNode"] = field(default=None, repr=False)
+
+    @property
+    def node_id(self) -> str:
+        digest = hashlib.sha256()
+        for code in (self.rtl_code, self.tb_code, self.if_code):
+            digest.update(code.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()[:16]
+
+def candidate_score(candidate) -> Tuple:
+    """
+    Higher is better: passing, then compiling, then simulating cleanly, then fewer mismatches.
+    Accepts a RepairNode or a dict with the same keys.
+    """
+    get = candidate.get if isinstance(candidate, dict) else lambda key: getattr(candidate, key)
+    return (get("is_pass"), get("compiles"), get("sim_ran"), -get("mismatch_cnt"))
+
+class BeamRepairSearch:
+    """
+    Beam search over fix attempts. Every node in the beam is prepared once (e.g. one
+    judge call shared by its branches) and expanded into 'branch_factor' children (one
+    LLM fix each), all children are evaluated in simulation concurrently, and the best
+    'beam_width' children are kept for the next round. Children that do not compile are
+    pruned while any sibling compiles. The search stops at the first passing child,
+    after 'max_depth' rounds, or when the LLM-call or wall-clock budget is spent.
+
+    The LLM calls a prepare() or expand() actually made (cache hits are free) are
+    charged to 'max_llm_calls'. As branches run concurrently, a call is reserved up
+    front and settled against the actual count afterwards.
+
+    Args:
+        expand (callable): expand(node, branch_index, prepared) -> (rtl_code, tb_code, if_code),
+            where 'prepared' is what prepare(node) returned (None without prepare).
+        evaluate (callable): evaluate(node) fills in the evaluation fields of the node.
+        prepare (callable, optional): prepare(node), run once per node before it is expanded.
+    """
+    def __init__(
+        self,
+        expand: Callable[[RepairNode, int, Any], Tuple[str, str, str]],
+        evaluate: Callable[[RepairNode], None],
+        beam_width: int,
+        branch_factor: int,
+        max_depth: int,
+        max_llm_calls: int,
+        max_seconds: float,
+        prepare: Optional[Callable[[RepairNode], Any]] = None,
+    ):
+        self.expand = expand
+        self.evaluate = evaluate
+        self.prepare = prepare
+        self.beam_width = max(1, beam_width)
+        self.branch_factor = max(1, branch_factor)
+        self.max_depth = max(1, max_depth)
+        self.max_llm_calls = max_llm_calls
+        self.max_seconds = max_seconds
+
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def _reserve_call(self) -> bool:
+        with self._lock:
+            if self.llm_calls >= self.max_llm_calls:
+                return False
+            self.llm_calls += 1
+            return True
+
+    def _settle_call(self, actual_calls: int) -> None:
+        with self._lock:
+            self.llm_calls += actual_calls - 1
+
+    def _charged(self, function: Callable, *args) -> Any:
+        """
+        Runs 'function' on one reserved LLM call and charges the calls it actually made.
+        """
+        with usage_scope() as usage:
+            try:
+                return function(*args)
+            finally:
+                self._settle_call(usage["calls"])
+
+    def _prepare(self, node: RepairNode, deadline: float) -> Tuple[bool, Any]:
+        if self.prepare is None:
+            return True, None
+        if time.monotonic() >= deadline or not self._reserve_call():
+            return False, None
+        try:
+            return True, self._charged(self.prepare, node)
+        except Exception:
+            logger.exception(f"Preparing repair node {node.node_id} failed")
+            return False, None
+
+    def _grow(self, parent: RepairNode, branch_index: int, prepared: Any, deadline: float) -> Optional[RepairNode]:
+        if time.monotonic() >= deadline or not self._reserve_call():
+            return None
+        try:
+            rtl_code, tb_code, if_code = self._charged(self.expand, parent, branch_index, prepared)
+            child = RepairNode(rtl_code=rtl_code, tb_code=tb_code, if_code=if_code,
+                               depth=parent.depth + 1, parent=parent)
+            self.evaluate(child)
+        except Exception:
+            logger.exception(f"Repair branch {branch_index} of node {parent.node_id} failed")
+            return None
+        logger.info(f"Repair node {child.node_id} (depth {child.depth}, parent {parent.node_id}): "
+                    f"compiles={child.compiles}, sim_ran={child.sim_ran}, "
+                    f"is_pass={child.is_pass}, mismatch_cnt={child.mismatch_cnt}")
+        return child
+
+    def run(self, root: RepairNode) -> RepairNode:
+        """
+        Searches from 'root' (already evaluated) and returns the best node found,
+        which is 'root' itself if no child scored higher.
+        """
+        deadline = time.monotonic() + self.max_seconds
+        best = root
+        beam = [root]
+        seen = {root.node_id}
+
+        with ThreadPoolExecutor(max_workers=self.beam_width * self.branch_factor) as pool:
+            for depth in range(1, self.max_depth + 1):
+                preparations = [
+                    pool.submit(contextvars.copy_context().run, self._prepare, parent, deadline)
+                    for parent in beam
+                ]
+                prepared = [(parent, future.result()) for parent, future in zip(beam, preparations)]
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._grow, parent, branch_index, value, deadline)
+                    for parent, (ready, value) in prepared if ready
+                    for branch_index in range(self.branch_factor)
+                ]
+                children = []
+                for future in futures:
+                    child = future.result()
+                    # Identical regenerations add nothing to the beam
+                    if child is not None and child.node_id not in seen:
+                        seen.add(child.node_id)
+                        children.append(child)
+
+                if not children:
+                    logger.info(f"Repair search stopped at depth {depth}: no new candidates (budget or failures)")
+                    break
+
+                children.sort(key=candidate_score, reverse=True)
+                if candidate_score(children[0]) > candidate_score(best):
+                    best = children[0]
+                if best.is_pass:
+                    logger.info(f"Repair search found a passing design at depth {depth}")
+                    break
+
+                compiling = [child for child in children if child.compiles]
+                beam = (compiling or children)[:self.beam_width]
+
+                if time.monotonic() >= deadline:
+                    logger.info("Repair search stopped: wall-clock budget spent")
+                    break
+
+        logger.info(f"Repair search used {self.llm_calls} LLM calls; best node {best.node_id} "
+                    f"(depth {best.depth}, mismatch_cnt {best.mismatch_cnt})")
+        return best
@@ -1,15 +1,36 @@
+import asyncio
 import logging
 import os
 import re
-from typing import Dict, Tuple, TypedDict, List
+import hashlib
+import shutil
+import threading
+from typing import Dict, Tuple, TypedDict, List, Optional
 
-from langgraph.graph import END, StateGraph, START
-
-from rtl_generator import RTLGenerator
+from rtl_generator import RTLGenerator, PATCH_FALLBACK_ERRORS
 from tb_generator import TBGenerator
-from utils import add_lineno
-from windows_cmd import run_cmd_command
+from utils import load_config
+from windows_cmd import STATUS_OK, STATUS_FAILED, STATUS_TIMED_OUT, STATUS_RESOURCE_EXCEEDED, STATUS_CANCELLED
+from sim_cache import get_sim_cache, content_key
+from async_cmd import run_exec, merge_results, merge_parallel_results, run_sync
 from sim_judge import SimJudge
+from repair_search import BeamRepairSearch, RepairNode
+from iteration_history import IterationHistory
+from convergence import RunBudget, ConvergenceMonitor, STOP_PASSED, STOP_MAX_ITERATIONS, STOP_DEADLINE
+from deadline import Deadline, current_deadline, deadline_scope
+from prompt_budget import PromptSection, assemble_prompt, fit_sections, few_shot_on_fix
+from sim_result import SimResult, SimOutputMonitor, merge_sim_results, parse_sim_stdout
+from scratch import scratch_dir, copy_back, kept_artifacts
+from simulators import BACKENDS, IcarusBackend, SIMULATOR_AUTO, select_backend
+from sim_service import get_service_client
+from waveform import (
+    DUMP_ALWAYS, DUMP_ON_FAIL, WINDOW_VCD_NAME, dump_mode, dump_window, dump_window_module,
+    strip_dump_calls, top_module_name
+)
+from source_view import SourceView
+from diagnostics import (
+    Diagnostic, parse_diagnostics, all_lines_benign, category_counts, format_diagnostics, route_fix
+)
 
 logger = logging.getLogger("root")
 logger.info("Imported SimReviewer module")
@@ -35,97 +56,443 @@ def read_verilog_file(file_path):
         logger.exception(f"An unexpected error occurred")
         return None
 
-BENIGN_STDERRS = [
-    r"^\S+:\d+: sorry: constant selects in always_\* processes are not currently supported \(all bits will be included\)\.$"
-]
-
 def stderr_all_lines_benign(stderr: str) -> bool:
-    return all(
-        any(re.match(pattern, line) for pattern in BENIGN_STDERRS)
-        for line in stderr.splitlines()
-    )
+    return all_lines_benign(stderr)
 
-def check_rtl(rtl_path: str) -> Tuple[bool, str]:
+def sim_stderr_ok(sim_output: Dict) -> bool:
+    """
+    True if the stderr of a tool run is acceptable for the simulator that produced it.
+    """
+    return BACKENDS[sim_output.get("simulator", IcarusBackend.name)].stderr_ok(sim_output["stderr"])
+
+def sim_compiled(sim_output: Dict) -> bool:
+    """
+    True if the simulation build of a tool run compiled (results that predate the
+    flag only know whether the whole run succeeded).
+    """
+    return sim_output.get("compiled", sim_output["success"])
 
-    temp_folder_path = os.path.join(os.getcwd(), "temp")
-    cmd = f"iverilog -t null -Wall -Winfloop -Wno-timescale -g2012 -o {temp_folder_path} {rtl_path}"
+def attach_diagnostics(sim_output: Dict) -> None:
+    """
+    Parses the stderr of a tool run into sim_output['diagnostics'] (list of dicts)
+    and sim_output['diagnostic_counts'] (per category).
+    """
+    diagnostics = parse_diagnostics(sim_output["stderr"])
+    sim_output["diagnostics"] = [diagnostic.to_dict() for diagnostic in diagnostics]
+    sim_output["diagnostic_counts"] = category_counts(diagnostics)
+    if diagnostics:
+        logger.info(f"Diagnostics: {sim_output['diagnostic_counts']}")
 
-    sim_output = run_cmd_command(cmd)
+def sim_diagnostics(sim_output: Dict) -> List[Diagnostic]:
+    """
+    Returns the parsed diagnostics of a tool run (parsing stderr for results that predate them).
+    """
+    if "diagnostics" in sim_output:
+        return [Diagnostic(**item) for item in sim_output["diagnostics"]]
+    return parse_diagnostics(sim_output.get("stderr", ""))
+
+def sim_failing_diagnostics(sim_output: Dict) -> List[Diagnostic]:
+    """
+    Returns the diagnostics of a tool run that failed it under the simulator that produced it.
+    """
+    return BACKENDS[sim_output.get("simulator", IcarusBackend.name)].failing(sim_diagnostics(sim_output))
+
+def sim_result(sim_output: Dict) -> SimResult:
+    """
+    Returns the parsed stdout of a tool run (parsing stdout for results that were not streamed).
+    """
+    if "sim_result" in sim_output:
+        return SimResult.from_dict(sim_output["sim_result"])
+    return parse_sim_stdout(sim_output.get("stdout", ""))
+
+async def check_rtl_async(rtl_path: str, simulator: Optional[str] = None) -> Tuple[bool, Dict]:
+
+    # Without a testbench there is no cycle estimate; "auto" lints with iverilog
+    backend = select_backend(simulator)
+
+    # Every check gets its own output path, so concurrent checks do not collide
+    with scratch_dir(prefix="check_") as scratch:
+        sim_output = await run_exec(backend.lint_argv(os.path.abspath(rtl_path), scratch), cwd=scratch)
+    sim_output["simulator"] = backend.name
+    attach_diagnostics(sim_output)
 
     is_pass = (
         sim_output["success"]
         and "syntax error" not in sim_output["stdout"]
-        and (
-            sim_output["stderr"] == ""
-            or stderr_all_lines_benign(sim_output["stderr"])
-        )
+        and backend.stderr_ok(sim_output["stderr"])
     )
     logger.info(f"Syntax check is_pass: {is_pass}")
     logger.info(f"STDOUT: {sim_output['stdout']}")
     logger.info(f"STDERR: {sim_output['stderr']}")
     logger.info(f"RETURN: {sim_output['returncode']}")
+    logger.info(f"STATUS: {sim_output['status']}")
     return is_pass, sim_output
 
-def sim_review_mismatch_cnt(stdout: str) -> int:
-    mismatch_cnt = 0
-    if "SIMULATION FAILED" in stdout:
-        mismatch_lines = []
-        for line in stdout.strip().split('\n'):
-            if line.startswith("Mismatch"):
-                mismatch_lines.append(line)
-        mismatch_cnt = len(mismatch_lines)
-    return mismatch_cnt
-
-def sim_review_get_mismatch_lines(stdout: str) -> List[str]:
-    if "SIMULATION FAILED" in stdout:
-        mismatch_lines = []
-        for line in stdout.strip().split('\n'):
-            if line.startswith("Mismatch"):
-                mismatch_lines.append(line)
-        return mismatch_lines
-    else:
-        return []
-def sim_review_get_warning_lines(stdout: str) -> List[str]:
-    mismatch_lines = []
-    for line in stdout.strip().split('\n'):
-        if line.startswith("WARNING"):
-            mismatch_lines.append(line)
-    return mismatch_lines
+def check_rtl(rtl_path: str, simulator: Optional[str] = None) -> Tuple[bool, Dict]:
+    # Queued on the shared simulation service when one is configured and running
+    client = get_service_client()
+    response = client.check(rtl_path, simulator) if client is not None else None
+    if response is not None:
+        return response["is_pass"], response["sim_output"]
+    return run_sync(check_rtl_async(rtl_path, simulator))
+
+SIM_LOG_NAME = "sim_log.txt"
+
+RUN_DIR_PLACEHOLDER = "<run_dir>"
+
+def _to_cacheable(sim_output: Dict, output_dir_per_run: str) -> Dict:
+    # Paths in tool messages refer to the run folder; store them relative to it
+    return {
+        key: value.replace(output_dir_per_run, RUN_DIR_PLACEHOLDER) if isinstance(value, str) else value
+        for key, value in sim_output.items()
+    }
+
+def _from_cacheable(sim_output: Dict, output_dir_per_run: str) -> Dict:
+    restored = {
+        key: value.replace(RUN_DIR_PLACEHOLDER, output_dir_per_run) if isinstance(value, str) else value
+        for key, value in sim_output.items()
+    }
+    restored["cached"] = True
+    return restored
+
+def sim_did_not_finish(sim_output: Dict) -> bool:
+    """
+    True if the command was killed at its wall clock limit, ran into a resource
+    limit or was cancelled, i.e. its output says nothing about functional correctness.
+    """
+    return sim_output.get("status") in (STATUS_TIMED_OUT, STATUS_RESOURCE_EXCEEDED, STATUS_CANCELLED)
 
-def sim_review(
-    output_dir_per_run: str,
-) -> Tuple[bool, int, str]:
-    rtl_path = os.path.join(output_dir_per_run, "rtl.sv")
-    vvp_name = os.path.join(output_dir_per_run, "sim_output.vvp")
-    tb_path = os.path.join(output_dir_per_run, "tb.sv")
+# A testbench that reads this plusarg runs only its slice of the test cases
+SHARD_PLUSARG = "shard_count"
 
-    if os.path.isfile(vvp_name):
-        os.remove(vvp_name)
+def sim_variants(sim_config: Dict, tb_code: str = "") -> List[Tuple[str, List[str]]]:
+    """
+    Returns (label, plusargs) for every simulation a check runs on the compiled
+    design: one per seed with [SIM] seeds > 1 ('+seed=<n>', counting up from
+    [SIM] base_seed), times one per shard with [SIM] shards > 1
+    ('+shard_index=<i> +shard_count=<n>'). Shards are only used when the
+    testbench reads SHARD_PLUSARG; otherwise every shard would run all test cases.
+    A single variant is unlabelled and has no plusargs.
+    """
+    seeds = max(1, sim_config.get("seeds", 1))
+    base_seed = sim_config.get("base_seed", 1)
+    shards = max(1, sim_config.get("shards", 1))
+    if shards > 1 and SHARD_PLUSARG not in tb_code:
+        logger.info(f"Testbench does not read +{SHARD_PLUSARG}, running it unsharded")
+        shards = 1
+
+    seed_variants = [("", [])]
+    if seeds > 1:
+        seed_variants = [(f"seed{seed}", [f"+seed={seed}"]) for seed in range(base_seed, base_seed + seeds)]
+    shard_variants = [("", [])]
+    if shards > 1:
+        shard_variants = [(f"shard{index}", [f"+shard_index={index}", f"+shard_count={shards}"]) for index in range(shards)]
+    return [
+        ("_".join(part for part in (seed_label, shard_label) if part), seed_args + shard_args)
+        for seed_label, seed_args in seed_variants
+        for shard_label, shard_args in shard_variants
+    ]
+
+def _sim_monitor(sim_config: Dict) -> SimOutputMonitor:
+    # Stops a simulation early once its failures have been seen, see [SIM] max_mismatches
+    return SimOutputMonitor(
+        max_mismatches=sim_config.get("max_mismatches", 20),
+        max_failing_bytes=int(sim_config.get("max_failing_output_kb", 256) * 1024),
+        keep_lines=sim_config.get("max_mismatches", 20) or 20
+    )
 
-    cmd = "iverilog -Wall -Winfloop -Wno-timescale -g2012 -o {} {} {}&&vvp -n {}".format(
-        vvp_name, tb_path, rtl_path, vvp_name
+async def _simulate_variant(backend, scratch: str, output_dir_per_run: str, label: str,
+                            plusargs: List[str], sim_config: Dict,
+                            waveforms: bool = True) -> Tuple[Dict, SimResult, List[str]]:
+    """
+    Runs one simulation of the design compiled in 'scratch'. A labelled variant runs
+    in its own subfolder, so parallel variants do not share dump files, and writes
+    'sim_log_<label>.txt' and '<label>_<waveform>' into the run folder. With
+    'waveforms' False, the testbench's waveform dumps are suppressed.
+
+    Returns:
+        Tuple[Dict, SimResult, List[str]]: The run_exec result, the parsed output
+        and the files kept in the run folder.
+    """
+    monitor = _sim_monitor(sim_config)
+    run_dir = os.path.join(scratch, label) if label else scratch
+    os.makedirs(run_dir, exist_ok=True)
+    log_path = os.path.join(output_dir_per_run, f"sim_log_{label}.txt" if label else SIM_LOG_NAME)
+
+    run_output = await run_exec(
+        backend.run_argv(scratch, plusargs, waveforms),
+        cwd=run_dir,
+        stdout_path=log_path,
+        on_stdout_line=monitor,
+        stdout_head_bytes=int(sim_config.get("stdout_head_kb", 64) * 1024)
+    )
+    # Stopping early on mismatches is a functional failure, not a run failure
+    run_output["success"] = run_output["success"] or run_output["aborted"]
+    result = monitor.finish(run_ok=run_output["success"], stderr_ok=backend.stderr_ok(run_output["stderr"]))
+    kept = await asyncio.to_thread(copy_back, run_dir, output_dir_per_run, kept_artifacts(), prefix=f"{label}_" if label else "")
+    return run_output, result, [log_path, *kept]
+
+async def _dump_failure_window(tb_code: str, rtl_path: str, scratch: str, output_dir_per_run: str,
+                               result: SimResult, variants: List[Tuple[str, List[str]]],
+                               sim_config: Dict) -> Optional[Dict]:
+    """
+    Re-runs a failing simulation with iverilog, with the testbench's own dumps
+    removed and a module injected that dumps all signals only in the window around
+    the first mismatch and finishes the simulation at its end, and copies the
+    waveform into the run folder. The re-run stops early on mismatches like the
+    original run.
+
+    Returns:
+        Optional[Dict]: 'file' (WINDOW_VCD_NAME, relative to the run folder), 'start',
+                        'end' and 'variant', or None if no waveform was produced.
+    """
+    top = top_module_name(tb_code, read_verilog_file(rtl_path) or "")
+    if top is None:
+        return None
+    start, end = dump_window(result.first_mismatch_time, sim_config)
+    # Same plusargs (seed/shard) as the simulation that failed first
+    label = result.mismatches[0].variant if result.mismatches else None
+    if label is None:
+        label = next((variant["variant"] for variant in result.variants if not variant["is_pass"]), "")
+    plusargs = dict(variants).get(label, [])
+
+    window_dir = os.path.join(scratch, "dump_window")
+    os.makedirs(window_dir, exist_ok=True)
+    window_tb_path = os.path.join(window_dir, "tb.sv")
+    module_path = os.path.join(window_dir, "dump_window.sv")
+    with open(window_tb_path, "w") as f:
+        f.write(strip_dump_calls(tb_code))
+    with open(module_path, "w") as f:
+        f.write(dump_window_module(tb_code, top, start, end, os.path.join(window_dir, WINDOW_VCD_NAME)))
+
+    backend = BACKENDS[IcarusBackend.name]
+    logger.info(f"Re-running the failing simulation{f' ({label})' if label else ''} to dump times {start}-{end}")
+    compile_output = await run_exec(backend.compile_argv([window_tb_path, rtl_path, module_path], window_dir), cwd=window_dir)
+    if not compile_output["success"]:
+        logger.warning(f"Could not build the waveform re-run: {compile_output['stderr']}")
+        return None
+    await run_exec(
+        backend.run_argv(window_dir, plusargs),
+        cwd=window_dir,
+        stdout_path=os.path.join(window_dir, SIM_LOG_NAME),
+        on_stdout_line=_sim_monitor(sim_config),
+        stdout_head_bytes=int(sim_config.get("stdout_head_kb", 64) * 1024)
     )
+    if not await asyncio.to_thread(copy_back, window_dir, output_dir_per_run, [WINDOW_VCD_NAME]):
+        return None
+    return {"file": WINDOW_VCD_NAME, "start": start, "end": end, "variant": label}
 
-    sim_output = run_cmd_command(cmd)
+async def sim_review_async(
+    output_dir_per_run: str,
+    simulator: Optional[str] = None,
+    dump_failure: bool = False,
+) -> Tuple[bool, int, Dict]:
+    # The tools run inside a scratch folder, so paths must not be relative
+    output_dir_per_run = os.path.abspath(output_dir_per_run)
+    rtl_path = os.path.join(output_dir_per_run, "rtl.sv")
+    tb_path = os.path.join(output_dir_per_run, "tb.sv")
 
-    is_pass = (
-        sim_output["success"]
-        and "SIMULATION PASSED" in sim_output["stdout"]
-        and (
-            sim_output["stderr"] == ""
-            or stderr_all_lines_benign(sim_output["stderr"])
+    sim_config = load_config().get("SIM", {})
+    waveform_mode = dump_mode(sim_config)
+    # Failure windows are dumped under [SIM] dump_waveforms = "fail" for the runs that
+    # ask for them ('dump_failure'), i.e. the main fix loop, not beam nodes or candidates
+    dump_failure = dump_failure and waveform_mode == DUMP_ON_FAIL
+    tb_code = read_verilog_file(tb_path) or ""
+    requested = simulator or sim_config.get("simulator", SIMULATOR_AUTO)
+    backend = select_backend(requested, tb_code)
+
+    # Identical (tb, rtl) pairs skip both compile and simulation. The cache does file
+    # IO (and content_key may run the tools for their versions), so it runs in threads
+    sim_cache = get_sim_cache()
+    if sim_cache is not None:
+        extra = {key: sim_config.get(key) for key in ("max_mismatches", "max_failing_output_kb", "stdout_head_kb",
+                                                      "seeds", "base_seed", "shards", "dump_waveforms",
+                                                      "dump_window_before", "dump_window_after")}
+        cache_key = await asyncio.to_thread(
+            content_key,
+            sources=[tb_code, read_verilog_file(rtl_path) or ""],
+            flags=backend.flags,
+            tools=backend.tools,
+            extra={**extra, "dump_failure": dump_failure}
         )
-    )
-    mismatch_cnt = sim_review_mismatch_cnt(sim_output["stdout"])
+        cached = await asyncio.to_thread(sim_cache.get, cache_key, artifacts_dest=output_dir_per_run)
+        if cached is not None:
+            sim_output = _from_cacheable(cached["sim_output"], output_dir_per_run)
+            logger.info(f"Simulation result reused from cache {cache_key[:12]}: "
+                        f"is_pass: {cached['is_pass']}, mismatch_cnt: {cached['mismatch_cnt']}")
+            return cached["is_pass"], cached["mismatch_cnt"], sim_output
+
+    # The compiled image and anything the testbench dumps ($dumpfile) stay in a private
+    # scratch folder; only the logs (written in place) and waveforms end up in the run folder
+    kept = []
+    result = SimResult()
+    with scratch_dir(prefix="sim_") as scratch:
+        compile_output = await run_exec(backend.compile_argv([tb_path, rtl_path], scratch), cwd=scratch)
+        if not compile_output["success"] and requested == SIMULATOR_AUTO and backend.name != IcarusBackend.name:
+            # Automatic choice only; iverilog stays the reference for what compiles
+            logger.warning(f"{backend.name} could not build the simulation, falling back to iverilog")
+            backend = BACKENDS[IcarusBackend.name]
+            compile_output = await run_exec(backend.compile_argv([tb_path, rtl_path], scratch), cwd=scratch)
+        if compile_output["success"]:
+            # Compiled once, simulated once per variant (seed and/or shard), side by side
+            variants = sim_variants(sim_config, tb_code)
+            runs = await asyncio.gather(*[
+                _simulate_variant(backend, scratch, output_dir_per_run, label, plusargs, sim_config,
+                                  waveforms=waveform_mode == DUMP_ALWAYS)
+                for label, plusargs in variants
+            ])
+            if len(runs) == 1:
+                run_output, result, kept = runs[0]
+            else:
+                labels = [label for label, _ in variants]
+                run_output = merge_parallel_results([(label, run[0]) for label, run in zip(labels, runs)])
+                result = merge_sim_results([(label, run[1]) for label, run in zip(labels, runs)],
+                                           keep_lines=sim_config.get("max_mismatches", 20) or 20)
+                kept = [path for run in runs for path in run[2]]
+                logger.info("Simulation variants: " + ", ".join(
+                    f"{variant['variant']}: {'PASS' if variant['is_pass'] else 'FAIL'}" for variant in result.variants
+                ))
+            result.is_pass = result.is_pass and backend.stderr_ok(compile_output["stderr"])
+            sim_output = merge_results(compile_output, run_output)
+
+            # Waveforms only where the evidence is: around the first mismatch of a failing run.
+            # A run that needed Verilator for its length is not repeated under iverilog
+            if dump_failure and not result.is_pass and result.first_mismatch_time is not None:
+                if backend.name != IcarusBackend.name:
+                    logger.info(f"Not dumping the failure window of a {backend.name} run")
+                    window = None
+                else:
+                    window = await _dump_failure_window(tb_code, rtl_path, scratch, output_dir_per_run,
+                                                        result, variants, sim_config)
+                if window is not None:
+                    sim_output["failure_window"] = window
+                    kept.append(os.path.join(output_dir_per_run, window["file"]))
+        else:
+            sim_output = compile_output
+
+    sim_output["simulator"] = backend.name
+    sim_output["compiled"] = compile_output["success"]
+    attach_diagnostics(sim_output)
+    sim_output["sim_result"] = result.to_dict()
+    is_pass, mismatch_cnt = result.is_pass, result.mismatch_cnt
     logger.info(
         f"Simulation is_pass: {is_pass}, mismatch_cnt: {mismatch_cnt}"
     )
     logger.info(f"STDOUT: {sim_output['stdout']}")
     logger.info(f"STDERR: {sim_output['stderr']}")
     logger.info(f"RETURN: {sim_output['returncode']}")
+    logger.info(f"STATUS: {sim_output['status']}")
+
+    # Runs cut short by time/resource limits or errors may behave differently next time
+    if sim_cache is not None and sim_output["status"] in (STATUS_OK, STATUS_FAILED):
+        await asyncio.to_thread(
+            sim_cache.put,
+            cache_key,
+            {"is_pass": is_pass, "mismatch_cnt": mismatch_cnt, "sim_output": _to_cacheable(sim_output, output_dir_per_run)},
+            artifacts=kept
+        )
 
     return is_pass, mismatch_cnt, sim_output
 
+def sim_review(
+    output_dir_per_run: str,
+    simulator: Optional[str] = None,
+    dump_failure: bool = False,
+) -> Tuple[bool, int, Dict]:
+    client = get_service_client()
+    response = client.simulate(output_dir_per_run, simulator, dump_failure) if client is not None else None
+    if response is not None:
+        return response["is_pass"], response["mismatch_cnt"], response["sim_output"]
+    return run_sync(sim_review_async(output_dir_per_run, simulator, dump_failure))
+
+def run_fingerprint(output_dir_per_run: str) -> str:
+    """
+    Hashes the exact contents of tb.sv and rtl.sv in the run folder.
+    """
+    digest = hashlib.sha256()
+    for file_name in ("tb.sv", "rtl.sv"):
+        path = os.path.join(output_dir_per_run, file_name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+FIX_HINT_HEADER = """
+
+----- IMPORTANT HINT FROM PREVIOUS RUN -------
+
+A previous run with generated code for this specification failed in simulation. Keep this in mind when generating the new code for the {target}:
+"""
+
+def failure_focus(sim_output: Dict, rtl_code: Optional[str] = None, tb_code: Optional[str] = None) -> Dict[str, List[int]]:
+    """
+    Lines of rtl.sv/tb.sv a failure points at: diagnostic locations and the lines
+    using the signals shown in mismatch displays.
+    """
+    if not sim_output:
+        return {}
+    diagnostics = sim_diagnostics(sim_output)
+    names = sim_result(sim_output).signal_names()
+    focus = {}
+    for file_name, code in (("rtl.sv", rtl_code), ("tb.sv", tb_code)):
+        if code is None:
+            continue
+        lines = [diagnostic.line for diagnostic in diagnostics if diagnostic.file == file_name and diagnostic.line]
+        focus[file_name] = sorted(set(lines + SourceView(code).lines_mentioning(names)))
+    return focus
+
+def rtl_fix_failure_entry(rtl_code: str, sim_log: str, focus: Optional[Dict[str, List[int]]] = None) -> str:
+    """
+    Builds the failure hint for an RTL syntax fix within the prompt token budget.
+    """
+    focus = focus or {}
+    return assemble_prompt("rtl_fix", FIX_HINT_HEADER.format(target="RTL design"), [
+        PromptSection("rtl.sv", "previous_code - rtl.sv", rtl_code, priority=0, kind="code", focus_lines=focus.get("rtl.sv")),
+        PromptSection("sim_log", "failed_sim_log", sim_log, priority=1, kind="log"),
+    ])
+
+def tb_fix_failure_entry(rtl_code: str, tb_code: str, sim_log: str, focus: Optional[Dict[str, List[int]]] = None) -> str:
+    """
+    Builds the failure hint for a testbench fix after a failed simulation run.
+    """
+    focus = focus or {}
+    return assemble_prompt("tb_fix", FIX_HINT_HEADER.format(target="Testbench/ Interface Design "), [
+        PromptSection("rtl.sv", "previous_code - rtl.sv", rtl_code, priority=1, kind="code", focus_lines=focus.get("rtl.sv")),
+        PromptSection("tb.sv", "previous_tb - tb.sv", tb_code, priority=0, kind="code", focus_lines=focus.get("tb.sv")),
+        PromptSection("sim_log", "failed_sim_log", sim_log, priority=2, kind="log"),
+    ])
+
+def mismatch_fix_failure_entry(rtl_code: str, tb_code: str, sim_log: str, reasoning: str,
+                               focus: Optional[Dict[str, List[int]]] = None) -> str:
+    """
+    Builds the failure hint for a fix after a functional mismatch, including the judge's reasoning.
+    """
+    focus = focus or {}
+    return assemble_prompt("mismatch_fix", FIX_HINT_HEADER.format(target="Testbench/ Interface Design "), [
+        PromptSection("rtl.sv", "previous_code - rtl.sv", rtl_code, priority=1, kind="code", focus_lines=focus.get("rtl.sv")),
+        PromptSection("tb.sv", "previous_tb - tb.sv", tb_code, priority=1, kind="code", focus_lines=focus.get("tb.sv")),
+        PromptSection("sim_log", "failed_sim_log", sim_log, priority=2, kind="log"),
+        PromptSection("reasoning", "Output by a reasoning agent", reasoning, priority=0),
+    ])
+
+def judge_inputs(rtl_code: str, tb_code: str, sim_log: str,
+                 focus: Optional[Dict[str, List[int]]] = None) -> Tuple[str, str, str]:
+    """
+    Renders the simulation log, rtl.sv and tb.sv for the judge within the prompt
+    token budget; the judge prompt puts them in its own tags.
+
+    Returns:
+        Tuple[str, str, str]: failed_sim_log, failed_rtl and failed_testbench.
+    """
+    focus = focus or {}
+    sim_log, rtl_view, tb_view = fit_sections("judge", "", [
+        PromptSection("sim_log", "failed_sim_log", sim_log, priority=1, kind="log"),
+        PromptSection("rtl.sv", "failed_rtl", rtl_code, priority=0, kind="code", focus_lines=focus.get("rtl.sv")),
+        PromptSection("tb.sv", "failed_testbench", tb_code, priority=0, kind="code", focus_lines=focus.get("tb.sv")),
+    ])
+    return sim_log, rtl_view, tb_view
+
 class GraphState(TypedDict):
     """
     Represents the state of our graph.
@@ -135,80 +502,141 @@ class GraphState(TypedDict):
         messages : With user question, error messages, reasoning
         generation : Code solution
         iterations : Number of tries
+        last_sim : Result of the last simulation with the fingerprint of the files it ran on
+        stop_reason : Set by a check node when the fix loop should end early
     """
 
     error: bool
     sim_output: Dict
     mismatch_cnt: int
     iterations: int
+    last_sim: Dict
+    stop_reason: str
+
+def _reviewer_node(name):
+    """
+    Returns a graph node/edge function that forwards to the method 'name' of the
+    SimReviewer passed in the run config, so one compiled graph serves every run.
+    The reviewer's deadline is made current for the call; once it has passed,
+    nodes are skipped and report STOP_DEADLINE instead.
+    """
+    def node(state, config):
+        reviewer = config["configurable"]["reviewer"]
+        if name != "check_error_flag_iterations" and reviewer.deadline.expired():
+            logger.info(f"---Skipping {name}: run deadline reached---")
+            return {
+                "error": True,
+                "sim_output": {},
+                "iterations": state["iterations"],
+                "stop_reason": STOP_DEADLINE
+            }
+        with deadline_scope(reviewer.deadline):
+            return getattr(reviewer, name)(state)
+    node.__name__ = name
+    return node
+
+def build_review_graph():
+    """
+    Builds and compiles the review StateGraph. Nodes look up the SimReviewer to
+    act on in 'config["configurable"]["reviewer"]'.
+    """
+    from langgraph.graph import END, StateGraph, START
+
+    builder = StateGraph(GraphState)
+
+    # Define the nodes
+    for name in ["rtl_code_check", "rtl_code_fix", "tb_code_check", "tb_code_fix",
+                 "mismatch_check", "mismatch_fix", "proceed_to_tb", "proceed_to_mismatch"]:
+        builder.add_node(name, _reviewer_node(name))
+
+    check_error_flag_iterations = _reviewer_node("check_error_flag_iterations")
+
+    # Build graph
+    builder.add_edge(START, "rtl_code_check")
+
+    builder.add_conditional_edges(
+        "rtl_code_check",
+        check_error_flag_iterations,
+        {
+            "end": END,
+            "fix": "rtl_code_fix",
+            "forward": "proceed_to_tb"
+        },
+    )
+    builder.add_edge("rtl_code_fix", "rtl_code_check")
+    builder.add_edge("proceed_to_tb", "tb_code_check")
+
+    builder.add_conditional_edges(
+        "tb_code_check",
+        check_error_flag_iterations,
+        {
+            "end": END,
+            "fix": "tb_code_fix",
+            "forward": "proceed_to_mismatch"
+        },
+    )
+    builder.add_edge("tb_code_fix", "tb_code_check")
+    builder.add_edge("proceed_to_mismatch", "mismatch_check")
+
+    builder.add_conditional_edges(
+        "mismatch_check",
+        check_error_flag_iterations,
+        {
+            "end": END,
+            "fix": "mismatch_fix",
+            "forward": END
+        },
+    )
+    builder.add_edge("mismatch_fix", "mismatch_check")
+
+    return builder.compile()
 
 class SimReviewer:
 
-    def __init__(self, input_spec, output_dir_per_run, max_iterations):
+    # The compiled graph does not depend on the spec, so it is shared by all instances
+    _graph = None
+    _graph_lock = threading.Lock()
+
+    def __init__(self, input_spec, output_dir_per_run, max_iterations, budget: RunBudget | None = None,
+                 deadline: Deadline | None = None, simulator: str | None = None):
 
 
         self.input_spec = input_spec
         self.output_dir_per_run = output_dir_per_run
         self.max_iterations = max_iterations
-
-        builder = StateGraph(GraphState)
-
-        # Define the nodes
-        builder.add_node("rtl_code_check", self.rtl_code_check)  # check code
-        builder.add_node("rtl_code_fix", self.rtl_code_fix)  # check code
-        builder.add_node("tb_code_check", self.tb_code_check)  # check code
-        builder.add_node("tb_code_fix", self.tb_code_fix)  # check code
-        builder.add_node("mismatch_check", self.mismatch_check)  # check code
-        builder.add_node("mismatch_fix", self.mismatch_fix)  # check code
-        builder.add_node("proceed_to_tb", self.proceed_to_tb)
-        builder.add_node("proceed_to_mismatch", self.proceed_to_mismatch)
-
-        # Build graph
-        builder.add_edge(START, "rtl_code_check")
-
-        builder.add_conditional_edges(
-            "rtl_code_check",
-            self.check_error_flag_iterations,
-            {
-                "end": END,
-                "fix": "rtl_code_fix",
-                "forward": "proceed_to_tb"
-            },
-        )
-        builder.add_edge("rtl_code_fix", "rtl_code_check")
-        builder.add_edge("proceed_to_tb", "tb_code_check")
-
-        builder.add_conditional_edges(
-            "tb_code_check",
-            self.check_error_flag_iterations,
-            {
-                "end": END,
-                "fix": "tb_code_fix",
-                "forward": "proceed_to_mismatch"
-            },
-        )
-        builder.add_edge("tb_code_fix", "tb_code_check")
-        builder.add_edge("proceed_to_mismatch", "mismatch_check")
-
-        builder.add_conditional_edges(
-            "mismatch_check",
-            self.check_error_flag_iterations,
-            {
-                "end": END,
-                "fix": "mismatch_fix",
-                "forward": END
-            },
-        )
-        builder.add_edge("mismatch_fix", "mismatch_check")
-
-        self.graph = builder.compile()
+        # "linear" (one fix per iteration) or "beam" (tree search, see beam_fix)
+        self.repair_mode = load_config().get("REVIEW", {}).get("repair_mode", "linear")
+        # "full" (regenerate whole files) or "patch" (line-range edits, full regeneration as fallback)
+        self.repair_output = load_config().get("REVIEW", {}).get("repair_output", "full")
+        # Roll back to the best version when a fix makes things worse
+        self.rollback = load_config().get("REVIEW", {}).get("rollback", True)
+        self.rollbacks = 0
+        self.history = IterationHistory(os.path.join(output_dir_per_run, "history"))
+        # Run-wide iteration/token/time limits; 'max_iterations' only bounds one stage
+        self.budget = budget if budget is not None else RunBudget.from_config()
+        self.plateau_patience = load_config().get("BUDGET", {}).get("plateau_patience", 3)
+        self.convergence = ConvergenceMonitor(self.plateau_patience)
+        # Set when a fix node wrote files since the last check (see track_iteration)
+        self.fix_wrote = False
+        # Deadline of the enclosing run; LLM calls and simulations are cut off at it
+        self.deadline = deadline or current_deadline() or Deadline()
+        # "iverilog", "verilator" or "auto"; None uses [SIM] simulator
+        self.simulator = simulator
 
         logger.info("SimReviewer initialized.")
 
+    @property
+    def graph(self):
+        with SimReviewer._graph_lock:
+            if SimReviewer._graph is None:
+                SimReviewer._graph = build_review_graph()
+        return SimReviewer._graph
+
     def write_output(self, content: str, file_name: str) -> None:
         assert self.output_dir_per_run
         with open(os.path.join(self.output_dir_per_run, file_name), "w") as f:
             f.write(content)
+        self.fix_wrote = True
 
     ### Nodes
     def rtl_code_check(self, state: GraphState):
@@ -227,7 +655,7 @@ class SimReviewer:
         rtl_path = os.path.join(self.output_dir_per_run, "rtl.sv")
 
         try:
-            is_pass, sim_output = check_rtl(rtl_path)
+            is_pass, sim_output = check_rtl(rtl_path, self.simulator)
         except Exception as e:
             logger.info("---RTL CHECK FUNCTION FAILED---")
             logger.exception("Here is the error message")
@@ -237,11 +665,11 @@ class SimReviewer:
                 "iterations": state["iterations"] + 1
             }
 
-        return {
+        return self.track_iteration("rtl_check", {
             "error": not is_pass,
             "sim_output": sim_output,
             "iterations": state["iterations"] + 1
-        }
+        }, compiles=is_pass, sim_ran=False, is_pass=False, mismatch_cnt=0)
     
     def rtl_code_fix(self, state: GraphState):
         """
@@ -256,29 +684,23 @@ class SimReviewer:
 
         logger.info("---FIXING RTL CODE---")
 
+        if self.repair_mode == "beam":
+            return self.beam_fix("rtl", state)
+
         rtl_path = os.path.join(self.output_dir_per_run, "rtl.sv")
         tb_path = os.path.join(self.output_dir_per_run, "tb.sv")
         if_path = os.path.join(self.output_dir_per_run, "if.sv")
 
-        failure_string = f"""
-
------ IMPORTANT HINT FROM PREVIOUS RUN -------
-
-A previous run with generated code for this specification failed in simulation. Keep this in mind when generating the new code for the RTL design:
-<previous_code - rtl.sv>
-{add_lineno(read_verilog_file(rtl_path))}
-</previous_code>
-<failed_sim_log>
-{state["sim_output"]}
-</failed_sim_log>
-"""
+        sim_log = self.explain_result(state["sim_output"]) if state["sim_output"] else ""
+        rtl_code = read_verilog_file(rtl_path)
+        failure_string = rtl_fix_failure_entry(rtl_code, sim_log, failure_focus(state["sim_output"], rtl_code=rtl_code))
         try:
-            self.rtl_gen = RTLGenerator()
-            rtl_code = self.rtl_gen.chat(
-                input_spec=self.input_spec,
+            rtl_code = self.generate_rtl_fix(
                 testbench=read_verilog_file(tb_path),
                 interface=read_verilog_file(if_path),
-                failure_entry=failure_string
+                previous_rtl=read_verilog_file(rtl_path),
+                failure_entry=failure_string,
+                variant=self.fix_variant()
             )
             self.write_output(rtl_code, "rtl.sv")
         except Exception as e:
@@ -310,7 +732,8 @@ A previous run with generated code for this specification failed in simulation.
         logger.info("---CHECKING TB CODE---")
 
         try:
-            is_pass, _, sim_output = sim_review(self.output_dir_per_run)
+            fingerprint = run_fingerprint(self.output_dir_per_run)
+            is_pass, mismatch_cnt, sim_output = sim_review(self.output_dir_per_run, self.simulator, dump_failure=True)
         except Exception as e:
             logger.info("---TB CHECK FUNCTION FAILED---")
             logger.exception("Here is the error message")
@@ -320,11 +743,17 @@ A previous run with generated code for this specification failed in simulation.
                 "iterations": state["iterations"] + 1
             }
         
-        return {
-            "error": not (sim_output["success"] and sim_output["stderr"] == ""), # Moving forward if execution works without any problem, logic check will happen in mismatch
+        return self.track_iteration("tb_check", {
+            "error": not (sim_output["success"] and sim_stderr_ok(sim_output)), # Moving forward if execution works without any problem, logic check will happen in mismatch
             "sim_output": sim_output,
-            "iterations": state["iterations"] + 1
-        }
+            "iterations": state["iterations"] + 1,
+            "last_sim": {
+                "fingerprint": fingerprint,
+                "is_pass": is_pass,
+                "mismatch_cnt": mismatch_cnt,
+                "sim_output": sim_output
+            }
+        }, compiles=sim_compiled(sim_output), sim_ran=sim_output["success"], is_pass=is_pass, mismatch_cnt=mismatch_cnt)
     
     @staticmethod
     def explain_result(result):
@@ -349,24 +778,49 @@ A previous run with generated code for this specification failed in simulation.
         if result["error_message"] is not None:
             explanation_parts.append(f"An error occurred during the command execution phase: \"{result['error_message']}\".")
 
-        # 3. Stderr Check (iVerilog specific)
+        if result.get("status") == STATUS_TIMED_OUT:
+            explanation_parts.append("The simulation did not finish within its time limit and was killed. "
+                                     "This usually means the testbench never reaches $finish (e.g. an infinite loop or a wait on a condition that never occurs).")
+        elif result.get("status") == STATUS_CANCELLED:
+            explanation_parts.append("The simulation was stopped because the overall run was cancelled or reached its deadline; "
+                                     "this says nothing about the design itself.")
+        elif result.get("status") == STATUS_RESOURCE_EXCEEDED:
+            explanation_parts.append(f"The simulation was killed because it exceeded its {result['resource_exceeded']} limit. "
+                                     "This usually means the testbench runs away (e.g. an infinite loop printing output or growing a queue without bound).")
+
+        # 3. Stderr Check
         if result["stderr"] != "":
-            explanation_parts.append("iVerilog reported some error statements during execution, indicated by messages in the standard error stream.")
-            explanation_parts.append(f"Standard error output:\n---\n{result['stderr']}\n---")
+            explanation_parts.append(f"{result.get('simulator', 'iverilog')} reported some error statements during execution, indicated by messages in the standard error stream.")
+            diagnostics = sim_diagnostics(result)
+            if diagnostics:
+                # Deduplicated, one line per problem instead of the raw stream
+                explanation_parts.append(f"Diagnostics (file:line [category] severity: message):\n{format_diagnostics(diagnostics)}")
+            else:
+                explanation_parts.append(f"Standard error output:\n---\n{result['stderr']}\n---")
+
+        parsed = sim_result(result)
+        if parsed.abort_reason:
+            explanation_parts.append(f"The simulation was {parsed.abort_reason}; only the first failures are listed below.")
 
         # 4. Stdout Check (preprocessed problematic parts)
-        # Ensure preprocess_stdout_function is provided and callable
-        mismatch_lines = sim_review_get_mismatch_lines(result["stdout"])
-        if mismatch_lines:
+        if parsed.mismatches:
             explanation_parts.append("The simulation reported the following mismatches when running the simulation with the given testbench and RTL code:")
-            for i, issue in enumerate(mismatch_lines):
-                explanation_parts.append(f"- {issue}")
-        
-        warning_lines = sim_review_get_mismatch_lines(result["stdout"])
-        if warning_lines:
+            for mismatch in parsed.mismatches:
+                explanation_parts.append(f"- [{mismatch.variant}] {mismatch.text}" if mismatch.variant else f"- {mismatch.text}")
+            if parsed.first_mismatch_time is not None:
+                explanation_parts.append(f"The first mismatch happened at simulation time {parsed.first_mismatch_time}.")
+
+        if parsed.variants:
+            failing = [variant for variant in parsed.variants if not variant["is_pass"]]
+            explanation_parts.append(
+                f"The testbench ran as {len(parsed.variants)} parallel simulations with different plusargs; "
+                f"{len(failing)} of them failed" + (f": {', '.join(variant['variant'] for variant in failing)}." if failing else ".")
+            )
+
+        if parsed.warnings:
             explanation_parts.append("The simulation reported the following WARNINGS when running the simulation with the given testbench and RTL code:")
-            for i, issue in enumerate(warning_lines):
-                explanation_parts.append(f"- {issue}")
+            for warning in parsed.warnings:
+                explanation_parts.append(f"- {warning.text}")
 
         return "\n".join(explanation_parts)
 
@@ -388,26 +842,16 @@ A previous run with generated code for this specification failed in simulation.
 
         sim_output = self.explain_result(state["sim_output"])
 
-        failure_string = f"""
-
------ IMPORTANT HINT FROM PREVIOUS RUN -------
-
-A previous run with generated code for this specification failed in simulation. Keep this in mind when generating the new code for the Testbench/ Interface Design :
-<previous_code - rtl.sv>
-{add_lineno(read_verilog_file(rtl_path))}
-</previous_code>
-<previous_tb - tb.sv>
-{add_lineno(read_verilog_file(tb_path))}
-</previous_tb>
-<failed_sim_log>
-{sim_output}
-</failed_sim_log>
-"""
+        rtl_code, tb_code = read_verilog_file(rtl_path), read_verilog_file(tb_path)
+        failure_string = tb_fix_failure_entry(rtl_code, tb_code, sim_output, failure_focus(state["sim_output"], rtl_code, tb_code))
 
         try:
-            self.tb_gen = TBGenerator()
-
-            testbench, interface = self.tb_gen.chat(self.input_spec, failure_entry=failure_string)
+            testbench, interface = self.generate_tb_fix(
+                previous_tb=read_verilog_file(tb_path),
+                previous_if=read_verilog_file(os.path.join(self.output_dir_per_run, "if.sv")),
+                failure_entry=failure_string,
+                variant=self.fix_variant()
+            )
 
             self.write_output(testbench, "tb.sv")
             self.write_output(interface, "if.sv")
@@ -441,7 +885,14 @@ A previous run with generated code for this specification failed in simulation.
         logger.info("---MISMATCH_CHECK---")
 
         try:
-            is_pass, mismatch_cnt, sim_output = sim_review(self.output_dir_per_run)
+            fingerprint = run_fingerprint(self.output_dir_per_run)
+            last_sim = state.get("last_sim") or {}
+            if last_sim.get("fingerprint") == fingerprint:
+                # tb.sv/rtl.sv are unchanged since the last simulation (e.g. right after tb_code_check)
+                logger.info("Files unchanged since the last simulation, reusing its result")
+                is_pass, mismatch_cnt, sim_output = last_sim["is_pass"], last_sim["mismatch_cnt"], last_sim["sim_output"]
+            else:
+                is_pass, mismatch_cnt, sim_output = sim_review(self.output_dir_per_run, self.simulator, dump_failure=True)
         except Exception as e:
             logger.info("---MISMATCH CHECK FUNCTION FAILED---")
             logger.exception("Here is the error message")
@@ -452,12 +903,18 @@ A previous run with generated code for this specification failed in simulation.
                 "iterations": state["iterations"] + 1
             }
         
-        return {
+        return self.track_iteration("mismatch_check", {
             "error": (not is_pass) | mismatch_cnt !=0,
             "sim_output": sim_output,
             "mismatch_cnt" : mismatch_cnt,
-            "iterations": state["iterations"] + 1
-        }
+            "iterations": state["iterations"] + 1,
+            "last_sim": {
+                "fingerprint": fingerprint,
+                "is_pass": is_pass,
+                "mismatch_cnt": mismatch_cnt,
+                "sim_output": sim_output
+            }
+        }, compiles=sim_compiled(sim_output), sim_ran=sim_output["success"], is_pass=is_pass, mismatch_cnt=mismatch_cnt)
     
     def mismatch_fix(self, state: GraphState):
         """
@@ -476,15 +933,13 @@ A previous run with generated code for this specification failed in simulation.
         tb_path = os.path.join(self.output_dir_per_run, "tb.sv")
         if_path = os.path.join(self.output_dir_per_run, "if.sv")
 
-        judge = SimJudge()
+        if self.repair_mode == "beam":
+            return self.beam_fix("mismatch", state)
 
         sim_output = self.explain_result(state["sim_output"])
 
-        rtl_needs_fix, tb_needs_fix, reasoning = judge.chat(
-            input_spec=self.input_spec, 
-            failed_sim_log=sim_output, 
-            failed_rtl=add_lineno(read_verilog_file(rtl_path)),
-            failed_testbench=add_lineno(read_verilog_file(tb_path))
+        rtl_needs_fix, tb_needs_fix, reasoning = self.judge(
+            read_verilog_file(rtl_path), read_verilog_file(tb_path), state["sim_output"]
         )
         logger.info(f"\nResult: TB Needs Fix = {tb_needs_fix}")
         logger.info(f"\nResult: RTL Needs Fix = {rtl_needs_fix}")
@@ -492,27 +947,17 @@ A previous run with generated code for this specification failed in simulation.
 
         if tb_needs_fix:
 
-            failure_string = f"""
-
------ IMPORTANT HINT FROM PREVIOUS RUN -------
-
-A previous run with generated code for this specification failed in simulation. Keep this in mind when generating the new code for the Testbench/ Interface Design :
-<previous_code - rtl.sv>
-{add_lineno(read_verilog_file(rtl_path))}
-</previous_code>
-<previous_tb - tb.sv>
-{add_lineno(read_verilog_file(tb_path))}
-</previous_tb>
-<failed_sim_log>
-{sim_output}
-</failed_sim_log>
-<Output by a reasoning agent>
-{reasoning}
-</Output by a reasoning agent>
-"""
+            rtl_code, tb_code = read_verilog_file(rtl_path), read_verilog_file(tb_path)
+            failure_string = mismatch_fix_failure_entry(
+                rtl_code, tb_code, sim_output, reasoning, failure_focus(state["sim_output"], rtl_code, tb_code)
+            )
             try:
-                self.tb_gen = TBGenerator()
-                testbench, interface = self.tb_gen.chat(self.input_spec, failure_entry=failure_string)
+                testbench, interface = self.generate_tb_fix(
+                    previous_tb=read_verilog_file(tb_path),
+                    previous_if=read_verilog_file(if_path),
+                    failure_entry=failure_string,
+                    variant=self.fix_variant()
+                )
                 self.write_output(testbench, "tb.sv")
                 self.write_output(interface, "if.sv")
 
@@ -528,32 +973,18 @@ A previous run with generated code for this specification failed in simulation.
             
 
         if rtl_needs_fix:
-            failure_string = f"""
-
------ IMPORTANT HINT FROM PREVIOUS RUN -------
-
-A previous run with generated code for this specification failed in simulation. Keep this in mind when generating the new code for the Testbench/ Interface Design :
-<previous_code - rtl.sv>
-{add_lineno(read_verilog_file(rtl_path))}
-</previous_code>
-<previous_tb - tb.sv>
-{add_lineno(read_verilog_file(tb_path))}
-</previous_tb>
-<failed_sim_log>
-{sim_output}
-</failed_sim_log>
-<Output by a reasoning agent>
-{reasoning}
-</Output by a reasoning agent>
-"""
+            rtl_code, tb_code = read_verilog_file(rtl_path), read_verilog_file(tb_path)
+            failure_string = mismatch_fix_failure_entry(
+                rtl_code, tb_code, sim_output, reasoning, failure_focus(state["sim_output"], rtl_code, tb_code)
+            )
 
             try:
-                self.rtl_gen = RTLGenerator()
-                rtl_code = self.rtl_gen.chat(
-                    input_spec=self.input_spec,
+                rtl_code = self.generate_rtl_fix(
                     testbench=read_verilog_file(tb_path),
                     interface=read_verilog_file(if_path),
-                    failure_entry=failure_string
+                    previous_rtl=read_verilog_file(rtl_path),
+                    failure_entry=failure_string,
+                    variant=self.fix_variant()
                 )
                 self.write_output(rtl_code, "rtl.sv")
             except Exception as e:
@@ -574,6 +1005,261 @@ A previous run with generated code for this specification failed in simulation.
                 "iterations": state["iterations"]
             }
     
+    def track_iteration(self, stage: str, update: Dict, compiles: bool, sim_ran: bool,
+                        is_pass: bool, mismatch_cnt: int) -> Dict:
+        """
+        Records the files just checked in the iteration history. If they score worse
+        than the best version so far, the best version is restored to the run folder
+        and the returned state update points the next fix at it instead. A failing
+        check also sets 'stop_reason' when the fix loop stopped converging or the
+        run budget is spent.
+
+        Args:
+            stage (str): Name of the check node.
+            update (dict): The state update the check node is about to return.
+
+        Returns:
+            dict: The (possibly rewritten) state update.
+        """
+        files = {
+            file_name: read_verilog_file(os.path.join(self.output_dir_per_run, file_name))
+            for file_name in ("rtl.sv", "tb.sv", "if.sv")
+        }
+        record = self.history.record(stage, files, compiles, sim_ran, is_pass, mismatch_cnt, update["sim_output"])
+        self.budget.charge_iteration()
+        # Only designs a fix actually wrote are new to the monitor. A failed fix (or a
+        # rollback) leaves files that were already checked, which is neither a no-change
+        # fix nor a cycle. The first check of a stage follows no fix of that stage
+        stop_reason = None
+        if self.fix_wrote or stage not in self.convergence.last:
+            # A design that did not compile or simulate reports 0 mismatches; that is no count to improve on
+            stop_reason = self.convergence.observe(
+                stage, files["rtl.sv"], files["tb.sv"], mismatch_cnt if stage == "mismatch_check" and sim_ran else None
+            )
+        self.fix_wrote = False
+
+        if self.rollback and self.history.is_regression(record):
+            best = self.history.restore_best(self.output_dir_per_run)
+            self.rollbacks += 1
+            logger.info(f"Iteration {record.index} regressed; rolled back to iteration {best.index} "
+                        f"(mismatch_cnt {best.mismatch_cnt}) and re-prompting from it")
+            update = {**update, "error": True, "sim_output": best.sim_output}
+            if "mismatch_cnt" in update:
+                update["mismatch_cnt"] = best.mismatch_cnt
+
+        if update["error"]:
+            stop_reason = stop_reason or self.budget.exhausted() or (STOP_DEADLINE if self.deadline.expired() else None)
+            if stop_reason:
+                update = {**update, "stop_reason": stop_reason}
+
+        return update
+
+    def generate_rtl_fix(self, testbench: str, interface: str, previous_rtl: str,
+                         failure_entry: str, variant=None) -> str:
+        """
+        Asks the LLM for fixed RTL. In patch mode, line-range edits to 'previous_rtl'
+        are requested and applied first; a patch request that fails or does not apply
+        falls back to regenerating the whole module.
+        """
+        if self.repair_output == "patch":
+            try:
+                return RTLGenerator().chat_patch(
+                    input_spec=self.input_spec,
+                    testbench=testbench,
+                    interface=interface,
+                    previous_rtl=previous_rtl,
+                    failure_entry=failure_entry,
+                    variant=variant,
+                    include_examples=few_shot_on_fix()
+                )
+            except PATCH_FALLBACK_ERRORS as e:
+                logger.info(f"RTL patch rejected ({e}), regenerating the full module")
+
+        return RTLGenerator().chat(
+            input_spec=self.input_spec,
+            testbench=testbench,
+            interface=interface,
+            failure_entry=failure_entry,
+            variant=variant,
+            include_examples=few_shot_on_fix()
+        )
+
+    def generate_tb_fix(self, previous_tb: str, previous_if: str, failure_entry: str, variant=None) -> Tuple[str, str]:
+        """
+        Asks the LLM for a fixed testbench and interface. In patch mode, only tb.sv is
+        edited (the interface is kept); a patch request that fails or does not apply
+        falls back to full regeneration.
+        """
+        if self.repair_output == "patch":
+            try:
+                testbench = TBGenerator().chat_patch(
+                    input_spec=self.input_spec,
+                    previous_tb=previous_tb,
+                    failure_entry=failure_entry,
+                    variant=variant,
+                    include_examples=few_shot_on_fix()
+                )
+                return testbench, previous_if
+            except PATCH_FALLBACK_ERRORS as e:
+                logger.info(f"Testbench patch rejected ({e}), regenerating the full testbench")
+
+        return TBGenerator().chat(self.input_spec, failure_entry=failure_entry, variant=variant,
+                                  include_examples=few_shot_on_fix())
+
+    def fix_variant(self):
+        """
+        LLM cache variant for fix calls: after a rollback the same prompt is sent again,
+        so it must not be answered with the cached (regressing) response.
+        """
+        return f"retry:{self.rollbacks}" if self.rollbacks else None
+
+    def judge(self, rtl_code: str, tb_code: str, sim_output: Dict) -> Tuple[bool, bool, str]:
+        """
+        Decides whether the RTL and/or the testbench need a fix after a failing simulation.
+
+        Returns:
+            Tuple[bool, bool, str]: rtl_needs_fix, tb_needs_fix and the reasoning.
+        """
+        if sim_did_not_finish(sim_output):
+            # A runaway simulation is a testbench problem first; no need to ask the judge
+            reasoning = ("The simulation did not run to completion, so the testbench must be fixed to always reach $finish "
+                         "within a bounded number of cycles, even if the RTL never responds.")
+            return False, True, reasoning
+
+        # Errors that all point into one file need no judge either, unless the run also
+        # printed mismatches: then the functional failure is what needs judging
+        result = sim_result(sim_output)
+        routed = None
+        if not (result.mismatch_cnt or result.mismatches):
+            routed = route_fix(sim_failing_diagnostics(sim_output))
+        if routed is not None:
+            logger.info("Fix target decided from diagnostics without the judge")
+            return routed
+
+        failed_sim_log, failed_rtl, failed_testbench = judge_inputs(
+            rtl_code, tb_code, self.explain_result(sim_output), failure_focus(sim_output, rtl_code, tb_code)
+        )
+        return SimJudge().chat(
+            input_spec=self.input_spec, 
+            failed_sim_log=failed_sim_log, 
+            failed_rtl=failed_rtl,
+            failed_testbench=failed_testbench
+        )
+
+    def evaluate_node(self, node: RepairNode, node_dir: str) -> None:
+        """
+        Writes the node's files into 'node_dir', then syntax-checks and simulates them there.
+        """
+        os.makedirs(node_dir, exist_ok=True)
+        for content, file_name in ((node.rtl_code, "rtl.sv"), (node.tb_code, "tb.sv"), (node.if_code, "if.sv")):
+            with open(os.path.join(node_dir, file_name), "w") as f:
+                f.write(content)
+
+        node.compiles, node.sim_output = check_rtl(os.path.join(node_dir, "rtl.sv"), self.simulator)
+        if node.compiles:
+            node.is_pass, node.mismatch_cnt, node.sim_output = sim_review(node_dir, self.simulator)
+            node.sim_ran = node.sim_output["success"]
+
+    def beam_fix(self, stage: str, state: GraphState):
+        """
+        Tree-search replacement for the linear rtl_code_fix/mismatch_fix step: branches
+        several fix attempts per round, evaluates them concurrently in
+        'repair_search/<node_id>' and writes the best version back to the run folder.
+
+        Args:
+            stage (str): "rtl" for syntax fixes, "mismatch" for functional fixes.
+            state (dict): The current graph state
+        """
+        search_config = load_config().get("REVIEW", {})
+        search_dir = os.path.join(self.output_dir_per_run, "repair_search")
+
+        root = RepairNode(
+            rtl_code=read_verilog_file(os.path.join(self.output_dir_per_run, "rtl.sv")),
+            tb_code=read_verilog_file(os.path.join(self.output_dir_per_run, "tb.sv")),
+            if_code=read_verilog_file(os.path.join(self.output_dir_per_run, "if.sv")),
+            compiles=(stage == "mismatch"),
+            sim_ran=(stage == "mismatch"),
+            mismatch_cnt=state.get("mismatch_cnt", 0) if stage == "mismatch" else 0,
+            sim_output=state["sim_output"]
+        )
+
+        def judge_node(node: RepairNode) -> Tuple[bool, bool, str]:
+            # One verdict per node, shared by all of its branches
+            return self.judge(node.rtl_code, node.tb_code, node.sim_output)
+
+        def expand(node: RepairNode, branch_index: int, verdict) -> Tuple[str, str, str]:
+            # Each branch is a distinct sample in the LLM cache
+            variant = f"beam:{node.node_id}:{branch_index}"
+
+            if stage == "rtl":
+                rtl_code = self.generate_rtl_fix(
+                    testbench=node.tb_code,
+                    interface=node.if_code,
+                    previous_rtl=node.rtl_code,
+                    failure_entry=rtl_fix_failure_entry(
+                        node.rtl_code,
+                        self.explain_result(node.sim_output) if node.sim_output else "",
+                        failure_focus(node.sim_output, rtl_code=node.rtl_code)
+                    ),
+                    variant=variant
+                )
+                return rtl_code, node.tb_code, node.if_code
+
+            rtl_needs_fix, tb_needs_fix, reasoning = verdict
+            failure_string = mismatch_fix_failure_entry(
+                node.rtl_code, node.tb_code, self.explain_result(node.sim_output), reasoning,
+                failure_focus(node.sim_output, node.rtl_code, node.tb_code)
+            )
+            rtl_code, tb_code, if_code = node.rtl_code, node.tb_code, node.if_code
+            if tb_needs_fix:
+                tb_code, if_code = self.generate_tb_fix(node.tb_code, node.if_code, failure_string, variant)
+            if rtl_needs_fix:
+                rtl_code = self.generate_rtl_fix(
+                    testbench=tb_code,
+                    interface=if_code,
+                    previous_rtl=node.rtl_code,
+                    failure_entry=failure_string,
+                    variant=variant
+                )
+            return rtl_code, tb_code, if_code
+
+        # The search gets no more time than the run budget and deadline leave
+        max_seconds = search_config.get("max_seconds", 1800)
+        if self.budget.remaining_seconds() is not None:
+            max_seconds = min(max_seconds, self.budget.remaining_seconds())
+        max_seconds = self.deadline.cap(max_seconds)
+
+        search = BeamRepairSearch(
+            expand=expand,
+            evaluate=lambda node: self.evaluate_node(node, os.path.join(search_dir, node.node_id)),
+            beam_width=search_config.get("beam_width", 2),
+            branch_factor=search_config.get("branch_factor", 3),
+            max_depth=search_config.get("max_depth", 2),
+            max_llm_calls=search_config.get("max_llm_calls", 12),
+            max_seconds=max_seconds,
+            prepare=judge_node if stage == "mismatch" else None
+        )
+
+        try:
+            best = search.run(root)
+            self.write_output(best.rtl_code, "rtl.sv")
+            self.write_output(best.tb_code, "tb.sv")
+            self.write_output(best.if_code, "if.sv")
+        except Exception as e:
+            logger.info("---REPAIR SEARCH FAILED---")
+            logger.exception("Here is the error message")
+            return {
+                "error": True,
+                "sim_output": {},
+                "iterations": state["iterations"]
+            }
+
+        return {
+            "error": False,
+            "sim_output": {},
+            "iterations": state["iterations"]
+        }
+
     def proceed_to_tb(self, state: GraphState):
         return {
             "error": False,
@@ -608,6 +1294,12 @@ A previous run with generated code for this specification failed in simulation.
             return "forward"
         else:
             logger.info("CHECK NOT PASSED!")
+            if state.get("stop_reason"):
+                logger.info(f"---Stopping early: {state['stop_reason']}---")
+                return "end"
+            if self.deadline.expired():
+                logger.info("---Run deadline reached---")
+                return "end"
             if state["iterations"] >= self.max_iterations:
                 logger.info("---Iteration Limit Reached---")
                 return "end"
@@ -616,13 +1308,21 @@ A previous run with generated code for this specification failed in simulation.
     
     def invoke_rag(self):
         # Run
+        shutil.rmtree(self.history.history_dir, ignore_errors=True)
+        self.history = IterationHistory(self.history.history_dir)
+        self.rollbacks = 0
+        self.convergence = ConvergenceMonitor(self.plateau_patience)
+        self.fix_wrote = False
+
         inputs = {
             "error": False,
             "sim_output": {},
-            "iterations": 0
+            "iterations": 0,
+            "last_sim": {},
+            "stop_reason": None
         }
 
-        for output in self.graph.stream(inputs):
+        for output in self.graph.stream(inputs, config={"configurable": {"reviewer": self}}):
             for key, value in output.items():
                 logger.info(f"Node '{key}':")
             logger.info("\n---\n")
@@ -630,10 +1330,25 @@ A previous run with generated code for this specification failed in simulation.
         # Final generation
 
         if value["error"]:
+            # Hand back the best version seen rather than the last one
+            best = self.history.restore_best(self.output_dir_per_run)
+            if best is not None:
+                logger.info(f"Restored the best version from iteration {best.index} ({best.stage}, "
+                            f"mismatch_cnt {best.mismatch_cnt})")
+                value = {**value, "best_iteration": best.index, "mismatch_cnt": best.mismatch_cnt}
             logger.error("RTL Generation completed with errors")
         else:
             logger.info("RTL Generation completed successfully!")
 
+        if not value["error"]:
+            stop_reason = STOP_PASSED
+        elif value.get("stop_reason"):
+            stop_reason = value["stop_reason"]
+        else:
+            stop_reason = STOP_DEADLINE if self.deadline.expired() else STOP_MAX_ITERATIONS
+        value = {**value, "stop_reason": stop_reason, "budget": self.budget.summary()}
+        logger.info(f"Review stopped: {stop_reason} ({value['budget']})")
+
         return value
     
 
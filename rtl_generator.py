@@ -1,18 +1,23 @@
 import logging
 from typing import Dict, List, Tuple
 
+from langchain_core.exceptions import OutputParserException
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_core.prompts import ChatPromptTemplate
 
 # Assuming these are defined elsewhere and correctly imported
 from prompts import RTL_4_SHOT_EXAMPLES
-from utils import add_lineno # Not used in optimized get_tb_writer
-from llm import llm # Ensure llm is an initialized LangChain LLM object
+from utils import add_lineno, memoize_per_llm
+from llm import get_llm
+from llm_cache import CachedStructuredChain
+from patching import PatchError, apply_line_edits, describe_edits
 
-import logger_config
 logger = logging.getLogger("root")
 logger.info("Imported RTL Generator module")
 
+# Failed patch requests that fall back to full regeneration: edits that do not apply
+# and responses that do not parse into the patch schema. Anything else is raised
+PATCH_FALLBACK_ERRORS = (PatchError, OutputParserException)
+
 # --- Pydantic Model ---
 
 class RTLOutputFormat(BaseModel):
@@ -27,8 +32,56 @@ class RTLOutputFormat(BaseModel):
                     "This should be error-free and ready for output to .SV file that can be run using a verilog simulator"
     )
 
+class LineEdit(BaseModel):
+    """
+    One edit of a line range of previously shown, line-numbered code.
+    """
+    start_line: int = Field(
+        description="First line to replace, as numbered in the previous code"
+    )
+    end_line: int = Field(
+        description="Last line to replace (inclusive). Use start_line - 1 to insert before start_line without replacing anything"
+    )
+    original: str = Field(
+        description="The exact current content of lines start_line..end_line, without the line number prefixes. Empty for insertions"
+    )
+    replacement: str = Field(
+        description="The new SystemVerilog lines that take the place of the replaced range, without line number prefixes"
+    )
+
+class RTLPatchFormat(BaseModel):
+    """
+    Defines the structured output format for patch-based RTL repair.
+    """
+    reasoning: str = Field(
+        description="All reasoning steps and advices to avoid syntax error"
+    )
+    edits: List[LineEdit] = Field(
+        description="Non-overlapping line-range edits to the previous rtl.sv"
+    )
+
+PATCH_INSTRUCTIONS = """
+Do NOT rewrite the whole file. Return only the edits needed to fix the previous {file_name} shown in the hint above.
+- Each edit replaces lines start_line..end_line (inclusive), using the line numbers shown in front of the previous code.
+- 'original' must repeat the current content of exactly those lines (without the line numbers), so the edit can be verified.
+- To insert new lines without replacing any, set end_line = start_line - 1 and leave 'original' empty.
+- Edits must not overlap. Keep every line that does not need to change out of the edits.
+"""
+
+def with_patch_instructions(prompt, file_name: str):
+    """
+    Returns a copy of a writer's prompt with PATCH_INSTRUCTIONS appended as a last
+    human message. Built with from_messages and the writer's partials re-applied:
+    adding messages to a ChatPromptTemplate with '+' drops its partial variables.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+
+    messages = [*prompt.messages, ("human", PATCH_INSTRUCTIONS.format(file_name=file_name))]
+    return ChatPromptTemplate.from_messages(messages).partial(**prompt.partial_variables)
+
 # --- RTL Writer Function ---
 
+@memoize_per_llm
 def get_rtl_writer(llm):
     """
     Creates a LangChain chain for generating SystemVerilog RTL.
@@ -37,11 +90,11 @@ def get_rtl_writer(llm):
         llm: The Language Model instance (e.g., ChatOpenAI).
 
     Returns:
-        A LangChain Runnable that takes 'input_spec', 'examples_prompt',
-        'display_prompt' as input and returns a RTLOutputFormat object.
+        A LangChain Runnable that takes 'input_spec', 'module_interface',
+        'testbench' and 'failure_entry' as input and returns a RTLOutputFormat object.
+        The few-shot examples are pre-bound as a partial. Built once per LLM.
     """
-
-    structured_rtl_writer = llm.with_structured_output(RTLOutputFormat)
+    from langchain_core.prompts import ChatPromptTemplate
 
     system_prompt = """
 You are an expert in RTL design. You can always write SystemVerilog code with no syntax errors and always reach correct functionality.
@@ -105,9 +158,20 @@ Another agent has generated a testbench based on the given input_spec:
         ),
     ]
 
-    rtl_gen_prompt = ChatPromptTemplate.from_messages(messages)
+    rtl_gen_prompt = ChatPromptTemplate.from_messages(messages).partial(examples_prompt=RTL_4_SHOT_EXAMPLES)
+
+    return CachedStructuredChain(rtl_gen_prompt, llm, RTLOutputFormat)
+
+@memoize_per_llm
+def get_rtl_patcher(llm):
+    """
+    Same prompt as get_rtl_writer with patch instructions appended; returns a
+    RTLPatchFormat object with line-range edits instead of the full module.
+    Built once per LLM.
+    """
+    patch_prompt = with_patch_instructions(get_rtl_writer(llm).prompt, "rtl.sv")
 
-    return  rtl_gen_prompt | structured_rtl_writer
+    return CachedStructuredChain(patch_prompt, llm, RTLPatchFormat)
 
 
 class RTLGenerator:
@@ -130,7 +194,9 @@ class RTLGenerator:
             input_spec: str,
             testbench: str,
             interface: str,
-            failure_entry = ""
+            failure_entry = "",
+            variant = None,
+            include_examples = True
         ) -> str:
         """
         Invokes the LLM to generate a testbench and interface based on the input specification
@@ -138,13 +204,17 @@ class RTLGenerator:
 
         Args:
             input_spec (str): The natural language specification for the module to be tested.
+            variant (optional): Distinguishes independent samples of the same prompt
+                                (e.g. best-of-N candidates) in the LLM cache.
+            include_examples (bool): Send the few-shot examples. Fix iterations leave
+                                     them out to save tokens.
 
         Returns:
             Tuple[str, str]: A tuple containing the generated testbench code and
                              the generated module interface code.
         """
         
-        llm_chain = get_rtl_writer(llm) # Renamed to avoid conflict with `llm` import
+        llm_chain = get_rtl_writer(get_llm())
 
         self.generated_tb = testbench
         self.generated_if = interface
@@ -152,11 +222,13 @@ class RTLGenerator:
         # Prepare the input dictionary for the LLM chain
         chain_inputs = {
             "input_spec": input_spec,
-            "examples_prompt": RTL_4_SHOT_EXAMPLES,
             "module_interface": self.generated_if,
             "testbench": self.generated_tb,
             "failure_entry": failure_entry
         }
+        if not include_examples:
+            # Overrides the pre-bound partial
+            chain_inputs["examples_prompt"] = ""
 
         # Limit the length of the previews for readability in logs
         input_spec_display = (input_spec[:50] + '...') if len(input_spec) > 50 else input_spec
@@ -168,7 +240,7 @@ class RTLGenerator:
                     f"module_interface='{module_interface_display}', "
                     f"testbench='{testbench_display}'")
 
-        response: RTLOutputFormat = llm_chain.invoke(chain_inputs)
+        response: RTLOutputFormat = llm_chain.invoke(chain_inputs, variant=variant)
 
         # Log the LLM's response for debugging and transparency
         logger.info("LLM Response received.")
@@ -182,4 +254,51 @@ class RTLGenerator:
 
         return rtl_code
 
+    def chat_patch(
+            self,
+            input_spec: str,
+            testbench: str,
+            interface: str,
+            previous_rtl: str,
+            failure_entry: str,
+            variant = None,
+            include_examples = False
+        ) -> str:
+        """
+        Asks the LLM for line-range edits to 'previous_rtl' instead of a full module
+        and applies them locally. 'failure_entry' must show 'previous_rtl' with line numbers.
+
+        Returns:
+            str: The patched RTL code.
+
+        Raises:
+            PatchError: If the edits do not apply to 'previous_rtl' or the response has none.
+            OutputParserException: If the response does not parse into RTLPatchFormat.
+        """
+        llm_chain = get_rtl_patcher(get_llm())
+
+        chain_inputs = {
+            "input_spec": input_spec,
+            "module_interface": interface,
+            "testbench": testbench,
+            "failure_entry": failure_entry
+        }
+        if not include_examples:
+            chain_inputs["examples_prompt"] = ""
+
+        response: RTLPatchFormat = llm_chain.invoke(chain_inputs, variant=variant)
+        if response is None:
+            raise PatchError("The model returned no patch")
+
+        logger.info("LLM Patch Response received.")
+        logger.info(f"Reasoning:\n{response.reasoning}")
+        logger.info(f"Edits: {describe_edits(response.edits)}")
+
+        rtl_code = apply_line_edits(previous_rtl, response.edits)
+
+        logger.info("Patched rtl:")
+        logger.info(rtl_code)
+
+        return rtl_code
+
 
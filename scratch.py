@@ -0,0 +1,74 @@
+import os
+import glob
+import shutil
+import logging
+import tempfile
+import contextlib
+from typing import Iterator, List
+
+from utils import load_config
+
+logger = logging.getLogger("root")
+logger.info("Imported Scratch module")
+
+# RAM-backed filesystem used for scratch files when available
+TMPFS_ROOT = "/dev/shm"
+
+def scratch_root() -> str:
+    """
+    Returns the folder new scratch directories are created in: [SIM] scratch_dir
+    if set, else TMPFS_ROOT when [SIM] scratch_tmpfs is true and it is writable,
+    else the system temp folder.
+    """
+    sim_config = load_config().get("SIM", {})
+    root = sim_config.get("scratch_dir", "")
+    if root:
+        os.makedirs(root, exist_ok=True)
+        return os.path.abspath(root)
+    if sim_config.get("scratch_tmpfs", True) and os.path.isdir(TMPFS_ROOT) and os.access(TMPFS_ROOT, os.W_OK):
+        return TMPFS_ROOT
+    return tempfile.gettempdir()
+
+@contextlib.contextmanager
+def scratch_dir(prefix: str = "sim_") -> Iterator[str]:
+    """
+    Creates a private directory for throwaway tool outputs (compiled images,
+    waveforms) and removes it with its contents on exit.
+
+    Args:
+        prefix (str): Prefix of the directory name.
+
+    Yields:
+        str: Absolute path of the directory.
+    """
+    path = tempfile.mkdtemp(prefix=prefix, dir=scratch_root())
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def copy_back(scratch: str, dest: str, patterns: List[str], prefix: str = "") -> List[str]:
+    """
+    Copies the files in 'scratch' whose names match one of the glob 'patterns' into
+    'dest', with 'prefix' prepended to their names.
+
+    Returns:
+        List[str]: Paths of the copied files in 'dest'.
+    """
+    copied = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(scratch, pattern))):
+            if not os.path.isfile(path):
+                continue
+            target = os.path.join(dest, prefix + os.path.basename(path))
+            shutil.copy2(path, target)
+            copied.append(target)
+    if copied:
+        logger.info(f"Kept {len(copied)} artifacts from scratch in {dest}")
+    return copied
+
+def kept_artifacts() -> List[str]:
+    """
+    Returns the [SIM] keep_artifacts glob patterns: scratch files worth copying back after a simulation.
+    """
+    return load_config().get("SIM", {}).get("keep_artifacts", ["*.vcd", "*.fst", "*.lxt", "*.lxt2"])
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import subprocess
+import functools
+from typing import Dict, List, Optional
+
+from utils import load_config
+
+logger = logging.getLogger("root")
+logger.info("Imported Simulation Cache module")
+
+@functools.lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """
+    Returns the first line of '<tool> -V', or '' if the tool cannot be run.
+    """
+    try:
+        process = subprocess.run([tool, "-V"], capture_output=True, text=True, timeout=30)
+        return (process.stdout or process.stderr).strip().splitlines()[0]
+    except (OSError, subprocess.SubprocessError, IndexError):
+        return ""
+
+def content_key(sources: List[str], flags: List[str], tools: List[str], extra: Optional[Dict] = None) -> str:
+    """
+    Hashes the exact sources together with the tool versions, flags and any
+    extra settings that change the outcome (e.g. mismatch limits). The sources are
+    not normalized: the stored stderr and diagnostics carry their line numbers.
+    """
+    payload = {
+        "sources": list(sources),
+        "flags": flags,
+        "tools": {tool: tool_version(tool) for tool in tools},
+        "extra": extra or {},
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+class SimCache:
+    """
+    On-disk cache of simulation results and their logs, one folder per key:
+    '<cache_dir>/<key>/result.json' plus any artifact files (e.g. 'sim_log.txt', waveforms).
+    Compiled images are not kept; a hit skips both compile and simulation.
+
+    Entries are evicted least-recently-used first once they take more than
+    'max_bytes' on disk. The modification time of 'result.json' is the last use.
+    """
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, key: str, artifacts_dest: Optional[str] = None) -> Optional[Dict]:
+        """
+        Returns the stored result for 'key', or None. Stored artifact files are copied into 'artifacts_dest'.
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        result_path = os.path.join(entry_dir, "result.json")
+        if not os.path.isfile(result_path):
+            return None
+        try:
+            with open(result_path, "r") as f:
+                result = json.load(f)
+            if artifacts_dest is not None:
+                for file_name in os.listdir(entry_dir):
+                    if file_name != "result.json":
+                        shutil.copy2(os.path.join(entry_dir, file_name), os.path.join(artifacts_dest, file_name))
+            os.utime(result_path)
+        except (OSError, ValueError):
+            logger.exception(f"Ignoring unreadable simulation cache entry {key}")
+            return None
+        return result
+
+    def put(self, key: str, result: Dict, artifacts: Optional[List[str]] = None) -> None:
+        """
+        Stores 'result' (JSON serializable) and copies of the 'artifacts' files under 'key'.
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        if os.path.isdir(entry_dir):
+            return
+        artifacts = [path for path in artifacts or [] if os.path.isfile(path)]
+        if sum(os.path.getsize(path) for path in artifacts) > self.max_bytes:
+            logger.info(f"Not caching simulation {key[:12]}: its artifacts exceed {self.max_bytes} bytes")
+            return
+        staging_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix=".staging_")
+        try:
+            for path in artifacts:
+                shutil.copy2(path, staging_dir)
+            with open(os.path.join(staging_dir, "result.json"), "w") as f:
+                json.dump(result, f)
+            # Atomic publish; another process may have won the race
+            os.rename(staging_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        for key in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, key)
+            if key.startswith(".") or not os.path.isdir(entry_dir):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+                last_use = os.path.getmtime(os.path.join(entry_dir, "result.json"))
+            except OSError:
+                # Removed by another process meanwhile
+                continue
+            entries.append((last_use, key, size))
+            total += size
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, key, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Renamed first so a concurrent get() never sees a half-deleted entry
+            doomed = os.path.join(self.cache_dir, f".evicted_{key}_{time.monotonic_ns()}")
+            try:
+                os.rename(os.path.join(self.cache_dir, key), doomed)
+            except OSError:
+                continue
+            shutil.rmtree(doomed, ignore_errors=True)
+            total -= size
+            evicted += 1
+        logger.info(f"Simulation cache evicted {evicted} entries")
+
+_sim_cache: Optional[SimCache] = None
+
+def get_sim_cache() -> Optional[SimCache]:
+    """
+    Returns the cache configured by [SIM] 'cache_dir' and 'cache_max_mb' in
+    config.toml, or None when [SIM] 'cache' is false.
+    """
+    global _sim_cache
+    sim_config = load_config().get("SIM", {})
+    if not sim_config.get("cache", True):
+        return None
+    if _sim_cache is None:
+        _sim_cache = SimCache(
+            sim_config.get("cache_dir", ".cache/sim"),
+            max_bytes=int(sim_config.get("cache_max_mb", 1024) * 1024 * 1024)
+        )
+    return _sim_cache
@@ -2,14 +2,13 @@ import logging
 from typing import Dict, List, Tuple
 
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_core.prompts import ChatPromptTemplate
 
 # Assuming these are defined elsewhere and correctly imported
 from prompts import RTL_4_SHOT_EXAMPLES # Potentially useful for examples in the prompt, but not directly used in the judge chain logic
-from utils import add_lineno # Still unused, can be removed if not used elsewhere in the file
-from llm import llm # Ensure llm is an initialized LangChain LLM object
+from utils import add_lineno, memoize_per_llm
+from llm import get_llm
+from llm_cache import CachedStructuredChain
 
-import logger_config
 logger = logging.getLogger("root")
 logger.info("Imported Sim Judge module") # Updated log message
 
@@ -31,6 +30,7 @@ class JudgeFormat(BaseModel):
 
 # --- RTL Judge Function ---
 
+@memoize_per_llm
 def get_judge(llm):
     """
     Creates a LangChain chain for judging SystemVerilog RTL.
@@ -41,9 +41,9 @@ def get_judge(llm):
     Returns:
         A LangChain Runnable that takes 'input_spec', 'failed_sim_log',
         'failed_rtl', 'failed_testbench' as input and returns an RTLJudgeFormat object.
+        Built once per LLM.
     """
-
-    structured_judge = llm.with_structured_output(JudgeFormat)
+    from langchain_core.prompts import ChatPromptTemplate
 
     system_prompt = """
 You are an expert in RTL verification. Your task is to analyze failed simulation logs,
@@ -142,7 +142,7 @@ A simulation has failed for the RTL (Register Transfer Level) module and its cor
 
     judge_prompt = ChatPromptTemplate.from_messages(messages)
 
-    return  judge_prompt | structured_judge
+    return CachedStructuredChain(judge_prompt, llm, JudgeFormat)
 
 
 class SimJudge:
@@ -177,7 +177,7 @@ class SimJudge:
                              a boolean indicating if the RTL needs a fix.
         """
         
-        llm_chain = get_judge(llm) # Get the LangChain runnable for the RTL judge
+        llm_chain = get_judge(get_llm()) # Get the LangChain runnable for the RTL judge
 
         # Prepare the input dictionary for the LLM chain
         chain_inputs = {
@@ -0,0 +1,266 @@
+import re
+import logging
+from dataclasses import dataclass, field, asdict, replace
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("root")
+logger.info("Imported Sim Result module")
+
+# 'name=value' / 'name: value' pairs in mismatch displays
+_DISPLAYED_VALUE = re.compile(r"\b([A-Za-z_][A-Za-z0-9_.\[\]]*)\s*[=:]\s*([^\s,;]+)")
+_MISMATCH_TIME = re.compile(r"\btime\s*[=:]?\s*(\d+)", re.IGNORECASE)
+# 'SIMULATION FAILED - x MISMATCHES DETECTED, FIRST AT TIME y'
+_SUMMARY_TIME = re.compile(r"FIRST AT TIME\s*(\d+)", re.IGNORECASE)
+_NOT_SIGNALS = {"time", "input", "output", "inout", "reg", "wire", "logic", "at", "cycle", "Mismatch"}
+_EXPECTED_MARKERS = ("expected_", "_expected", "exp_", "_exp", "ref_", "_ref", "golden_", "_golden")
+_ACTUAL_MARKERS = ("actual_", "_actual", "got_", "_got", "dut_", "_dut")
+
+def _strip_marker(name: str, markers) -> Optional[str]:
+    lowered = name.lower()
+    for marker in markers:
+        if marker.endswith("_") and lowered.startswith(marker):
+            return name[len(marker):]
+        if marker.startswith("_") and lowered.endswith(marker):
+            return name[:-len(marker)]
+    if lowered in {marker.strip("_") for marker in markers}:
+        return ""
+    return None
+
+@dataclass
+class LogLine:
+    """
+    A line of the simulation log and its byte offset in the log file. 'variant'
+    names the simulation it came from when several ran for one check.
+    """
+    offset: int
+    text: str
+    variant: Optional[str] = None
+
+@dataclass
+class Mismatch:
+    """
+    One 'Mismatch' line of the testbench output.
+
+    Attributes:
+        offset: Byte offset of the line in the simulation log.
+        text: The line as printed.
+        time: Simulation time parsed from the line, or None.
+        values: Every 'name=value' pair shown on the line.
+        expected: Values of names marked as expected/reference, keyed by the bare
+                  signal name ("" for a plain 'expected=...').
+        actual: Values of names marked as actual/got, keyed like 'expected'.
+        variant: The simulation (e.g. "seed3") the line came from when several ran for one check.
+    """
+    offset: int
+    text: str
+    time: Optional[int] = None
+    values: Dict[str, str] = field(default_factory=dict)
+    expected: Dict[str, str] = field(default_factory=dict)
+    actual: Dict[str, str] = field(default_factory=dict)
+    variant: Optional[str] = None
+
+    @classmethod
+    def parse(cls, offset: int, text: str) -> "Mismatch":
+        mismatch = cls(offset=offset, text=text)
+        match = _MISMATCH_TIME.search(text)
+        if match:
+            mismatch.time = int(match.group(1))
+        for name, value in _DISPLAYED_VALUE.findall(text):
+            if name in _NOT_SIGNALS:
+                continue
+            mismatch.values[name] = value
+            expected = _strip_marker(name, _EXPECTED_MARKERS)
+            actual = _strip_marker(name, _ACTUAL_MARKERS) if expected is None else None
+            if expected is not None:
+                mismatch.expected[expected] = value
+            elif actual is not None:
+                mismatch.actual[actual] = value
+        return mismatch
+
+@dataclass
+class SimResult:
+    """
+    What a simulation run reported, parsed once while its output streams in.
+
+    Attributes:
+        is_pass: Final verdict: the run succeeded, printed SIMULATION PASSED, was not
+                 stopped early and produced no blocking stderr.
+        passed: The testbench printed SIMULATION PASSED.
+        failed: The testbench printed SIMULATION FAILED.
+        mismatch_cnt: Number of mismatches, 0 unless the simulation failed or was stopped early.
+        first_mismatch_time: Simulation time of the first mismatch, or None.
+        first_failure_offset: Byte offset of the first mismatch line in the log, or None.
+        mismatches: The first mismatch lines, parsed.
+        warnings: The first WARNING lines.
+        abort_reason: Why the simulation was stopped early, or None.
+        log_bytes: Size of the simulation log in bytes.
+        variants: Per-simulation summaries ('variant', 'is_pass', 'mismatch_cnt',
+                  'first_mismatch_time') when several ran for one check, else empty.
+    """
+    is_pass: bool = False
+    passed: bool = False
+    failed: bool = False
+    mismatch_cnt: int = 0
+    first_mismatch_time: Optional[int] = None
+    first_failure_offset: Optional[int] = None
+    mismatches: List[Mismatch] = field(default_factory=list)
+    warnings: List[LogLine] = field(default_factory=list)
+    abort_reason: Optional[str] = None
+    log_bytes: int = 0
+    variants: List[Dict] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SimResult":
+        return cls(**{
+            **data,
+            "mismatches": [Mismatch(**item) for item in data.get("mismatches", [])],
+            "warnings": [LogLine(**item) for item in data.get("warnings", [])],
+        })
+
+    @property
+    def mismatch_lines(self) -> List[str]:
+        return [mismatch.text for mismatch in self.mismatches]
+
+    @property
+    def warning_lines(self) -> List[str]:
+        return [warning.text for warning in self.warnings]
+
+    def signal_names(self) -> set:
+        """
+        Returns the bare names of the signals shown in the mismatch lines.
+        """
+        names = set()
+        for mismatch in self.mismatches:
+            for name in mismatch.values:
+                bare = _strip_marker(name, _EXPECTED_MARKERS)
+                if bare is None:
+                    bare = _strip_marker(name, _ACTUAL_MARKERS)
+                names.add(name if bare is None else bare)
+        names.discard("")
+        return {name.split("[")[0].split(".")[-1] for name in names}
+
+class SimOutputMonitor:
+    """
+    Builds a SimResult from simulation stdout, line by line: counts 'Mismatch' lines,
+    parses the first few of them, and tells the runner to stop the simulation once
+    'max_mismatches' mismatches were seen or, after the first mismatch,
+    'max_failing_bytes' more bytes were printed. The judge only needs the first failures.
+
+    Byte offsets assume '\\n' line endings, which is what vvp prints.
+    """
+    def __init__(self, max_mismatches: int = 0, max_failing_bytes: int = 0, keep_lines: int = 20):
+        self.max_mismatches = max_mismatches
+        self.max_failing_bytes = max_failing_bytes
+        self.keep_lines = keep_lines
+        self.result = SimResult()
+        self.lines_seen = 0
+        self.bytes_since_failure = 0
+
+    def __call__(self, line: str) -> bool:
+        result = self.result
+        offset = result.log_bytes
+        size = len(line.encode("utf-8", errors="replace")) + 1
+        result.log_bytes += size
+        if self.lines_seen:
+            self.bytes_since_failure += size
+
+        if line.startswith("Mismatch"):
+            self.lines_seen += 1
+            if result.first_failure_offset is None:
+                result.first_failure_offset = offset
+            if len(result.mismatches) < self.keep_lines:
+                mismatch = Mismatch.parse(offset, line)
+                result.mismatches.append(mismatch)
+                if result.first_mismatch_time is None:
+                    result.first_mismatch_time = mismatch.time
+        elif line.startswith("WARNING"):
+            if len(result.warnings) < self.keep_lines:
+                result.warnings.append(LogLine(offset, line))
+        elif "SIMULATION PASSED" in line:
+            result.passed = True
+        elif "SIMULATION FAILED" in line:
+            result.failed = True
+            match = _SUMMARY_TIME.search(line)
+            if match and result.first_mismatch_time is None:
+                result.first_mismatch_time = int(match.group(1))
+
+        if self.max_mismatches and self.lines_seen >= self.max_mismatches:
+            result.abort_reason = f"stopped after {self.lines_seen} mismatches"
+        elif self.max_failing_bytes and self.bytes_since_failure >= self.max_failing_bytes:
+            result.abort_reason = f"stopped after {self.bytes_since_failure} bytes of output following the first mismatch"
+        return result.abort_reason is not None
+
+    def finish(self, run_ok: bool, stderr_ok: bool) -> SimResult:
+        """
+        Sets the verdict once the run is over.
+
+        Args:
+            run_ok (bool): The simulator ran to completion (or was stopped by this monitor).
+            stderr_ok (bool): stderr is empty or only holds benign messages.
+
+        Returns:
+            SimResult: The completed result.
+        """
+        result = self.result
+        result.mismatch_cnt = self.lines_seen if (result.failed or result.abort_reason) else 0
+        result.is_pass = run_ok and result.passed and not result.abort_reason and stderr_ok
+        return result
+
+def merge_sim_results(labelled: List[Tuple[str, SimResult]], keep_lines: int = 20) -> SimResult:
+    """
+    Merges the results of simulations of the same design that ran side by side
+    (e.g. one per seed) into one report. The check passes only if every simulation
+    passed. The kept mismatch lines start with the first mismatch of every failing
+    simulation, earliest first; offsets refer to each simulation's own log.
+
+    Args:
+        labelled (List[Tuple[str, SimResult]]): (variant label, result) pairs.
+        keep_lines (int): Maximum number of mismatch and warning lines kept.
+
+    Returns:
+        SimResult: The merged result.
+    """
+    merged = SimResult(
+        is_pass=all(result.is_pass for _, result in labelled),
+        passed=all(result.passed for _, result in labelled),
+        failed=any(result.failed for _, result in labelled),
+        mismatch_cnt=sum(result.mismatch_cnt for _, result in labelled),
+        log_bytes=sum(result.log_bytes for _, result in labelled),
+    )
+
+    failing = [(label, result) for label, result in labelled if result.mismatches]
+    # Earliest failure first; results without a parsed time go last
+    failing.sort(key=lambda item: (item[1].first_mismatch_time is None, item[1].first_mismatch_time or 0))
+    if failing:
+        first = failing[0][1]
+        merged.first_mismatch_time = first.first_mismatch_time
+        merged.first_failure_offset = first.first_failure_offset
+
+    firsts = [replace(result.mismatches[0], variant=label) for label, result in failing]
+    rest = [replace(mismatch, variant=label) for label, result in failing for mismatch in result.mismatches[1:]]
+    merged.mismatches = (firsts + rest)[:keep_lines]
+    merged.warnings = [
+        replace(warning, variant=label) for label, result in labelled for warning in result.warnings
+    ][:keep_lines]
+
+    reasons = [f"{label}: {result.abort_reason}" for label, result in labelled if result.abort_reason]
+    merged.abort_reason = "; ".join(reasons) or None
+    merged.variants = [
+        {"variant": label, "is_pass": result.is_pass, "mismatch_cnt": result.mismatch_cnt,
+         "first_mismatch_time": result.first_mismatch_time}
+        for label, result in labelled
+    ]
+    return merged
+
+def parse_sim_stdout(stdout: str) -> SimResult:
+    """
+    Parses already captured stdout in one pass, for results that were not streamed.
+    """
+    monitor = SimOutputMonitor()
+    for line in stdout.split("\n"):
+        monitor(line.rstrip("\r"))
+    # Without the streamed verdict, mismatches only count when the testbench reported a failure
+    return monitor.finish(run_ok=False, stderr_ok=False)
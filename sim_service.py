@@ -0,0 +1,263 @@
+import os
+import json
+import socket
+import asyncio
+import hashlib
+import logging
+import argparse
+from typing import Dict, Optional, Tuple
+
+import logger_config
+from utils import load_config
+from deadline import CANCEL_POLL, Deadline, DeadlineExceeded, current_deadline, deadline_scope
+from scratch import copy_back, kept_artifacts
+
+logger = logging.getLogger("root")
+logger.info("Imported Sim Service module")
+
+OP_CHECK = "check"
+OP_SIMULATE = "simulate"
+
+# Largest accepted request/response line
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+def job_key(request: Dict) -> str:
+    """
+    Hashes what determines the result of a job: the operation, the simulator and
+    the contents of the files it reads. Jobs with the same key run once.
+    """
+    if request["op"] == OP_CHECK:
+        paths = [request["path"]]
+    else:
+        paths = [os.path.join(request["path"], file_name) for file_name in ("tb.sv", "rtl.sv")]
+    digest = hashlib.sha256(json.dumps(
+        [request["op"], request.get("simulator"), bool(request.get("dump_failure"))]
+    ).encode("utf-8"))
+    for path in paths:
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _relocate(response: Dict, op: str, src_path: str, dest_path: str) -> Dict:
+    # A deduplicated job ran on files at another path: point its messages at the
+    # requester's files and, for simulations, copy the log and waveforms over
+    if op == OP_SIMULATE:
+        from reviewer import SIM_LOG_NAME
+        # Also the per-variant logs 'sim_log_<label>.txt'
+        copy_back(src_path, dest_path, [SIM_LOG_NAME, "sim_log_*.txt", *kept_artifacts()])
+    sim_output = {
+        key: value.replace(src_path, dest_path) if isinstance(value, str) else value
+        for key, value in response["sim_output"].items()
+    }
+    return {**response, "sim_output": sim_output}
+
+class SimService:
+    """
+    Local simulation daemon. Agent processes send check/simulate jobs over a Unix
+    socket; the jobs are queued and run by a fixed number of workers, so the
+    machine runs at most 'workers' tool invocations no matter how many agents are
+    connected. Identical jobs that are queued or running at the same time are
+    run once and every requester gets the result.
+
+    Every request gets its deadline ('timeout') when it is submitted, so queueing
+    counts against it. A requester stops waiting at its own deadline; a shared
+    job runs until the latest deadline of the requesters waiting for it.
+
+    Protocol: one JSON object per line and connection. Requests carry 'op'
+    ("check" with the path of rtl.sv, or "simulate" with the run folder as
+    'path'), optionally 'simulator', 'dump_failure' and 'timeout' (seconds). Responses carry
+    'ok' and either the results of reviewer.check_rtl / reviewer.sim_review
+    ('is_pass', 'mismatch_cnt', 'sim_output') or 'error'.
+    """
+    def __init__(self, socket_path: str, workers: int):
+        self.socket_path = os.path.abspath(socket_path)
+        self.workers = max(1, workers)
+        self.queue: Optional[asyncio.Queue] = None
+        self.inflight: Dict[str, Tuple[asyncio.Future, Deadline]] = {}
+        self.stats = {"jobs": 0, "deduplicated": 0, "completed": 0, "failed": 0}
+
+    async def serve_forever(self) -> None:
+        self.queue = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            # Left over from a daemon that did not shut down cleanly
+            os.remove(self.socket_path)
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=MAX_MESSAGE_BYTES)
+        logger.info(f"Simulation service listening on {self.socket_path} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = json.loads(await reader.readline())
+            response = await self.submit(request)
+        except Exception as e:
+            logger.exception("Simulation service request failed")
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        try:
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+        except ConnectionError:
+            logger.warning("Simulation service client went away before its result was ready")
+        finally:
+            writer.close()
+
+    async def submit(self, request: Dict) -> Dict:
+        """
+        Queues 'request', or joins an identical job already queued or running, and waits for its result.
+        """
+        if request.get("op") not in (OP_CHECK, OP_SIMULATE) or "path" not in request:
+            raise ValueError(f"Expected 'op' ({OP_CHECK} or {OP_SIMULATE}) and 'path', got {sorted(request)}")
+        request["path"] = os.path.abspath(request["path"])
+        deadline = Deadline(request.get("timeout"))
+
+        # Reads the design files
+        key = await asyncio.to_thread(job_key, request)
+        self.stats["jobs"] += 1
+        entry = self.inflight.get(key)
+        if entry is None:
+            future = asyncio.get_running_loop().create_future()
+            self.inflight[key] = (future, deadline)
+            await self.queue.put((key, request, future, deadline))
+            logger.info(f"Queued {request['op']} job {key[:12]} ({self.queue.qsize()} waiting)")
+        else:
+            future, job_deadline = entry
+            # The shared job must not be cut short for a requester that can wait longer
+            job_deadline.extend(deadline)
+            self.stats["deduplicated"] += 1
+            logger.info(f"Joined running {request['op']} job {key[:12]}")
+
+        try:
+            # Shielded: a client that disconnects or gives up must not cancel the job for the others
+            response, job_path = await asyncio.wait_for(asyncio.shield(future), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            return {"ok": False, "error": f"DeadlineExceeded: no result within {request.get('timeout')}s"}
+        if response["ok"] and job_path != request["path"]:
+            response = await asyncio.to_thread(_relocate, response, request["op"], job_path, request["path"])
+        return response
+
+    async def _worker(self) -> None:
+        while True:
+            key, request, future, deadline = await self.queue.get()
+            try:
+                response = await self._run(request, deadline)
+                self.stats["completed"] += 1
+            except Exception as e:
+                logger.exception(f"{request['op']} job {key[:12]} failed")
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                self.stats["failed"] += 1
+            finally:
+                del self.inflight[key]
+                self.queue.task_done()
+            future.set_result((response, request["path"]))
+            logger.info(f"Simulation service stats: {self.stats}")
+
+    async def _run(self, request: Dict, deadline: Deadline) -> Dict:
+        from reviewer import check_rtl_async, sim_review_async
+
+        # The requesters' deadline bounds the tool runs, as it would locally
+        with deadline_scope(deadline):
+            if request["op"] == OP_CHECK:
+                is_pass, sim_output = await check_rtl_async(request["path"], request.get("simulator"))
+                return {"ok": True, "is_pass": is_pass, "sim_output": sim_output}
+            is_pass, mismatch_cnt, sim_output = await sim_review_async(
+                request["path"], request.get("simulator"), bool(request.get("dump_failure"))
+            )
+            return {"ok": True, "is_pass": is_pass, "mismatch_cnt": mismatch_cnt, "sim_output": sim_output}
+
+class SimServiceClient:
+    """
+    Sends jobs to a running SimService. Calls block until the result arrives;
+    under a run deadline, they give up once it passes.
+    """
+    def __init__(self, socket_path: str):
+        self.socket_path = os.path.abspath(socket_path)
+
+    def request(self, request: Dict) -> Optional[Dict]:
+        """
+        Sends one job and returns the response, or None if the service is not reachable.
+
+        Raises:
+            RuntimeError: The service ran the job and it failed.
+            DeadlineExceeded: The run deadline passed before or while waiting.
+        """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check("simulation job")
+            if deadline.remaining() is not None:
+                request = {**request, "timeout": deadline.remaining()}
+
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.socket_path)
+        except OSError as e:
+            logger.warning(f"Simulation service at {self.socket_path} is not reachable ({e}), running locally")
+            return None
+
+        with sock:
+            sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+            sock.settimeout(CANCEL_POLL)
+            chunks = []
+            while True:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceeded("Run deadline passed while waiting for the simulation service")
+                try:
+                    chunk = sock.recv(64 * 1024)
+                except socket.timeout:
+                    continue
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if chunk.endswith(b"\n"):
+                    break
+
+        if not chunks:
+            raise RuntimeError("Simulation service closed the connection without a result")
+        response = json.loads(b"".join(chunks))
+        if not response.get("ok"):
+            raise RuntimeError(f"Simulation service job failed: {response.get('error')}")
+        return response
+
+    def check(self, rtl_path: str, simulator: Optional[str] = None) -> Optional[Dict]:
+        return self.request({"op": OP_CHECK, "path": os.path.abspath(rtl_path), "simulator": simulator})
+
+    def simulate(self, output_dir_per_run: str, simulator: Optional[str] = None,
+                 dump_failure: bool = False) -> Optional[Dict]:
+        return self.request({"op": OP_SIMULATE, "path": os.path.abspath(output_dir_per_run),
+                             "simulator": simulator, "dump_failure": dump_failure})
+
+def get_service_client() -> Optional[SimServiceClient]:
+    """
+    Returns a client for the service at [SIM] service_socket, or None when no
+    socket is configured or the platform has no Unix sockets.
+    """
+    socket_path = load_config().get("SIM", {}).get("service_socket", "")
+    if not socket_path or not hasattr(socket, "AF_UNIX"):
+        return None
+    return SimServiceClient(socket_path)
+
+if __name__ == "__main__":
+    sim_config = load_config().get("SIM", {})
+    parser = argparse.ArgumentParser(description="Run the local simulation service.")
+    parser.add_argument("-s", "--socket", default=sim_config.get("service_socket") or ".cache/sim_service.sock",
+                        help="Unix socket to listen on (default: [SIM] service_socket)")
+    parser.add_argument("-w", "--workers", type=int, default=sim_config.get("service_workers") or os.cpu_count() or 1,
+                        help="Number of jobs running at the same time (default: [SIM] service_workers or CPU count)")
+    args = parser.parse_args()
+
+    logger_config.init_logging()
+
+    try:
+        asyncio.run(SimService(args.socket, args.workers).serve_forever())
+    except KeyboardInterrupt:
+        logger.info("Simulation service stopped")
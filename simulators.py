@@ -0,0 +1,198 @@
+import os
+import re
+import shutil
+import logging
+import functools
+from typing import Dict, List, Optional
+
+from utils import load_config
+from diagnostics import Diagnostic, SEVERITY_WARNING, parse_diagnostics, all_lines_benign, blocking
+
+logger = logging.getLogger("root")
+logger.info("Imported Simulators module")
+
+IVERILOG_FLAGS = ["-Wall", "-Winfloop", "-Wno-timescale", "-g2012"]
+# Lint and style warnings are reported but do not stop the build, like iverilog's
+VERILATOR_FLAGS = ["--timing", "-Wno-fatal", "-Wno-lint", "-Wno-style"]
+
+SIMULATOR_AUTO = "auto"
+
+class SimulatorBackend:
+    """
+    How to lint, compile and run a design with one simulator, and how to read its
+    stderr. The testbench output ($display lines) is the same for every backend and
+    is parsed by sim_result.SimOutputMonitor.
+
+    Every command runs with a private scratch folder as working directory and puts
+    its outputs there.
+    """
+    name = ""
+    tools: List[str] = []
+    flags: List[str] = []
+
+    @functools.cached_property
+    def available(self) -> bool:
+        return all(shutil.which(tool) for tool in self.tools)
+
+    def lint_argv(self, rtl_path: str, scratch: str) -> List[str]:
+        """
+        Returns the command that syntax-checks 'rtl_path' without building anything runnable.
+        """
+        raise NotImplementedError
+
+    def compile_argv(self, sources: List[str], scratch: str) -> List[str]:
+        """
+        Returns the command that builds the simulation of 'sources' in 'scratch'.
+        """
+        raise NotImplementedError
+
+    def run_argv(self, scratch: str, plusargs: Optional[List[str]] = None, waveforms: bool = True) -> List[str]:
+        """
+        Returns the command that runs the simulation built by compile_argv.
+
+        Args:
+            scratch (str): The folder passed to compile_argv.
+            plusargs (List[str], optional): '+name=value' arguments for the testbench.
+            waveforms (bool): False suppresses the testbench's $dumpfile/$dumpvars output.
+        """
+        raise NotImplementedError
+
+    def diagnostics(self, stderr: str) -> List[Diagnostic]:
+        return parse_diagnostics(stderr)
+
+    def failing(self, diagnostics: List[Diagnostic]) -> List[Diagnostic]:
+        """
+        Returns the diagnostics that make the check or simulation fail with this simulator.
+        """
+        return blocking(diagnostics)
+
+    def stderr_ok(self, stderr: str) -> bool:
+        """
+        True if 'stderr' does not make the check or simulation fail.
+        """
+        return stderr == "" or all_lines_benign(stderr)
+
+class IcarusBackend(SimulatorBackend):
+    """
+    Icarus Verilog: iverilog compiles to a vvp image that vvp interprets. Quick to
+    build, slow on long simulations.
+    """
+    name = "iverilog"
+    tools = ["iverilog", "vvp"]
+    flags = IVERILOG_FLAGS
+
+    def lint_argv(self, rtl_path: str, scratch: str) -> List[str]:
+        return ["iverilog", "-t", "null", *self.flags, "-o", os.path.join(scratch, "check.out"), rtl_path]
+
+    def compile_argv(self, sources: List[str], scratch: str) -> List[str]:
+        return ["iverilog", *self.flags, "-o", os.path.join(scratch, "sim_output.vvp"), *sources]
+
+    def run_argv(self, scratch: str, plusargs: Optional[List[str]] = None, waveforms: bool = True) -> List[str]:
+        # '-none' (an extended argument, after the image) turns every $dump* call into a no-op
+        extended = [] if waveforms else ["-none"]
+        return ["vvp", "-n", os.path.join(scratch, "sim_output.vvp"), *extended, *(plusargs or [])]
+
+class VerilatorBackend(SimulatorBackend):
+    """
+    Verilator: translates the design to C++ and builds a native executable
+    ('--binary'). The build takes seconds to minutes, the simulation then runs
+    many times faster than vvp.
+    """
+    name = "verilator"
+    tools = ["verilator"]
+    flags = VERILATOR_FLAGS
+
+    def lint_argv(self, rtl_path: str, scratch: str) -> List[str]:
+        return ["verilator", "--lint-only", *self.flags, rtl_path]
+
+    def compile_argv(self, sources: List[str], scratch: str) -> List[str]:
+        return ["verilator", "--binary", "-j", "0", *self.flags,
+                "--Mdir", os.path.join(scratch, "obj_dir"), "-o", "sim_output", *sources]
+
+    def run_argv(self, scratch: str, plusargs: Optional[List[str]] = None, waveforms: bool = True) -> List[str]:
+        # Built without --trace, so $dump* calls never write waveforms here
+        return [os.path.join(scratch, "obj_dir", "sim_output"), *(plusargs or [])]
+
+    def failing(self, diagnostics: List[Diagnostic]) -> List[Diagnostic]:
+        # Non-fatal Verilator warnings and C++ build chatter do not fail a run
+        return [diagnostic for diagnostic in blocking(diagnostics) if diagnostic.severity != SEVERITY_WARNING]
+
+    def stderr_ok(self, stderr: str) -> bool:
+        return not self.failing(self.diagnostics(stderr))
+
+BACKENDS: Dict[str, SimulatorBackend] = {
+    backend.name: backend for backend in (IcarusBackend(), VerilatorBackend())
+}
+
+_LOOP_BOUND = re.compile(
+    r"\b(?:repeat\s*\(\s*|for\s*\([^;]*;[^;<]*<=?\s*)(?:\d*'[sS]?[dD])?(\d+)\s*\)?"
+)
+_HALF_PERIOD = re.compile(r"\balways\s*#\s*(\d+)\s*\w+\s*=\s*[~!]")
+_DELAY = re.compile(r"#\s*(\d+)\b")
+_BLOCK_TOKEN = re.compile(r"\b(begin|end|fork|join(?:_any|_none)?)\b")
+
+def estimate_cycles(tb_code: str) -> int:
+    """
+    Roughly estimates how many clock cycles a testbench simulates: the iterations
+    of its repeat/for loops, multiplying the bounds of loops nested in
+    begin/end blocks, or its summed delays divided by the clock period, whichever
+    is larger.
+    """
+    events = sorted(
+        [(match.start(), "loop", int(match.group(1))) for match in _LOOP_BOUND.finditer(tb_code)]
+        + [(match.start(), match.group(1), 0) for match in _BLOCK_TOKEN.finditer(tb_code)]
+    )
+    loop_cycles = 0
+    stack = []          # loop bound (or 1) of each open begin/fork block
+    pending = 1         # bound of a loop header waiting for its body
+    for _, kind, bound in events:
+        if kind == "loop":
+            multiplier = 1
+            for factor in stack:
+                multiplier *= factor
+            loop_cycles += multiplier * bound
+            pending = bound
+        elif kind in ("begin", "fork"):
+            stack.append(pending)
+            pending = 1
+        elif stack:
+            stack.pop()
+
+    half_period = _HALF_PERIOD.search(tb_code)
+    period = 2 * int(half_period.group(1)) if half_period and int(half_period.group(1)) else 10
+    delay_cycles = sum(int(delay) for delay in _DELAY.findall(tb_code)) // period
+
+    return max(loop_cycles, delay_cycles)
+
+def select_backend(simulator: Optional[str] = None, tb_code: Optional[str] = None) -> SimulatorBackend:
+    """
+    Picks the simulator for a run.
+
+    Args:
+        simulator (str, optional): "iverilog", "verilator" or "auto". Defaults to
+            [SIM] simulator in config.toml. "auto" uses Verilator when it is installed
+            and the testbench is estimated to run at least [SIM] verilator_min_cycles
+            cycles, else iverilog.
+        tb_code (str, optional): The testbench, for the "auto" estimate.
+
+    Returns:
+        SimulatorBackend: The chosen backend, iverilog if the requested one is not installed.
+    """
+    sim_config = load_config().get("SIM", {})
+    simulator = simulator or sim_config.get("simulator", SIMULATOR_AUTO)
+
+    if simulator == SIMULATOR_AUTO:
+        simulator = IcarusBackend.name
+        if tb_code and BACKENDS[VerilatorBackend.name].available:
+            cycles = estimate_cycles(tb_code)
+            if cycles >= sim_config.get("verilator_min_cycles", 200000):
+                logger.info(f"Testbench runs an estimated {cycles} cycles, simulating with Verilator")
+                simulator = VerilatorBackend.name
+
+    backend = BACKENDS.get(simulator)
+    if backend is None:
+        raise ValueError(f"Unknown simulator '{simulator}', expected one of {sorted(BACKENDS)} or '{SIMULATOR_AUTO}'")
+    if not backend.available and backend.name != IcarusBackend.name:
+        logger.warning(f"Simulator '{backend.name}' is not installed, falling back to iverilog")
+        backend = BACKENDS[IcarusBackend.name]
+    return backend
@@ -0,0 +1,170 @@
+import re
+import bisect
+import logging
+from typing import Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("root")
+logger.info("Imported Source View module")
+
+# Comments are replaced by as many newlines as they span, so line numbers stay valid
+_COMMENT_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_MODULE_START = re.compile(r"^\s*(?:module|interface|program)\b")
+_MODULE_END = re.compile(r"\b(?:endmodule|endinterface|endprogram)\b")
+_BLOCK_START = re.compile(r"^\s*(?:always(?:_ff|_comb|_latch)?|initial|final)\b")
+_BEGIN = re.compile(r"\b(?:begin|fork)\b")
+_END = re.compile(r"\b(?:end|join|join_any|join_none)\b")
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+
+def _strip_comments(code: str) -> str:
+    def replace(match):
+        token = match.group(0)
+        return token if token.startswith('"') else "\n" * token.count("\n")
+    return _COMMENT_PATTERN.sub(replace, code)
+
+class SourceView:
+    """
+    Line-indexed view of one source file. Builds a line-offset index and the line
+    spans of modules (with their port lists) and always/initial blocks once, then
+    renders only the windows of the file around given lines, with their original
+    line numbers.
+    """
+    def __init__(self, code: str):
+        self.code = code
+        # offsets[i] is where line i + 1 starts
+        self.offsets = [0] + [match.end() for match in re.finditer("\n", code)]
+        self.num_lines = len(self.offsets)
+
+        self.modules: List[Tuple[int, int, int]] = []   # (start, port_list_end, end)
+        self.blocks: List[Tuple[int, int]] = []         # (start, end)
+        self._stripped = _strip_comments(code).split("\n")
+        self._index_structure(self._stripped)
+
+    def line(self, number: int) -> str:
+        """
+        Returns line 'number' (1-based) without its newline.
+        """
+        start = self.offsets[number - 1]
+        end = self.offsets[number] - 1 if number < self.num_lines else len(self.code)
+        return self.code[start:end].rstrip("\r")
+
+    def line_of_offset(self, offset: int) -> int:
+        return bisect.bisect_right(self.offsets, offset)
+
+    def _index_structure(self, lines: List[str]) -> None:
+        module_start = None
+        port_list_end = None
+        block_start = None
+        depth = 0
+
+        for number, text in enumerate(lines, start=1):
+            if module_start is None and _MODULE_START.match(text):
+                module_start, port_list_end = number, None
+            if module_start is not None and port_list_end is None and ";" in text:
+                port_list_end = number
+
+            if block_start is None and _BLOCK_START.match(text):
+                block_start, depth = number, 0
+            if block_start is not None:
+                depth += len(_BEGIN.findall(text)) - len(_END.findall(text))
+                # A block without begin/end ends with its first statement
+                if depth <= 0 and (";" in text or _END.search(text)):
+                    self.blocks.append((block_start, number))
+                    block_start = None
+
+            if module_start is not None and _MODULE_END.search(text):
+                self.modules.append((module_start, port_list_end or module_start, number))
+                module_start = None
+                block_start = None
+
+    def lines_mentioning(self, names: Iterable[str]) -> List[int]:
+        """
+        Returns the numbers of the lines that use any of the identifiers in 'names'.
+        """
+        wanted = set(names)
+        if not wanted:
+            return []
+        return [number for number, text in enumerate(self._stripped, start=1)
+                if wanted.intersection(_IDENTIFIER.findall(text))]
+
+    def _first_uses(self, target: int) -> List[int]:
+        # Where the identifiers on 'target' first appear in its module, usually their declarations
+        names = set(_IDENTIFIER.findall(self._stripped[target - 1]))
+        module_start = next((start for start, _, end in self.modules if start <= target <= end), 1)
+        lines = []
+        for number in range(module_start, target):
+            found = names.intersection(_IDENTIFIER.findall(self._stripped[number - 1]))
+            if found:
+                lines.append(number)
+                names -= found
+            if not names:
+                break
+        return lines
+
+    def windows(self, targets: Iterable[int], context: int = 5, max_block_lines: int = 60) -> List[Tuple[int, int]]:
+        """
+        Returns merged, sorted line ranges covering each target line +- 'context', the
+        always/initial block around it (if at most 'max_block_lines' long), the
+        header and port list of its module and the lines where the identifiers on
+        the target line first appear in that module.
+        """
+        ranges = []
+        for target in targets:
+            if not 1 <= target <= self.num_lines:
+                continue
+            ranges.append((max(1, target - context), min(self.num_lines, target + context)))
+            ranges.extend((number, number) for number in self._first_uses(target))
+            for start, end in self.blocks:
+                if start <= target <= end and end - start < max_block_lines:
+                    ranges.append((start, end))
+            for start, port_list_end, end in self.modules:
+                if start <= target <= end:
+                    ranges.append((start, port_list_end))
+
+        merged: List[Tuple[int, int]] = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def render(self, ranges: Optional[List[Tuple[int, int]]] = None, minify: bool = True) -> str:
+        """
+        Renders the given line ranges (the whole file by default) as 'n: text' lines
+        with their original numbers, marking skipped lines. With 'minify', comments,
+        blank lines and trailing whitespace are left out.
+        """
+        if ranges is None:
+            ranges = [(1, self.num_lines)]
+        source_lines = self._stripped if minify else None
+
+        out = []
+        previous_end = 0
+        for start, end in ranges:
+            if start > previous_end + 1:
+                out.append(f"... [lines {previous_end + 1}-{start - 1} not shown] ...\n")
+            for number in range(start, end + 1):
+                text = source_lines[number - 1].rstrip() if minify else self.line(number)
+                if minify and not text.strip():
+                    continue
+                out.append(f"{number}: {text}\n")
+            previous_end = end
+        if ranges and previous_end < self.num_lines:
+            out.append(f"... [lines {previous_end + 1}-{self.num_lines} not shown] ...\n")
+        return "".join(out)
+
+    def render_focused(self, targets: Iterable[int], context: int = 5, max_block_lines: int = 60,
+                       full_file_lines: int = 200, minify: bool = True) -> str:
+        """
+        Renders only the windows around 'targets' for files longer than
+        'full_file_lines', and the whole file otherwise or when no target is inside it.
+        """
+        targets = list(targets)
+        if self.num_lines <= full_file_lines or not targets:
+            return self.render(minify=minify)
+        ranges = self.windows(targets, context, max_block_lines)
+        if not ranges:
+            return self.render(minify=minify)
+        shown = sum(end - start + 1 for start, end in ranges)
+        logger.info(f"Showing {shown} of {self.num_lines} lines around {len(targets)} focus lines")
+        return self.render(ranges, minify=minify)
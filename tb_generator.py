@@ -2,14 +2,15 @@ import logging
 from typing import Dict, List, Tuple
 
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser # Not used in optimized get_tb_writer
 
 # Assuming these are defined elsewhere and correctly imported
 from prompts import TB_4_SHOT_EXAMPLES 
-from llm import llm # Ensure llm is an initialized LangChain LLM object
+from utils import memoize_per_llm, load_config
+from llm import get_llm
+from llm_cache import CachedStructuredChain
+from patching import PatchError, apply_line_edits, describe_edits
+from rtl_generator import LineEdit, with_patch_instructions
 
-import logger_config
 logger = logging.getLogger("root")
 logger.info("Imported TB Generator module")
 
@@ -84,6 +85,24 @@ end
 </display_queue_example>
 """
 
+SHARDING_PROMPT = """
+11. Split the test cases into shards, so that several simulations can run one slice each in parallel:
+    integer shard_index, shard_count;
+    initial begin
+        if (!$value$plusargs("shard_index=%d", shard_index)) shard_index = 0;
+        if (!$value$plusargs("shard_count=%d", shard_count)) shard_count = 1;
+    end
+    Number the test cases 0, 1, 2, ... and run test case k only if (k % shard_count) == shard_index,
+    resetting the module before the first test case of the slice. Count mismatches and display
+    "SIMULATION PASSED"/"SIMULATION FAILED ..." for the slice that was run.
+"""
+
+def sharding_prompt() -> str:
+    """
+    The sharding instructions when [SIM] shards > 1, else nothing.
+    """
+    return SHARDING_PROMPT if load_config().get("SIM", {}).get("shards", 1) > 1 else ""
+
 # --- Pydantic Model ---
 
 class TBOutputFormat(BaseModel):
@@ -102,8 +121,21 @@ class TBOutputFormat(BaseModel):
                     "This should be error-free and ready for output to .SV file that can be run using a verilog simulator"
     )
 
+class TBPatchFormat(BaseModel):
+    """
+    Defines the structured output format for patch-based testbench repair.
+    The interface is kept as it is.
+    """
+    reasoning: str = Field(
+        description="All reasoning steps and advices to avoid syntax error"
+    )
+    edits: List[LineEdit] = Field(
+        description="Non-overlapping line-range edits to the previous tb.sv"
+    )
+
 # --- TB Writer Function ---
 
+@memoize_per_llm
 def get_tb_writer(llm):
     """
     Creates a LangChain chain for generating SystemVerilog testbenches.
@@ -112,11 +144,12 @@ def get_tb_writer(llm):
         llm: The Language Model instance (e.g., ChatOpenAI).
 
     Returns:
-        A LangChain Runnable that takes 'input_spec', 'examples_prompt',
-        'display_prompt' as input and returns a TBOutputFormat object.
+        A LangChain Runnable that takes 'input_spec', 'display_prompt' and
+        'failure_entry' as input and returns a TBOutputFormat object.
+        The few-shot examples and the sharding instructions are pre-bound as
+        partials. Built once per LLM.
     """
-
-    structured_tb_writer = llm.with_structured_output(TBOutputFormat)
+    from langchain_core.prompts import ChatPromptTemplate
 
     system_prompt = """
 You are an expert in SystemVerilog design.
@@ -254,7 +287,12 @@ The testbench should:
     the expected output should be checked at the exact moment when the input is changed;
 8. Avoid using keyword "continue"
 9. Take extra care not to introduce infinite loops in the testbench!
-
+10. If any stimulus is random, read the seed from the command line and use it for every random call:
+    integer seed;
+    initial if (!$value$plusargs("seed=%d", seed)) seed = 1;
+    ... data = $random(seed); ...
+    The testbench must also work when no seed is given.
+{sharding_prompt}
 -----------------------------------------
 
 {failure_entry} 
@@ -280,9 +318,23 @@ Like when detecting pattern "11", should be like:
         ),
     ]
 
-    tb_gen_prompt = ChatPromptTemplate.from_messages(messages)
+    tb_gen_prompt = ChatPromptTemplate.from_messages(messages).partial(
+        examples_prompt=TB_4_SHOT_EXAMPLES,
+        sharding_prompt=sharding_prompt()
+    )
+
+    return CachedStructuredChain(tb_gen_prompt, llm, TBOutputFormat)
 
-    return  tb_gen_prompt | structured_tb_writer
+@memoize_per_llm
+def get_tb_patcher(llm):
+    """
+    Same prompt as get_tb_writer with patch instructions appended; returns a
+    TBPatchFormat object with line-range edits instead of the full testbench.
+    Built once per LLM.
+    """
+    patch_prompt = with_patch_instructions(get_tb_writer(llm).prompt, "tb.sv")
+
+    return CachedStructuredChain(patch_prompt, llm, TBPatchFormat)
 
 
 class TBGenerator:
@@ -298,19 +350,22 @@ class TBGenerator:
         logger.info("TBGenerator initialized.")
 
 
-    def chat(self, input_spec: str, failure_entry = "") -> Tuple[str, str]:
+    def chat(self, input_spec: str, failure_entry = "", variant = None, include_examples = True) -> Tuple[str, str]:
         """
         Invokes the LLM to generate a testbench and interface based on the input specification
 
         Args:
             input_spec (str): The natural language specification for the module to be tested.
+            variant (optional): Distinguishes independent samples of the same prompt in the LLM cache.
+            include_examples (bool): Send the few-shot examples. Fix iterations leave
+                                     them out to save tokens.
 
         Returns:
             Tuple[str, str]: A tuple containing the generated testbench code and
                              the generated module interface code.
         """
         
-        llm_chain = get_tb_writer(llm) # Renamed to avoid conflict with `llm` import
+        llm_chain = get_tb_writer(get_llm())
 
         # Determine which display prompt to use based on the flag
         display_prompt_to_use = DISPLAY_QUEUE_PROMPT if self.gen_display_queue else DISPLAY_MOMENT_PROMPT
@@ -318,13 +373,15 @@ class TBGenerator:
         # Prepare the input dictionary for the LLM chain
         chain_inputs = {
             "input_spec": input_spec,
-            "examples_prompt": TB_4_SHOT_EXAMPLES,
             "display_prompt": display_prompt_to_use,
             "failure_entry" : failure_entry
         }
+        if not include_examples:
+            # Overrides the pre-bound partial
+            chain_inputs["examples_prompt"] = ""
 
         logger.debug(f"Invoking LLM with input_spec: '{input_spec[:50]}...' and display type: {'Queue' if self.gen_display_queue else 'Moment'}")
-        response: TBOutputFormat = llm_chain.invoke(chain_inputs)
+        response: TBOutputFormat = llm_chain.invoke(chain_inputs, variant=variant)
 
         # Log the LLM's response for debugging and transparency
         logger.info("LLM Response received.")
@@ -340,6 +397,44 @@ class TBGenerator:
         logger.info(response.interface)
             
         return (response.testbench, response.interface)
+
+    def chat_patch(self, input_spec: str, previous_tb: str, failure_entry: str,
+                   variant = None, include_examples = False) -> str:
+        """
+        Asks the LLM for line-range edits to 'previous_tb' instead of a full testbench
+        and applies them locally. 'failure_entry' must show 'previous_tb' with line numbers.
+
+        Returns:
+            str: The patched testbench code.
+
+        Raises:
+            PatchError: If the edits do not apply to 'previous_tb' or the response has none.
+            OutputParserException: If the response does not parse into TBPatchFormat.
+        """
+        llm_chain = get_tb_patcher(get_llm())
+
+        chain_inputs = {
+            "input_spec": input_spec,
+            "display_prompt": DISPLAY_QUEUE_PROMPT if self.gen_display_queue else DISPLAY_MOMENT_PROMPT,
+            "failure_entry" : failure_entry
+        }
+        if not include_examples:
+            chain_inputs["examples_prompt"] = ""
+
+        response: TBPatchFormat = llm_chain.invoke(chain_inputs, variant=variant)
+        if response is None:
+            raise PatchError("The model returned no patch")
+
+        logger.info("LLM Patch Response received.")
+        logger.info(f"Reasoning:\n{response.reasoning}")
+        logger.info(f"Edits: {describe_edits(response.edits)}")
+
+        testbench = apply_line_edits(previous_tb, response.edits)
+
+        logger.info("Patched tb:")
+        logger.info(testbench)
+
+        return testbench
     
 
 # obj = TBGenerator() 
@@ -0,0 +1,72 @@
+import convergence
+from convergence import (STOP_CYCLE, STOP_ITERATION_BUDGET, STOP_NO_CHANGE, STOP_PLATEAU, STOP_TIME_BUDGET,
+                         STOP_TOKEN_BUDGET, ConvergenceMonitor, RunBudget)
+
+RTL = "module dut(input a, output y);\n  assign y = {};\nendmodule\n"
+TB = "module tb;\nendmodule\n"
+
+def test_plateau_after_stalled_mismatch_counts():
+    monitor = ConvergenceMonitor(plateau_patience=2)
+
+    assert monitor.observe("mismatch_check", RTL.format("a"), TB, 5) is None
+    assert monitor.observe("mismatch_check", RTL.format("~a"), TB, 5) is None
+    assert monitor.observe("mismatch_check", RTL.format("a & a"), TB, 6) == STOP_PLATEAU
+
+def test_compile_failure_does_not_set_best_mismatch_cnt():
+    monitor = ConvergenceMonitor(plateau_patience=2)
+
+    # A fix that does not compile: the simulation did not run, so no count is passed
+    assert monitor.observe("mismatch_check", RTL.format("a +"), TB, None) is None
+    assert monitor.best_mismatch_cnt is None
+
+    # The first real count is an improvement, the loop keeps going
+    assert monitor.observe("mismatch_check", RTL.format("a"), TB, 4) is None
+    assert monitor.best_mismatch_cnt == 4
+    assert monitor.observe("mismatch_check", RTL.format("~a"), TB, 2) is None
+    assert monitor.stale_checks == 0
+
+def test_cycle_back_to_an_earlier_design():
+    monitor = ConvergenceMonitor(plateau_patience=0)
+
+    assert monitor.observe("rtl_check", RTL.format("a"), TB) is None
+    assert monitor.observe("rtl_check", RTL.format("~a"), TB) is None
+    assert monitor.observe("rtl_check", RTL.format("~a"), TB) == STOP_NO_CHANGE
+    assert monitor.observe("rtl_check", RTL.format("a"), TB) == STOP_CYCLE
+
+def test_comment_only_fix_is_no_change():
+    monitor = ConvergenceMonitor()
+
+    assert monitor.observe("rtl_check", RTL.format("a"), TB) is None
+    assert monitor.observe("rtl_check", "// fixed\n" + RTL.format("a").replace("  assign", "\tassign"), TB) == STOP_NO_CHANGE
+
+def test_run_budget_token_stop(monkeypatch):
+    usage = {"total_tokens": 1000}
+    monkeypatch.setattr(convergence, "get_token_usage", lambda: dict(usage))
+    budget = RunBudget(max_tokens=500)
+
+    assert budget.exhausted() is None
+    usage["total_tokens"] = 1499
+    assert budget.exhausted() is None
+    usage["total_tokens"] = 1500
+    assert budget.exhausted() == STOP_TOKEN_BUDGET
+
+def test_run_budget_wall_clock_stop(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(convergence.time, "monotonic", lambda: now[0])
+    budget = RunBudget(max_seconds=60)
+
+    assert budget.remaining_seconds() == 60
+    now[0] = 130.0
+    assert budget.exhausted() is None
+    assert budget.remaining_seconds() == 30
+    now[0] = 160.0
+    assert budget.exhausted() == STOP_TIME_BUDGET
+    assert budget.remaining_seconds() == 0
+
+def test_run_budget_iteration_stop():
+    budget = RunBudget(max_iterations=2)
+
+    budget.charge_iteration()
+    assert budget.exhausted() is None
+    budget.charge_iteration()
+    assert budget.exhausted() == STOP_ITERATION_BUDGET
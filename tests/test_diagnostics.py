@@ -0,0 +1,47 @@
+import pytest
+
+from diagnostics import SEVERITY_ERROR, SEVERITY_WARNING, blocking, parse_diagnostics, route_fix
+
+POSIX_DIR = "/home/user/proj/output/run_0"
+WINDOWS_DIR = r"C:\proj\output\run_0"
+
+@pytest.mark.parametrize("directory, sep", [(POSIX_DIR, "/"), (WINDOWS_DIR, "\\")])
+def test_icarus_error_with_location(directory, sep):
+    diagnostics = parse_diagnostics(f"{directory}{sep}rtl.sv:12: syntax error\n"
+                                    f"{directory}{sep}rtl.sv:12: error: Invalid module item.\n")
+
+    assert [(d.file, d.line, d.severity) for d in diagnostics] == [
+        ("rtl.sv", 12, SEVERITY_ERROR), ("rtl.sv", 12, SEVERITY_ERROR)
+    ]
+    assert diagnostics[0].category == "syntax"
+    assert blocking(diagnostics) == diagnostics
+
+@pytest.mark.parametrize("directory, sep", [(POSIX_DIR, "/"), (WINDOWS_DIR, "\\")])
+def test_icarus_warning_and_continuation(directory, sep):
+    diagnostics = parse_diagnostics(f"{directory}{sep}tb.sv:7: warning: Port 2 (b) of dut expects 4 bits, got 8.\n"
+                                    f"{directory}{sep}tb.sv:7:        : Pruning 4 high bits of the expression.\n")
+
+    assert len(diagnostics) == 1
+    assert (diagnostics[0].file, diagnostics[0].line, diagnostics[0].severity) == ("tb.sv", 7, SEVERITY_WARNING)
+    assert "Pruning" in diagnostics[0].message
+
+@pytest.mark.parametrize("directory, sep", [(POSIX_DIR, "/"), (WINDOWS_DIR, "\\")])
+def test_verilator_lines(directory, sep):
+    diagnostics = parse_diagnostics(f"%Error: {directory}{sep}rtl.sv:3:5: syntax error, unexpected IDENTIFIER\n"
+                                    f"%Warning-WIDTHTRUNC: {directory}{sep}tb.sv:9:11: Operator ASSIGN expects 4 bits\n")
+
+    assert [(d.file, d.line, d.severity) for d in diagnostics] == [
+        ("rtl.sv", 3, SEVERITY_ERROR), ("tb.sv", 9, SEVERITY_WARNING)
+    ]
+    assert diagnostics[1].message.endswith("[WIDTHTRUNC]")
+
+def test_route_fix_on_windows_paths():
+    diagnostics = parse_diagnostics(f"{WINDOWS_DIR}\\tb.sv:4: error: Unable to bind wire/reg/memory `x'\n")
+
+    rtl_needs_fix, tb_needs_fix, _ = route_fix(diagnostics)
+    assert (rtl_needs_fix, tb_needs_fix) == (False, True)
+
+def test_unlocated_message():
+    diagnostics = parse_diagnostics("I give up.\nFATAL: assertion failed\n")
+
+    assert [(d.file, d.line, d.category) for d in diagnostics] == [(None, None, "assertion")]
@@ -0,0 +1,99 @@
+import os
+import re
+import sys
+import subprocess
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules a worker imports before doing any work, with their budget in milliseconds
+IMPORT_BUDGETS_MS = {
+    "top": 1500,
+    "reviewer": 1200,
+    "rtl_generator": 800,
+    "tb_generator": 800,
+    "sim_judge": 800,
+    "llm": 150,
+    "logger_config": 150,
+}
+
+# Not counted against the budgets: the structured output schemas of rtl_generator,
+# tb_generator and sim_judge (and so reviewer and top) are langchain_core.pydantic_v1
+# models, which have to exist when those modules are imported
+EXEMPT_PACKAGES = ("langchain_core", "pydantic")
+
+# Multiplies every budget, e.g. IMPORT_BUDGET_SCALE=3 on slow CI machines
+BUDGET_SCALE = float(os.environ.get("IMPORT_BUDGET_SCALE", "1"))
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+MISSING_MODULE = re.compile(r"ModuleNotFoundError: No module named '([^'.]+)")
+
+def is_exempt(name: str) -> bool:
+    return any(name == package or name.startswith(package + ".") for package in EXEMPT_PACKAGES)
+
+def exempt_us(entries):
+    """
+    Cumulative time of the outermost exempt imports in '-X importtime' entries
+    (cumulative_us, depth, name). An entry is enclosed by the next one listed at a lower depth.
+    """
+    total = 0
+    for index, (cumulative, depth, name) in enumerate(entries):
+        if not is_exempt(name):
+            continue
+        # Walk up the enclosing imports; an exempt one already counts this entry
+        level = depth
+        for _, later_depth, later_name in entries[index + 1:]:
+            if later_depth < level:
+                if is_exempt(later_name):
+                    break
+                level = later_depth
+        else:
+            total += cumulative
+    return total
+
+def measure_import_ms(module: str) -> float:
+    """
+    Imports 'module' in a fresh interpreter under '-X importtime' from a
+    different working directory, and returns its cumulative import time in ms
+    less the exempt imports. Fails if the import has side effects that need the
+    repo as the working directory; skips if a third-party dependency is missing.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = REPO_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.expanduser("~"),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        missing = MISSING_MODULE.search(process.stderr)
+        if missing and not os.path.exists(os.path.join(REPO_DIR, f"{missing.group(1)}.py")):
+            pytest.skip(f"'{module}' needs {missing.group(1)}, which is not installed")
+        pytest.fail(f"Importing '{module}' failed: {process.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)), match.group(4)))
+    for cumulative, depth, name in entries:
+        if name == module and depth == 1:
+            return (cumulative - exempt_us(entries)) / 1000
+    pytest.fail(f"No importtime entry found for '{module}'")
+
+def test_exempt_us_counts_outermost_exempt_imports():
+    entries = [
+        (300, 3, "pydantic"),
+        (500, 2, "langchain_core.pydantic_v1"),
+        (40, 2, "prompts"),
+        (900, 1, "rtl_generator"),
+    ]
+    assert exempt_us(entries) == 500
+
+@pytest.mark.parametrize("module, budget", IMPORT_BUDGETS_MS.items())
+def test_import_time_within_budget(module, budget):
+    elapsed = measure_import_ms(module)
+    assert elapsed <= budget * BUDGET_SCALE, f"{module} imports in {elapsed:.1f} ms (budget {budget * BUDGET_SCALE:.0f} ms)"
@@ -0,0 +1,54 @@
+import time
+import threading
+
+import llm_cache
+from llm_cache import LLMCache
+
+def make_cache(tmp_path, lease=60):
+    return LLMCache(str(tmp_path / "llm_cache.sqlite"), max_bytes=1024 * 1024, lease=lease)
+
+def claim_as_other_process(cache, key, started):
+    conn = cache._conn()
+    conn.execute("INSERT INTO inflight(key, owner, started) VALUES (?, ?, ?)", (key, "other", started))
+    conn.commit()
+
+def inflight_rows(cache):
+    return cache._conn().execute("SELECT key, owner FROM inflight").fetchall()
+
+def test_stale_claim_is_taken_over(tmp_path):
+    cache = make_cache(tmp_path, lease=60)
+    # A worker that died mid-call long ago left its claim behind
+    claim_as_other_process(cache, "key", started=time.time() - 61)
+
+    assert cache.get_or_compute("key", lambda: "value") == "value"
+    assert cache.misses == 1
+    assert inflight_rows(cache) == []
+    assert cache.get("key") == "value"
+
+def test_live_claim_waits_until_the_lease_expires(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "INFLIGHT_POLL", 0.01)
+    cache = make_cache(tmp_path, lease=0.3)
+    claim_as_other_process(cache, "key", started=time.time())
+
+    start = time.monotonic()
+    assert cache.get_or_compute("key", lambda: "value") == "value"
+    assert time.monotonic() - start >= 0.25
+    assert inflight_rows(cache) == []
+
+def test_live_claim_is_coalesced_with_the_other_process(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "INFLIGHT_POLL", 0.01)
+    cache = make_cache(tmp_path, lease=60)
+    claim_as_other_process(cache, "key", started=time.time())
+
+    def other_process_finishes():
+        time.sleep(0.1)
+        writer = make_cache(tmp_path)
+        writer.put("key", "theirs")
+        writer._conn().execute("DELETE FROM inflight WHERE key = 'key'")
+        writer._conn().commit()
+
+    thread = threading.Thread(target=other_process_finishes)
+    thread.start()
+    assert cache.get_or_compute("key", lambda: "ours") == "theirs"
+    thread.join()
+    assert cache.coalesced == 1 and cache.misses == 0
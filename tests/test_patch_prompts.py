@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from prompts import RTL_4_SHOT_EXAMPLES, TB_4_SHOT_EXAMPLES
+from rtl_generator import get_rtl_patcher
+from tb_generator import get_tb_patcher
+
+class FakeLLM:
+    # Only what building the chains touches; the prompts are formatted, never sent
+    def with_structured_output(self, schema):
+        return self
+
+def test_tb_patch_prompt_keeps_writer_partials():
+    prompt = get_tb_patcher(FakeLLM()).prompt
+    messages = prompt.format_messages(input_spec="spec", display_prompt="display", failure_entry="failure")
+
+    text = "\n".join(message.content for message in messages)
+    assert TB_4_SHOT_EXAMPLES.strip()[:200] in text
+    assert "previous tb.sv" in messages[-1].content
+
+def test_rtl_patch_prompt_keeps_writer_partials():
+    prompt = get_rtl_patcher(FakeLLM()).prompt
+    messages = prompt.format_messages(input_spec="spec", module_interface="module m; endmodule",
+                                      testbench="tb", failure_entry="failure")
+
+    text = "\n".join(message.content for message in messages)
+    assert RTL_4_SHOT_EXAMPLES.strip()[:200] in text
+    assert "previous rtl.sv" in messages[-1].content
+
+def test_patch_prompt_examples_can_be_left_out():
+    prompt = get_rtl_patcher(FakeLLM()).prompt
+    messages = prompt.format_messages(input_spec="spec", module_interface="module m; endmodule",
+                                      testbench="tb", failure_entry="failure", examples_prompt="")
+
+    assert RTL_4_SHOT_EXAMPLES.strip()[:200] not in "\n".join(message.content for message in messages)
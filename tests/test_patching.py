@@ -0,0 +1,60 @@
+import pytest
+
+from patching import PatchError, apply_line_edits
+
+SOURCE = "\n".join([
+    "module dut(input a, input b, output y);",
+    "  wire t;",
+    "  assign t = a | b;",
+    "  assign y = t;",
+    "endmodule",
+])
+
+def edit(start_line, end_line, original, replacement):
+    return {"start_line": start_line, "end_line": end_line, "original": original, "replacement": replacement}
+
+def test_replace_lines():
+    patched = apply_line_edits(SOURCE, [edit(3, 3, "  assign t = a | b;", "  assign t = a & b;\n")])
+
+    assert patched.split("\n")[2] == "  assign t = a & b;"
+    assert len(patched.split("\n")) == 5
+
+def test_original_matches_up_to_comments_and_whitespace():
+    patched = apply_line_edits(SOURCE, [edit(3, 4, "assign t = a | b; // or\n   assign y = t;", "  assign y = a & b;")])
+
+    assert patched.split("\n")[1:3] == ["  wire t;", "  assign y = a & b;"]
+
+def test_insert_before_line():
+    patched = apply_line_edits(SOURCE, [edit(5, 4, "", "  // done\n")])
+
+    assert patched.split("\n")[3:] == ["  assign y = t;", "  // done", "endmodule"]
+
+def test_edits_apply_bottom_up():
+    patched = apply_line_edits(SOURCE, [
+        edit(4, 4, "  assign y = t;", "  assign y = ~t;"),
+        edit(2, 2, "  wire t;", "  wire t;\n  wire unused;"),
+    ])
+
+    assert patched.split("\n")[1:5] == ["  wire t;", "  wire unused;", "  assign t = a | b;", "  assign y = ~t;"]
+
+def test_overlapping_edits_are_rejected():
+    with pytest.raises(PatchError, match="overlaps"):
+        apply_line_edits(SOURCE, [
+            edit(2, 3, "  wire t;\n  assign t = a | b;", ""),
+            edit(3, 4, "  assign t = a | b;\n  assign y = t;", ""),
+        ])
+
+def test_mismatched_original_is_rejected():
+    # Line numbers shifted by one: the model thinks line 3 is 'assign y = t;'
+    with pytest.raises(PatchError, match="does not match"):
+        apply_line_edits(SOURCE, [edit(3, 3, "  assign y = t;", "  assign y = ~t;")])
+
+def test_out_of_range_and_empty_patches_are_rejected():
+    with pytest.raises(PatchError, match="outside"):
+        apply_line_edits(SOURCE, [edit(6, 7, "", "")])
+    with pytest.raises(PatchError, match="no edits"):
+        apply_line_edits(SOURCE, [])
+
+def test_patch_that_breaks_module_structure_is_rejected():
+    with pytest.raises(PatchError, match="endmodule"):
+        apply_line_edits(SOURCE, [edit(5, 5, "endmodule", "")])
@@ -0,0 +1,121 @@
+import threading
+from types import SimpleNamespace
+
+from llm import record_token_usage
+from repair_search import BeamRepairSearch, RepairNode
+
+def llm_call():
+    # What the token usage callback sees for one real (uncached) model call
+    record_token_usage(SimpleNamespace(llm_output={"token_usage": {"prompt_tokens": 10, "completion_tokens": 5}},
+                                       generations=[]))
+
+def make_root():
+    return RepairNode(rtl_code="root", tb_code="tb", if_code="if", compiles=True, sim_ran=True, mismatch_cnt=10)
+
+def scripted_evaluate(scores):
+    """
+    Scores children by their rtl_code: {rtl_code: (compiles, mismatch_cnt)}, pass at 0 mismatches.
+    """
+    def evaluate(node):
+        node.compiles, node.mismatch_cnt = scores.get(node.rtl_code, (False, 0))
+        node.sim_ran = node.compiles
+        node.is_pass = node.compiles and node.mismatch_cnt == 0
+    return evaluate
+
+def make_search(expand, evaluate, **kwargs):
+    options = dict(beam_width=2, branch_factor=3, max_depth=2, max_llm_calls=100, max_seconds=60)
+    options.update(kwargs)
+    return BeamRepairSearch(expand=expand, evaluate=evaluate, **options)
+
+def test_keeps_beam_width_best_compiling_children():
+    scores = {"root.0": (False, 0), "root.1": (True, 7), "root.2": (True, 4)}
+    expanded = []
+    lock = threading.Lock()
+
+    def expand(node, branch_index, prepared):
+        with lock:
+            expanded.append(node.rtl_code)
+        return f"{node.rtl_code}.{branch_index}", node.tb_code, node.if_code
+
+    best = make_search(expand, scripted_evaluate(scores)).run(make_root())
+
+    # The child that does not compile is pruned although it "scores" 0 mismatches
+    assert sorted(set(expanded)) == ["root", "root.1", "root.2"]
+    assert expanded.count("root") == 3
+    assert (best.rtl_code, best.mismatch_cnt) == ("root.2", 4)
+
+def test_pruning_by_mismatch_count_with_narrow_beam():
+    scores = {"root.0": (True, 9), "root.1": (True, 3), "root.2": (True, 5), "root.1.0": (True, 0)}
+    expanded = []
+    lock = threading.Lock()
+
+    def expand(node, branch_index, prepared):
+        with lock:
+            expanded.append(node.rtl_code)
+        return f"{node.rtl_code}.{branch_index}", node.tb_code, node.if_code
+
+    best = make_search(expand, scripted_evaluate(scores), beam_width=1).run(make_root())
+
+    assert sorted(set(expanded)) == ["root", "root.1"]
+    assert best.rtl_code == "root.1.0" and best.is_pass
+
+def test_prepare_runs_once_per_node():
+    prepared_nodes = []
+
+    def prepare(node):
+        llm_call()
+        prepared_nodes.append(node.rtl_code)
+        return f"verdict for {node.rtl_code}"
+
+    def expand(node, branch_index, prepared):
+        assert prepared == f"verdict for {node.rtl_code}"
+        return f"{node.rtl_code}.{branch_index}", node.tb_code, node.if_code
+
+    search = make_search(expand, scripted_evaluate({}), max_depth=1, prepare=prepare)
+    search.run(make_root())
+
+    assert prepared_nodes == ["root"]
+    assert search.llm_calls == 1
+
+def test_charges_the_calls_actually_made():
+    def expand(node, branch_index, prepared):
+        # Two fixes (tb and rtl) on even branches, a cache hit (no call) on odd ones
+        if branch_index % 2 == 0:
+            llm_call()
+            llm_call()
+        return f"{node.rtl_code}.{branch_index}", node.tb_code, node.if_code
+
+    search = make_search(expand, scripted_evaluate({}), beam_width=1, branch_factor=4, max_depth=1)
+    search.run(make_root())
+
+    assert search.llm_calls == 4
+
+def test_stops_when_the_llm_call_budget_is_spent():
+    expanded = []
+    lock = threading.Lock()
+
+    def expand(node, branch_index, prepared):
+        llm_call()
+        with lock:
+            expanded.append(node.rtl_code)
+        return f"{node.rtl_code}.{branch_index}", node.tb_code, node.if_code
+
+    scores = {f"root.{i}": (True, 9 - i) for i in range(3)}
+    search = make_search(expand, scripted_evaluate(scores), max_depth=5, max_llm_calls=4)
+    best = search.run(make_root())
+
+    # Three branches of the root, then one more call before the budget is spent
+    assert search.llm_calls == 4
+    assert len(expanded) == 4 and expanded.count("root") == 3
+    assert best.rtl_code == "root.2"
+
+def test_stops_when_the_wall_clock_budget_is_spent():
+    calls = []
+
+    def expand(node, branch_index, prepared):
+        calls.append(branch_index)
+        return f"{node.rtl_code}.{branch_index}", node.tb_code, node.if_code
+
+    search = make_search(expand, scripted_evaluate({}), max_seconds=0)
+    assert search.run(make_root()).rtl_code == "root"
+    assert calls == []
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from convergence import STOP_CYCLE, STOP_NO_CHANGE, RunBudget
+from deadline import Deadline
+from reviewer import SimReviewer
+
+RTL = "module dut(input a, output y);\n  assign y = {};\nendmodule\n"
+TB = "module tb;\nendmodule\n"
+
+def failing_check(mismatch_cnt):
+    sim_output = {"success": True, "stderr": "", "stdout": ""}
+    return {"error": True, "sim_output": sim_output, "mismatch_cnt": mismatch_cnt, "iterations": 1}
+
+@pytest.fixture
+def reviewer(tmp_path):
+    reviewer = SimReviewer("spec", str(tmp_path), max_iterations=10, budget=RunBudget(), deadline=Deadline())
+    reviewer.rollback = True
+    reviewer.plateau_patience = 0
+    reviewer.convergence.plateau_patience = 0
+    reviewer.write_output(RTL.format("a"), "rtl.sv")
+    reviewer.write_output(TB, "tb.sv")
+    reviewer.write_output("", "if.sv")
+    return reviewer
+
+def check(reviewer, mismatch_cnt):
+    return reviewer.track_iteration("mismatch_check", failing_check(mismatch_cnt), compiles=True, sim_ran=True,
+                                    is_pass=False, mismatch_cnt=mismatch_cnt)
+
+def test_failed_fix_after_rollback_is_not_a_cycle(reviewer):
+    assert "stop_reason" not in check(reviewer, 2)
+
+    # The fix makes it worse; the best version (the first one) is restored
+    reviewer.write_output(RTL.format("~a"), "rtl.sv")
+    update = check(reviewer, 5)
+    assert reviewer.rollbacks == 1
+    assert update["mismatch_cnt"] == 2
+    assert "stop_reason" not in update
+    with open(os.path.join(reviewer.output_dir_per_run, "rtl.sv")) as f:
+        assert f.read() == RTL.format("a")
+
+    # The next fix fails without writing; the restored files are checked again
+    assert "stop_reason" not in check(reviewer, 2)
+
+    # A fix that does write it again has gone round in a cycle
+    reviewer.write_output(RTL.format("a"), "rtl.sv")
+    assert check(reviewer, 2)["stop_reason"] == STOP_CYCLE
+
+def test_fix_that_writes_the_same_design_is_no_change(reviewer):
+    assert "stop_reason" not in check(reviewer, 2)
+
+    reviewer.write_output(RTL.format("a"), "rtl.sv")
+    assert check(reviewer, 2)["stop_reason"] == STOP_NO_CHANGE
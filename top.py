@@ -8,18 +8,23 @@ from pprint import pprint
 
 from tb_generator import TBGenerator
 from rtl_generator import RTLGenerator
-from reviewer import SimReviewer
+from reviewer import SimReviewer, check_rtl, sim_review
+from repair_search import candidate_score
+from convergence import RunBudget
+from deadline import Deadline, deadline_scope
 
 
 import logger_config
 logger = logging.getLogger("root")
 
-from langgraph.graph import StateGraph, START, END
-
-from llm import llm
+from llm import get_llm
 
 import os
 import shutil
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import load_config
 
 def create_backup(backup_folder_name: str) -> None:
     """
@@ -95,12 +100,19 @@ def create_backup(backup_folder_name: str) -> None:
 
 class TopAgent: 
 
-    def __init__(self):
-        self.llm = llm
+    def __init__(self, rtl_candidates: int | None = None, simulator: str | None = None):
+        self.llm = get_llm()
+        # Number of RTL candidates sampled in parallel before the review loop
+        if rtl_candidates is None:
+            rtl_candidates = load_config().get("PIPELINE", {}).get("rtl_candidates", 1)
+        self.rtl_candidates = max(1, rtl_candidates)
+        # "iverilog", "verilator" or "auto" for this agent's runs; None uses [SIM] simulator
+        self.simulator = simulator
         self.output_path = os.path.join(os.getcwd(), "output")
         self.tb_gen: TBGenerator | None = None
         self.rtl_gen: RTLGenerator | None = None
         self.sim_reviewer: SimReviewer | None = None
+        self.deadline = Deadline()
 
     def set_output_path(self, output_path: str) -> None:
         self.output_path = output_path
@@ -110,6 +122,71 @@ class TopAgent:
         with open(os.path.join(self.output_dir_per_run, file_name), "w") as f:
             f.write(content)
 
+    def _evaluate_rtl_candidate(self, spec, testbench, interface, index) -> Dict:
+        """
+        Generates one RTL candidate into 'candidates/candidate_<index>' next to a copy
+        of the testbench, then syntax-checks and simulates it there.
+        """
+        candidate_dir = os.path.join(self.output_dir_per_run, "candidates", f"candidate_{index}")
+        os.makedirs(candidate_dir, exist_ok=True)
+        for content, file_name in ((testbench, "tb.sv"), (interface, "if.sv")):
+            with open(os.path.join(candidate_dir, file_name), "w") as f:
+                f.write(content)
+
+        rtl_code = RTLGenerator().chat(
+            input_spec=spec,
+            testbench=testbench,
+            interface=interface,
+            variant=index or None
+        )
+        with open(os.path.join(candidate_dir, "rtl.sv"), "w") as f:
+            f.write(rtl_code)
+
+        candidate = {"index": index, "rtl_code": rtl_code, "compiles": False,
+                     "sim_ran": False, "is_pass": False, "mismatch_cnt": 0}
+
+        candidate["compiles"], _ = check_rtl(os.path.join(candidate_dir, "rtl.sv"), self.simulator)
+        if candidate["compiles"]:
+            is_pass, mismatch_cnt, sim_output = sim_review(candidate_dir, self.simulator)
+            candidate.update(sim_ran=sim_output["success"], is_pass=is_pass, mismatch_cnt=mismatch_cnt)
+
+        logger.info(f"RTL candidate {index}: compiles={candidate['compiles']}, sim_ran={candidate['sim_ran']}, "
+                    f"is_pass={candidate['is_pass']}, mismatch_cnt={candidate['mismatch_cnt']}")
+        return candidate
+
+    def _best_rtl_candidate(self, spec, testbench, interface) -> Dict:
+        """
+        Samples 'rtl_candidates' RTL candidates concurrently and evaluates them in
+        parallel simulations against the same testbench. Returns the first passing
+        candidate as soon as it is known, otherwise the best scoring one.
+        """
+        candidates = []
+        pool = ThreadPoolExecutor(max_workers=self.rtl_candidates)
+        try:
+            futures = [
+                pool.submit(contextvars.copy_context().run, self._evaluate_rtl_candidate, spec, testbench, interface, index)
+                for index in range(self.rtl_candidates)
+            ]
+            for future in as_completed(futures):
+                try:
+                    candidate = future.result()
+                except Exception:
+                    logger.exception("RTL candidate generation failed")
+                    continue
+                candidates.append(candidate)
+                if candidate["is_pass"]:
+                    break
+        finally:
+            # Do not wait for the remaining candidates once one passed
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        if not candidates:
+            raise RuntimeError("All RTL candidates failed to generate")
+
+        best = max(candidates, key=candidate_score)
+        logger.info(f"Selected RTL candidate {best['index']} out of {len(candidates)} evaluated")
+        return best
+
     def _run(self, spec):
 
         try:
@@ -121,7 +198,10 @@ class TopAgent:
             self.sim_reviewer = SimReviewer(
                 input_spec=spec,
                 output_dir_per_run=self.output_dir_per_run,
-                max_iterations=5
+                max_iterations=5,
+                budget=RunBudget.from_config(),
+                deadline=self.deadline,
+                simulator=self.simulator
             )
 
             testbench, interface = self.tb_gen.chat(
@@ -131,13 +211,23 @@ class TopAgent:
             self.write_output(testbench, "tb.sv")
             self.write_output(interface, "if.sv")
 
-            rtl_code = self.rtl_gen.chat(
-                input_spec=spec,
-                testbench=testbench,
-                interface=interface
-            )
+            if self.rtl_candidates > 1:
+                best = self._best_rtl_candidate(spec, testbench, interface)
+                rtl_code = best["rtl_code"]
+                self.write_output(rtl_code, "rtl.sv")
+
+                if best["is_pass"]:
+                    with open(f"{self.output_dir_per_run}/properly_finished.tag", "w") as f:
+                        f.write("1")
+                    return True, rtl_code
+            else:
+                rtl_code = self.rtl_gen.chat(
+                    input_spec=spec,
+                    testbench=testbench,
+                    interface=interface
+                )
 
-            self.write_output(rtl_code, "rtl.sv")
+                self.write_output(rtl_code, "rtl.sv")
 
             value = self.sim_reviewer.invoke_rag()
 
@@ -158,31 +248,60 @@ class TopAgent:
 
         return True, rtl_code
 
+    def cancel(self) -> None:
+        """
+        Aborts the current run from another thread: pending LLM calls are abandoned
+        and running simulations are killed. Called before run(), the next run stops
+        right away.
+        """
+        self.deadline.cancel()
+
     def run(
         self,
         benchmark_type_name: str,
         task_id: str,
         spec: str,
+        deadline_seconds: float | None = None,
     ) -> Tuple[bool, str]:
+        """
+        Generates and reviews the RTL for 'spec'.
+
+        Args:
+            deadline_seconds (float, optional): Wall clock limit for the whole run.
+                Defaults to [PIPELINE] deadline_seconds; 0 means no limit.
+        """
 
         self.output_dir_per_run = os.path.join(self.output_path, f"{benchmark_type_name}_{task_id}")
         os.makedirs(self.output_path, exist_ok=True)
         os.makedirs(self.output_dir_per_run, exist_ok=True)
 
-        result = self._run(spec)
+        if deadline_seconds is None:
+            deadline_seconds = load_config().get("PIPELINE", {}).get("deadline_seconds", 0)
+        deadline = Deadline(deadline_seconds)
+        if self.deadline.cancelled:
+            # cancel() was called before the run started
+            deadline.cancel()
+        self.deadline = deadline
+
+        try:
+            with deadline_scope(deadline):
+                result = self._run(spec)
+        finally:
+            # Stops work the run left behind (e.g. candidates still simulating) and
+            # everything in flight if the run itself was interrupted
+            deadline.cancel()
+            # Fresh for cancel() calls made before the next run
+            self.deadline = Deadline()
         
         return result
     
 if __name__ == "__main__":
-    obj = TopAgent()
+    from utils import load_config
 
-    import tomllib
+    logger_config.init_logging()
+    obj = TopAgent()
 
-    def parse_toml_file(file_path):
-        with open(file_path, "rb") as f:
-            config = tomllib.load(f)
-        return config
-    config = parse_toml_file("config.toml")
+    config = load_config()
 
     obj.run(
         benchmark_type_name="test",
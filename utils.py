@@ -1,6 +1,75 @@
+import os
+import re
+import functools
+import threading
+import tomllib
+
+CONFIG_ENV_VAR = "RTLGENIE_CONFIG"
+
+_config = None
+_config_lock = threading.Lock()
+
+def load_config(path=None) -> dict:
+    """
+    Parses config.toml once per process.
+
+    The file is looked up in this order: the 'path' argument, the RTLGENIE_CONFIG
+    environment variable, './config.toml', and config.toml next to this module.
+    Passing 'path' always re-reads the file.
+    """
+    global _config
+    with _config_lock:
+        if _config is None or path is not None:
+            if path is None:
+                path = os.environ.get(CONFIG_ENV_VAR)
+            if path is None:
+                path = "config.toml"
+                if not os.path.isfile(path):
+                    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.toml")
+            with open(path, "rb") as f:
+                _config = tomllib.load(f)
+        return _config
+
+def memoize_per_llm(builder):
+    """
+    Caches the runnable built by 'builder(llm)' for each LLM instance, so prompt
+    templates and structured-output wrappers are constructed once per process.
+    The uncached builder stays reachable as 'get_x.__wrapped__'.
+    """
+    built = {}
+    lock = threading.Lock()
+
+    @functools.wraps(builder)
+    def wrapper(llm):
+        with lock:
+            entry = built.get(id(llm))
+            # Keep a reference to the LLM so its id cannot be reused while cached
+            if entry is None or entry[0] is not llm:
+                entry = (llm, builder(llm))
+                built[id(llm)] = entry
+            return entry[1]
+
+    return wrapper
+
 def add_lineno(file_content: str) -> str:
-    lines = file_content.split("\n")
-    ret = ""
-    for i, line in enumerate(lines):
-        ret += f"{i+1}: {line}\n"
-    return ret
\ No newline at end of file
+    return "".join(f"{i+1}: {line}\n" for i, line in enumerate(file_content.split("\n")))
+
+# String literals are matched first so that '//' inside $display strings survives
+_TOKEN_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_WHITESPACE_PATTERN = re.compile(r"[ \t\r\f\v]+")
+
+def normalize_verilog(source: str) -> str:
+    """
+    Removes comments, blank lines and redundant whitespace from Verilog source,
+    leaving string literals untouched, so that cosmetic edits hash the same.
+    """
+    def strip_comment(match):
+        token = match.group(0)
+        if token.startswith('"'):
+            return token
+        # Keep line structure for block comments so tokens do not merge
+        return "\n" if token.startswith("/*") and "\n" in token else " "
+
+    without_comments = _TOKEN_PATTERN.sub(strip_comment, source)
+    lines = (_WHITESPACE_PATTERN.sub(" ", line).strip() for line in without_comments.split("\n"))
+    return "\n".join(line for line in lines if line)
@@ -0,0 +1,79 @@
+import re
+import logging
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger("root")
+logger.info("Imported Waveform module")
+
+DUMP_OFF = "never"
+DUMP_ALWAYS = "always"
+DUMP_ON_FAIL = "fail"
+
+WINDOW_VCD_NAME = "failure_window.vcd"
+WINDOW_MODULE_NAME = "rtlgenie_dump_window"
+
+# '$dumpfile("x.vcd");', '$dumpvars(0, tb);', '$dumpoff;', ... as complete statements
+_DUMP_CALL = re.compile(r"\$dump\w*\s*(?:\([^;]*\))?\s*;")
+_MODULE = re.compile(r"^\s*module\s+([A-Za-z_][A-Za-z0-9_$]*)", re.MULTILINE)
+_TIMESCALE = re.compile(r"`timescale\s+\d+\s*[munpf]?s\s*/\s*(\d+\s*[munpf]?s)")
+
+def dump_mode(sim_config: Dict) -> str:
+    """
+    Returns [SIM] dump_waveforms: "never" (default) suppresses testbench waveform
+    dumps, "always" keeps them, "fail" suppresses them and re-runs failing
+    simulations of the main fix loop with a dump of the window around their
+    first mismatch.
+    """
+    mode = sim_config.get("dump_waveforms", DUMP_OFF)
+    if mode not in (DUMP_OFF, DUMP_ALWAYS, DUMP_ON_FAIL):
+        raise ValueError(f"Unknown [SIM] dump_waveforms '{mode}', expected '{DUMP_OFF}', '{DUMP_ALWAYS}' or '{DUMP_ON_FAIL}'")
+    return mode
+
+def strip_dump_calls(tb_code: str) -> str:
+    """
+    Replaces the testbench's own $dump* calls with empty statements, so they do
+    not compete with the injected dump window.
+    """
+    return _DUMP_CALL.sub(";", tb_code)
+
+def top_module_name(tb_code: str, rtl_code: str = "") -> Optional[str]:
+    """
+    Returns the first module of the testbench that no other module instantiates.
+    """
+    names = _MODULE.findall(tb_code)
+    code = tb_code + "\n" + rtl_code
+    for name in names:
+        # Declared once, never used as a module type
+        if len(re.findall(rf"\b{re.escape(name)}\b", code)) == 1:
+            return name
+    return names[0] if names else None
+
+def dump_window(first_mismatch_time: int, sim_config: Dict) -> Tuple[int, int]:
+    """
+    Returns the (start, end) simulation times to dump: [SIM] dump_window_before
+    before the first mismatch up to dump_window_after past it, in the units the
+    testbench prints times in (its precision for '%t').
+    """
+    start = max(0, first_mismatch_time - sim_config.get("dump_window_before", 100000))
+    return start, first_mismatch_time + sim_config.get("dump_window_after", 10000)
+
+def dump_window_module(tb_code: str, top: str, start: int, end: int, vcd_path: str) -> str:
+    """
+    Returns a root module that dumps every signal below 'top' between 'start' and
+    'end' only, and ends the simulation at 'end'. Its time unit is the precision
+    of the testbench's `timescale, which is what '%t' prints mismatch times in.
+    """
+    precision = _TIMESCALE.search(tb_code)
+    timescale = f"`timescale {precision.group(1)}/{precision.group(1)}\n" if precision else ""
+    return (
+        f"{timescale}"
+        f"module {WINDOW_MODULE_NAME};\n"
+        f"    initial begin\n"
+        f"        $dumpfile(\"{vcd_path}\");\n"
+        f"        $dumpvars(0, {top});\n"
+        f"        $dumpoff;\n"
+        f"        #{start} $dumpon;\n"
+        f"        #{end - start} $finish;\n"
+        f"    end\n"
+        f"endmodule\n"
+    )
@@ -1,17 +1,142 @@
 import subprocess
 import os
+import sys
+import shutil
+import signal
+import tempfile
+import functools
 
 import logging
 logger = logging.getLogger("root")
 logger.info("Imported Windows Command module")
 
-def run_cmd_command(command_string, print_output=True):
+# Outcomes reported in result['status']
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMED_OUT = "timed_out"
+STATUS_RESOURCE_EXCEEDED = "resource_exceeded"
+STATUS_ERROR = "error"
+# Killed because the run was cancelled or reached its deadline
+STATUS_CANCELLED = "cancelled"
+
+# Used when config.toml has no [SIM] table
+DEFAULT_LIMITS = {
+    "timeout": 600,         # wall clock seconds per command
+    "cpu_seconds": 600,     # CPU seconds per process
+    "max_memory_mb": 4096,  # address space per process
+    "max_output_mb": 64,    # per output file, including captured stdout/stderr
+}
+
+OUT_OF_MEMORY_MARKERS = ("out of memory", "cannot allocate memory", "bad_alloc", "memoryerror")
+
+IS_POSIX = os.name == "posix"
+
+def get_limits() -> dict:
+    """
+    Returns the command limits from the [SIM] table of config.toml, falling back
+    to DEFAULT_LIMITS for missing keys.
+    """
+    from utils import load_config
+
+    sim_config = load_config().get("SIM", {})
+    return {key: sim_config.get(key, default) for key, default in DEFAULT_LIMITS.items()}
+
+def _rlimit_values(limits: dict) -> dict:
+    # (soft, hard) per resource, keyed by the option names of the prlimit tool
+    values = {}
+    if limits.get("cpu_seconds"):
+        cpu = int(limits["cpu_seconds"])
+        values["cpu"] = (cpu, cpu + 5)
+    if limits.get("max_memory_mb"):
+        memory = int(limits["max_memory_mb"] * 1024 * 1024)
+        values["as"] = (memory, memory)
+    if limits.get("max_output_mb"):
+        output = int(limits["max_output_mb"] * 1024 * 1024)
+        values["fsize"] = (output, output)
+    return values
+
+@functools.lru_cache(maxsize=None)
+def _prlimit_tool():
+    return shutil.which("prlimit") if IS_POSIX else None
+
+def rlimit_argv(limits: dict) -> list:
+    """
+    Returns a command prefix that sets the CPU, memory and file size rlimits and
+    then execs the command ('prlimit --cpu=... -- <command>'), or [] if the prlimit
+    tool (util-linux) is not installed. The limits are inherited by every process
+    the command starts. Unlike a preexec_fn, this is safe when other threads run.
+    """
+    values = _rlimit_values(limits)
+    if not values or _prlimit_tool() is None:
+        return []
+    return [_prlimit_tool(), *[f"--{name}={soft}:{hard}" for name, (soft, hard) in values.items()], "--"]
+
+def apply_rlimits(pid: int, limits: dict) -> None:
+    """
+    Sets the rlimits on a process that is already running, for systems without the
+    prlimit tool. Processes it started before the call are not limited. Needs
+    resource.prlimit (Linux); elsewhere only the wall clock timeout applies.
+    """
+    import resource
+
+    if not hasattr(resource, "prlimit"):
+        logger.debug("No prlimit on this system, running without rlimits")
+        return
+    resources = {"cpu": resource.RLIMIT_CPU, "as": resource.RLIMIT_AS, "fsize": resource.RLIMIT_FSIZE}
+    for name, value in _rlimit_values(limits).items():
+        try:
+            resource.prlimit(pid, resources[name], value)
+        except OSError:
+            # Already exited
+            pass
+
+def kill_process_tree(process) -> None:
     """
-    Runs a command in the Windows Command Prompt (cmd.exe) and captures its output.
+    Kills the process and every child in its process group (e.g. the 'vvp' started by 'iverilog && vvp').
+    """
+    try:
+        if IS_POSIX:
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            subprocess.run(f"taskkill /F /T /PID {process.pid}", shell=True, capture_output=True)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+def resource_exceeded_reason(returncode, stderr: str, output_size: int, limits: dict):
+    """
+    Returns which limit the command ran into ('cpu', 'memory', 'output') or None.
+    """
+    if IS_POSIX and returncode is not None:
+        # A signal shows up as -N from Popen, or as 128+N when reported by the shell
+        signum = -returncode if returncode < 0 else returncode - 128
+        if signum == signal.SIGXCPU:
+            return "cpu"
+        if signum == signal.SIGXFSZ:
+            return "output"
+    if limits.get("max_output_mb") and output_size >= limits["max_output_mb"] * 1024 * 1024:
+        return "output"
+    if returncode != 0 and any(marker in stderr.lower() for marker in OUT_OF_MEMORY_MARKERS):
+        return "memory"
+    return None
+
+def _read_capped(f, limit_bytes) -> str:
+    f.seek(0)
+    data = f.read(limit_bytes) if limit_bytes else f.read()
+    return data.decode(errors="replace")
+
+def run_cmd_command(command_string, print_output=True, timeout=None, limits=None):
+    """
+    Runs a command in the Windows Command Prompt (cmd.exe) or the POSIX shell and captures its output.
+
+    The command runs in its own process group so that everything it starts can be
+    killed on timeout. On POSIX, CPU time, address space and output file size are
+    limited with rlimits; captured stdout/stderr are truncated to the output limit.
 
     Args:
         command_string (str): The full command string to execute (e.g., "dir", "ipconfig /all").
         print_output (bool): If True, prints stdout and stderr to the console.
+        timeout (float, optional): Wall clock limit in seconds. Defaults to limits['timeout'].
+        limits (dict, optional): Overrides for the keys of DEFAULT_LIMITS. Defaults to get_limits().
 
     Returns:
         dict: A dictionary containing:
@@ -20,32 +145,77 @@ def run_cmd_command(command_string, print_output=True):
             'stderr' (str): The standard error from the command.
             'returncode' (int): The exit code of the command.
             'error_message' (str): An error message if an exception occurred.
+            'status' (str): One of 'ok', 'failed', 'timed_out', 'resource_exceeded', 'error'.
+            'timed_out' (bool): True if the command was killed at the wall clock limit.
+            'resource_exceeded' (str): 'cpu', 'memory' or 'output' if a limit was hit, else None.
     """
     result = {
         'success': False,
         'stdout': '',
         'stderr': '',
         'returncode': None,
-        'error_message': None
+        'error_message': None,
+        'status': STATUS_ERROR,
+        'timed_out': False,
+        'resource_exceeded': None
     }
 
+    limits = {**get_limits(), **(limits or {})}
+    if timeout is None:
+        timeout = limits["timeout"]
+    output_limit = int(limits["max_output_mb"] * 1024 * 1024) if limits.get("max_output_mb") else None
+
     try:
         logger.info(f"\n--- Executing command: {command_string} ---")
         # Use shell=True for CMD built-in commands or complex command strings
         # that rely on shell features (like pipes, redirection, environment variables).
-        process = subprocess.run(
-            command_string,
-            shell=True,
-            capture_output=True,
-            text=True,           # Decodes stdout/stderr as text using default encoding
-            check=False          # Do not raise an exception for non-zero exit codes here
-                                 # We'll handle it manually by checking returncode
-        )
-
-        result['stdout'] = process.stdout
-        result['stderr'] = process.stderr
+        # Output goes to temporary files so that RLIMIT_FSIZE also bounds it.
+        with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+            # The rlimits are set by exec'ing through prlimit, or on the started shell:
+            # a preexec_fn can deadlock the child when other threads are running
+            prefix = rlimit_argv(limits) if IS_POSIX else []
+            if IS_POSIX:
+                platform_kwargs = {"start_new_session": True}
+            else:
+                platform_kwargs = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+
+            process = subprocess.Popen(
+                [*prefix, "/bin/sh", "-c", command_string] if prefix else command_string,
+                shell=not prefix,
+                stdout=stdout_file,
+                stderr=stderr_file,
+                **platform_kwargs
+            )
+            if IS_POSIX and not prefix:
+                apply_rlimits(process.pid, limits)
+
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                result['timed_out'] = True
+                logger.error(f"\nCommand timed out after {timeout} seconds, killing its process group")
+            finally:
+                # Also reaps children left behind by the shell
+                kill_process_tree(process)
+                process.wait()
+
+            output_size = max(os.fstat(stdout_file.fileno()).st_size, os.fstat(stderr_file.fileno()).st_size)
+            result['stdout'] = _read_capped(stdout_file, output_limit)
+            result['stderr'] = _read_capped(stderr_file, output_limit)
+
         result['returncode'] = process.returncode
-        result['success'] = (process.returncode == 0)
+        result['success'] = (process.returncode == 0) and not result['timed_out']
+
+        if result['timed_out']:
+            result['status'] = STATUS_TIMED_OUT
+        else:
+            result['resource_exceeded'] = resource_exceeded_reason(process.returncode, result['stderr'], output_size, limits)
+            if result['resource_exceeded']:
+                result['success'] = False
+                result['status'] = STATUS_RESOURCE_EXCEEDED
+                logger.error(f"\nCommand exceeded its {result['resource_exceeded']} limit")
+            else:
+                result['status'] = STATUS_OK if result['success'] else STATUS_FAILED
 
         logger.debug("\n--- STDOUT ---")
         logger.debug(result['stdout'].strip())